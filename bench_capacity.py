@@ -0,0 +1,52 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+from ssd import SSD
+from ssd_texts import SSDSparseNand, SSDBinaryNand
+
+CAPACITIES = [10 ** 2, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+OP_COUNT = 2000
+
+
+def run_ops(ssd, capacity, op_count):
+    rand = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(op_count):
+        lba = rand.randrange(capacity)
+        op = rand.random()
+        if op < 0.5:
+            ssd.run([None, 'W', lba, f"0x{rand.randint(0, 0xFFFFFFFF):08X}"])
+        elif op < 0.9:
+            ssd.run([None, 'R', lba])
+        else:
+            ssd.run([None, 'E', lba, rand.randint(1, 10)])
+    return (time.perf_counter() - start) / op_count * 1e6
+
+
+def bench(nand_cls, file_name, capacity, no_buf_mode):
+    with tempfile.TemporaryDirectory() as folder:
+        cwd = os.getcwd()
+        os.chdir(folder)
+        try:
+            nand = nand_cls(os.path.join(folder, file_name), capacity=capacity)
+            usec = run_ops(SSD(no_buf_mode, nand), capacity, OP_COUNT)
+            nand.close()
+        finally:
+            os.chdir(cwd)
+    return usec
+
+
+def main():
+    print(f"{'capacity':>10} {'sparse':>12} {'sparse+buf':>12} {'binary':>12}   (usec/op)")
+    for capacity in CAPACITIES:
+        sparse = bench(SSDSparseNand, "ssd_nand.sparse", capacity, True)
+        sparse_buf = bench(SSDSparseNand, "ssd_nand.sparse", capacity, False)
+        binary = bench(SSDBinaryNand, "ssd_nand.bin", capacity, True)
+        print(f"{capacity:>10} {sparse:>12.1f} {sparse_buf:>12.1f} {binary:>12.1f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import gc
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from buffer import BufferJournalStore
+from ssd import SSD
+from ssd_texts import SSDNand
+
+CAPACITY = 1000
+OP_COUNT = 2000
+THINK_TIME = 0.001
+REPEAT = 5
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_ops(ssd, op_count):
+    # command 사이에 think time 을 두어서 background flush 가 쉬는 시간에 돌 수 있게 함
+    rand = random.Random(0)
+    latencies = []
+    for _ in range(op_count):
+        lba = rand.randrange(CAPACITY)
+        if rand.random() < 0.7:
+            argv = [None, 'W', lba, f"0x{rand.randint(0, 0xFFFFFFFF):08X}"]
+        else:
+            argv = [None, 'R', lba]
+        start = time.perf_counter()
+        ssd.run(argv)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        time.sleep(THINK_TIME)
+    return latencies
+
+
+def bench(background_flush):
+    with tempfile.TemporaryDirectory() as folder:
+        cwd = os.getcwd()
+        os.chdir(folder)
+        gc.disable()
+        try:
+            SSDNand._instance = None
+            ssd = SSD(nand_txt=SSDNand(capacity=CAPACITY), buffer_store=BufferJournalStore())
+            if background_flush:
+                ssd.start_background_flush()
+            latencies = run_ops(ssd, OP_COUNT)
+            ssd.stop_background_flush()
+        finally:
+            gc.enable()
+            SSDNand._instance = None
+            os.chdir(cwd)
+    return latencies
+
+
+def main():
+    # 실행마다 편차가 커서 REPEAT 번 돌린 결과의 중앙값을 비교
+    print(f"{'mode':>12} " + " ".join(f"{f'p{pct}(us)':>10}" for pct in PERCENTILES) + f" {'max(us)':>10}")
+    # 두 mode 를 번갈아 돌려서 같은 시점의 잡음을 나눠 가지게 함
+    runs = {False: [], True: []}
+    for _ in range(REPEAT):
+        for background_flush in runs:
+            runs[background_flush].append(bench(background_flush))
+    for name, background_flush in [('sync', False), ('background', True)]:
+        values = [statistics.median(percentile(latencies, pct) for latencies in runs[background_flush]) for pct in PERCENTILES]
+        print(f"{name:>12} " + " ".join(f"{value:>10.1f}" for value in values) +
+              f" {statistics.median(max(latencies) for latencies in runs[background_flush]):>10.1f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
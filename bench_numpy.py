@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import time
+
+from ssd import SSD
+from ssd_texts import SSDNand, SSDBinaryNand, SSDNumpyNand
+
+CAPACITIES = [10 ** 2, 10 ** 3, 10 ** 4]
+PATTERN = 0x5A5A5A5A
+
+
+def bulk_ops(ssd, capacity):
+    # fullwrite, fullread, 큰 erase 를 LBA 단위 command 와 range command 로 각각 수행
+    timings = {}
+
+    start = time.perf_counter()
+    for lba in range(capacity):
+        ssd.run([None, 'W', lba, f"0x{PATTERN:08X}"])
+    timings['W x N'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ssd.run([None, 'WR', 0, capacity, f"0x{PATTERN:08X}"])
+    timings['WR'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ssd.run([None, 'RR', 0, capacity])
+    timings['RR'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for lba in range(0, capacity, 10):
+        ssd.run([None, 'E', lba, min(10, capacity - lba)])
+    timings['E x N/10'] = time.perf_counter() - start
+    return timings
+
+
+def bench(make_nand, capacity):
+    with tempfile.TemporaryDirectory() as folder:
+        cwd = os.getcwd()
+        os.chdir(folder)
+        try:
+            nand = make_nand(folder, capacity)
+            timings = bulk_ops(SSD(True, nand), capacity)
+            if hasattr(nand, 'close'):
+                nand.close()
+            type(nand)._instance = None
+        finally:
+            os.chdir(cwd)
+    return timings
+
+
+def main():
+    backends = {
+        'text': lambda folder, capacity: SSDNand(capacity=capacity),
+        'binary': lambda folder, capacity: SSDBinaryNand(os.path.join(folder, "ssd_nand.bin"), capacity),
+        'numpy': lambda folder, capacity: SSDNumpyNand(os.path.join(folder, "ssd_nand.bin"), capacity),
+    }
+    SSDNand._instance = None
+    print(f"{'capacity':>10} {'backend':>8} {'W x N':>10} {'WR':>10} {'RR':>10} {'E x N/10':>10}   (msec)")
+    for capacity in CAPACITIES:
+        for name, make_nand in backends.items():
+            try:
+                timings = bench(make_nand, capacity)
+            except ImportError as e:
+                print(f"{capacity:>10} {name:>8}   skipped ({e})")
+                continue
+            print(f"{capacity:>10} {name:>8} " + " ".join(f"{value * 1e3:>10.2f}" for value in timings.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from ssd import SSD
+from ssd_queue import SSDQueuePair
+from ssd_shard import SSDShardRouter
+from ssd_texts import SSDNullOutput
+
+CAPACITY = 10 ** 6
+OP_COUNT = 20000
+QUEUE_DEPTH = 32
+# CPU 만 쓰는 경우와, command 마다 NAND 시간만큼 기다리는 경우 (CPU 가 적어도 shard 끼리 겹칠 수 있음)
+DELAY_OP_COUNT = 4000
+NAND_DELAY_US = (0, 1000)
+
+
+async def random_ops(ssd, capacity, op_count):
+    # 서로 다른 shard 로 가는 command 들이 동시에 진행되도록 queue depth 를 채워서 보냄
+    rand = random.Random(0)
+    async with SSDQueuePair(ssd, queue_depth=QUEUE_DEPTH, merge=False) as queue_pair:
+        start = time.perf_counter()
+        for _ in range(op_count):
+            lba = rand.randrange(capacity)
+            if rand.random() < 0.5:
+                await queue_pair.submit([None, 'W', lba, f"0x{rand.randint(0, 0xFFFFFFFF):08X}"])
+            else:
+                await queue_pair.submit([None, 'R', lba])
+        for _ in range(op_count):
+            await queue_pair.complete()
+        return op_count / (time.perf_counter() - start)
+
+
+def full_scan(ssd, capacity):
+    start = time.perf_counter()
+    ssd.run([None, 'WR', 0, capacity, "0x5A5A5A5A"])
+    ssd.run([None, 'RR', 0, capacity])
+    return 2 * capacity / (time.perf_counter() - start)
+
+
+def main():
+    shard_cnts = sorted({1, 2, 4, os.cpu_count()})
+    print(f"capacity {CAPACITY}, queue depth {QUEUE_DEPTH}, cpu {os.cpu_count()}")
+    print(f"{'delay(us)':>9} {'shards':>6} {'random IOPS':>12} {'per shard':>10} {'ops/batch':>10} {'scan LBA/s':>12}")
+    for delay_us in NAND_DELAY_US:
+        op_count = OP_COUNT if not delay_us else DELAY_OP_COUNT
+        for shard_cnt in shard_cnts:
+            with tempfile.TemporaryDirectory() as folder:
+                router = SSDShardRouter(CAPACITY, shard_cnt, folder=folder, delay_us=delay_us)
+                ssd = SSD(True, router, output_txt=SSDNullOutput())
+                iops = asyncio.run(random_ops(ssd, CAPACITY, op_count))
+                batch_cnt = router.batch_cnt
+                scan = full_scan(ssd, CAPACITY) if not delay_us else None
+                router.close()
+            print(f"{delay_us:>9} {shard_cnt:>6} {iops:>12.0f} {iops / shard_cnt:>10.0f} {op_count / batch_cnt:>10.1f} "
+                  f"{'-' if scan is None else f'{scan:.0f}':>12}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from buffer import BUFFER_SIZE
+from shell import Logger, Shell, ShellFullWriteAndReadCompareCommand, ShellPartialLBAWriteCommand, \
+    ShellWriteReadAgingCommand, ShellEraseAndWriteAgingCommand
+from ssd import SSD
+from ssd_texts import SSDNand, SSDOutput, MAX_NAND_SIZE
+
+# 기본 설정 그대로 (text NAND, buffer 폴더, ssd_output.txt) 임시 폴더에서 실제 파일로 측정
+OP_COUNT = 300
+REPEAT = 5
+# sample 하나가 이 시간보다 짧으면 benchmark 를 더 반복해서 timer / scheduling 잡음을 줄임
+MIN_SAMPLE_SECONDS = 0.5
+REGRESSION_THRESHOLD = 0.10
+# 두 중앙값 차이가 그 표준오차의 몇 배 안이면 잡음으로 보는지
+SPREAD_FACTOR = 3
+# 편차와 상관없이 더 크게 허용할 benchmark (한 번 실행에 수백 ms 걸리는 shell script)
+TOLERANCE = {
+    'shell.1_FullWriteAndReadCompare': 0.15,
+    'shell.2_PartialLBAWrite': 0.15,
+    'shell.3_WriteReadAging': 0.15,
+    'shell.4_EraseAndWriteAging': 0.15,
+}
+VALUE = "0x5A5A5A5A"
+
+
+@contextlib.contextmanager
+def temp_device():
+    # 매 benchmark 마다 빈 폴더에서 singleton 을 새로 만듦
+    with tempfile.TemporaryDirectory() as folder:
+        cwd = os.getcwd()
+        os.chdir(folder)
+        SSDNand._instance = None
+        SSDOutput._instance = None
+        try:
+            yield folder
+        finally:
+            # shell log 가 임시 폴더 안에 다 써진 뒤에 돌아감
+            Logger().close()
+            SSDNand._instance = None
+            SSDOutput._instance = None
+            os.chdir(cwd)
+
+
+def timed(ssd, argv_lst):
+    start = time.perf_counter()
+    for argv in argv_lst:
+        ssd.run(argv)
+    return len(argv_lst), time.perf_counter() - start
+
+
+def ssd_command(cmd, no_buf_mode):
+    def bench(op_count):
+        ssd = SSD(no_buf_mode)
+        if cmd == 'W':
+            argv_lst = [[None, 'W', index % MAX_NAND_SIZE, VALUE] for index in range(op_count)]
+        elif cmd == 'R':
+            argv_lst = [[None, 'R', index % MAX_NAND_SIZE] for index in range(op_count)]
+        elif cmd == 'E':
+            argv_lst = [[None, 'E', index % (MAX_NAND_SIZE - 10), 10] for index in range(op_count)]
+        else:
+            argv_lst = [[None, 'F'] for _ in range(op_count)]
+        return timed(ssd, argv_lst)
+    return bench
+
+
+def buffer_read(hit):
+    def bench(op_count):
+        ssd = SSD()
+        # buffer 를 다 채우지 않아서 flush 없이 남아 있게 함
+        for lba in range(BUFFER_SIZE - 1):
+            ssd.run([None, 'W', lba, VALUE])
+        base = 0 if hit else MAX_NAND_SIZE // 2
+        return timed(ssd, [[None, 'R', base + index % (BUFFER_SIZE - 1)] for index in range(op_count)])
+    return bench
+
+
+def buffer_flush_heavy(op_count):
+    # 서로 다른 LBA 에 쓰므로 BUFFER_SIZE 번마다 flush 가 일어남
+    ssd = SSD()
+    return timed(ssd, [[None, 'W', (index * 7) % MAX_NAND_SIZE, f"0x{index:08X}"] for index in range(op_count)])
+
+
+def shell_script(command_cls):
+    def bench(op_count):
+        shell = Shell()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            command_cls(shell).execute()
+        return 1, time.perf_counter() - start
+    return bench
+
+
+BENCHMARKS = {
+    'ssd.W': ssd_command('W', False),
+    'ssd.R': ssd_command('R', False),
+    'ssd.E': ssd_command('E', False),
+    'ssd.F': ssd_command('F', False),
+    'ssd.W.no_buf': ssd_command('W', True),
+    'ssd.R.no_buf': ssd_command('R', True),
+    'ssd.E.no_buf': ssd_command('E', True),
+    'ssd.F.no_buf': ssd_command('F', True),
+    'buffer.read_hit': buffer_read(True),
+    'buffer.read_miss': buffer_read(False),
+    'buffer.flush_heavy': buffer_flush_heavy,
+    'shell.1_FullWriteAndReadCompare': shell_script(ShellFullWriteAndReadCompareCommand),
+    'shell.2_PartialLBAWrite': shell_script(ShellPartialLBAWriteCommand),
+    'shell.3_WriteReadAging': shell_script(ShellWriteReadAgingCommand),
+    'shell.4_EraseAndWriteAging': shell_script(ShellEraseAndWriteAgingCommand),
+}
+
+
+def sample(bench, op_count, min_seconds=MIN_SAMPLE_SECONDS):
+    ops = 0
+    seconds = 0.0
+    while seconds < min_seconds:
+        done, elapsed = bench(op_count)
+        ops += done
+        seconds += elapsed
+    return ops, seconds
+
+
+def spread(samples, median):
+    # 상대 표준편차, 한두 번 튄 sample 에 끌려가지 않도록 MAD 로 추정
+    if len(samples) < 2 or not median:
+        return 0.0
+    return 1.4826 * statistics.median(abs(value - median) for value in samples) / median
+
+
+def median_error(result):
+    # 중앙값의 표준오차 ~ 1.25 * 표준편차 / sqrt(반복 횟수)
+    repeat = len(result.get('samples', []))
+    return 1.25 * result.get('spread', 0.0) / math.sqrt(repeat) if repeat else 0.0
+
+
+def run_benchmarks(names, op_count=OP_COUNT, repeat=REPEAT, min_seconds=MIN_SAMPLE_SECONDS):
+    # 반복마다 새 device 에서 sample 을 재고, 중앙값과 상대 표준편차를 남김
+    # benchmark 를 번갈아 돌려서 측정 도중 느려진 구간이 한 benchmark 에 몰리지 않게 함
+    samples = {name: [] for name in names}
+    for _ in range(repeat):
+        for name in names:
+            with temp_device():
+                ops, seconds = sample(BENCHMARKS[name], op_count, min_seconds)
+            samples[name].append(ops / seconds if seconds else 0.0)
+    results = {}
+    for name in names:
+        median = statistics.median(samples[name])
+        results[name] = {'ops_per_sec': median, 'spread': spread(samples[name], median), 'samples': samples[name]}
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'op_count': op_count,
+            'repeat': repeat,
+            'min_seconds': min_seconds,
+        },
+        'results': results,
+    }
+
+
+def allowed_drop(name, result, base, threshold=REGRESSION_THRESHOLD):
+    # 고정 threshold, benchmark 별 tolerance, 측정된 편차로 구한 범위 중 가장 큰 값까지는 잡음으로 봄
+    noise = math.hypot(median_error(result), median_error(base))
+    return max(threshold, TOLERANCE.get(name, 0.0), SPREAD_FACTOR * noise)
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    # baseline 중앙값보다 ops/sec 가 허용 범위 이상 떨어진 benchmark 이름 목록
+    rows = []
+    regressions = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or not base['ops_per_sec']:
+            rows.append((name, result['ops_per_sec'], None, None, None))
+            continue
+        change = result['ops_per_sec'] / base['ops_per_sec'] - 1
+        allowed = allowed_drop(name, result, base, threshold)
+        rows.append((name, result['ops_per_sec'], base['ops_per_sec'], change, allowed))
+        if change < -allowed:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    # python bench_suite.py [-o result.json] [--baseline base.json] [--threshold 0.1] [--min-seconds 0.5] [-k shell]
+    parser = argparse.ArgumentParser(description="SSD / Buffer / Shell benchmark suite")
+    parser.add_argument('-o', '--output', help="write the results as JSON")
+    parser.add_argument('--baseline', help="compare ops/sec against a stored JSON result")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--ops', type=int, default=OP_COUNT)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--min-seconds', type=float, default=MIN_SAMPLE_SECONDS,
+                        help="repeat each benchmark until one sample takes at least this long")
+    parser.add_argument('-k', '--filter', default="", help="run only benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    report = run_benchmarks(names, args.ops, args.repeat, args.min_seconds)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline is None:
+        print(f"{'benchmark':<34} {'ops/sec':>12} {'spread':>8}")
+        for name, result in report['results'].items():
+            print(f"{name:<34} {result['ops_per_sec']:>12.1f} {result['spread'] * 100:>7.1f}%")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    rows, regressions = compare(report, baseline, args.threshold)
+    print(f"{'benchmark':<34} {'ops/sec':>12} {'baseline':>12} {'change':>8} {'allowed':>8}")
+    for name, ops_per_sec, base, change, allowed in rows:
+        if base is None:
+            print(f"{name:<34} {ops_per_sec:>12.1f} {'-':>12} {'new':>8} {'-':>8}")
+        else:
+            mark = "  REGRESSION" if name in regressions else ""
+            print(f"{name:<34} {ops_per_sec:>12.1f} {base:>12.1f} {change * 100:>+7.1f}% {-allowed * 100:>+7.1f}%{mark}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
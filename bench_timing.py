@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+import tempfile
+
+from buffer import BufferJournalStore
+from buffer_policy import BufferFullFlushPolicy, WatermarkFlushPolicy, ReadMissFlushPolicy, CoalesceRatioFlushPolicy
+from ssd import SSD
+from ssd_texts import SSDBinaryNand, SSDNullOutput
+from ssd_timing import NandTimingModel
+
+CAPACITY = 100
+OP_COUNT = 5000
+POLICIES = {
+    'no buffer': None,
+    'buffer full': BufferFullFlushPolicy,
+    'watermark 4/1': lambda: WatermarkFlushPolicy(4, 1),
+    'read miss': ReadMissFlushPolicy,
+    'coalesce 0.3': lambda: CoalesceRatioFlushPolicy(0.3),
+}
+
+
+def run_workload(ssd, capacity, op_count):
+    # 좁은 구간에 몰리는 write 와 전체에 흩어진 read 를 섞음
+    rand = random.Random(0)
+    for _ in range(op_count):
+        op = rand.random()
+        if op < 0.6:
+            ssd.run([None, 'W', rand.randrange(10), f"0x{rand.randint(0, 0xFFFFFFFF):08X}"])
+        elif op < 0.9:
+            ssd.run([None, 'R', rand.randrange(capacity)])
+        else:
+            ssd.run([None, 'E', rand.randrange(capacity - 10), rand.randint(1, 10)])
+    ssd.run([None, 'F'])
+
+
+def bench(policy):
+    with tempfile.TemporaryDirectory() as folder:
+        SSDBinaryNand._instance = None
+        nand = SSDBinaryNand(os.path.join(folder, "ssd_nand.bin"), CAPACITY)
+        timing_model = NandTimingModel()
+        ssd = SSD(policy is None, nand, buffer_store=BufferJournalStore(os.path.join(folder, "buffer.journal")),
+                  flush_policy=policy() if policy is not None else None, resident_buffer=True,
+                  output_txt=SSDNullOutput(), timing_model=timing_model)
+        run_workload(ssd, CAPACITY, OP_COUNT)
+        ssd.close()
+        nand.close()
+    return timing_model.stats()
+
+
+def main():
+    print(f"{'policy':>14} {'modeled IOPS':>13} {'mean lat(us)':>13} {'device(ms)':>11} {'wall(ms)':>9} "
+          f"{'program':>8} {'erase':>6}")
+    for name, policy in POLICIES.items():
+        stats = bench(policy)
+        print(f"{name:>14} {stats['modeled_iops']:>13.0f} {stats['mean_latency_us']:>13.1f} "
+              f"{stats['device_time_us'] / 1e3:>11.1f} {stats['wall_time_s'] * 1e3:>9.1f} "
+              f"{stats['program']:>8} {stats['erase']:>6}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,12 @@
+import bisect
 import os
+import struct
+import zlib
+from abc import ABC, abstractmethod
 
-from ssd_texts import SSDOutput, SSDText, MAX_NAND_SIZE
+from buffer_policy import FlushPolicy, BufferFullFlushPolicy
+from ssd_metrics import SSDMetrics
+from ssd_texts import SSDOutput, SSDText, MAX_NAND_SIZE, file_signature, lba_width
 
 EMPTY = 0
 EMPTY_VALUE = 0x00000000
@@ -10,29 +16,284 @@ ERASE = 2
 BUFFER_SIZE = 5
 MAX_ERASE_SIZE = 10
 BUFFER_FOLDER_PATH = "./buffer"
+BUFFER_JOURNAL_PATH = "./buffer.journal"
 
+# buffer.journal record : header(payload 길이, crc32) + payload(buffer 파일 이름들)
+JOURNAL_RECORD_HEADER = struct.Struct("<II")
+JOURNAL_MAX_SIZE = 64 * 1024
 
-class Buffer:
 
+class BufferMemory:
+    # write 는 LBA 별 값, erase 는 정렬된 [start, end) 구간으로 저장
+    # write 가 erase 구간 안에 있으면 그 LBA 는 write 로 취급
     def __init__(self):
+        self._writes = {}
+        self._erase_starts = []
+        self._erase_ends = []
+
+    def __getitem__(self, lba):
+        if lba in self._writes:
+            return [WRITE, self._writes[lba]]
+        if self._in_erase(lba):
+            return [ERASE, ERASE_VALUE]
+        return [EMPTY, EMPTY_VALUE]
+
+    def __len__(self):
+        erase_cnt = sum(end - start for start, end in zip(self._erase_starts, self._erase_ends))
+        return len(self._writes) + erase_cnt - sum(1 for lba in self._writes if self._in_erase(lba))
+
+    def _in_erase(self, lba):
+        index = bisect.bisect_right(self._erase_starts, lba) - 1
+        return index >= 0 and lba < self._erase_ends[index]
+
+    def set_write(self, lba, value):
+        self._writes[lba] = value
+
+    def clear_write(self, lba):
+        self._writes.pop(lba, None)
+        self._remove_erase(lba, lba + 1)
+
+    def set_erase(self, start, end):
+        self._remove_writes(start, end)
+        # 겹치거나 맞닿은 구간을 하나로 합침
+        left = bisect.bisect_left(self._erase_ends, start)
+        right = bisect.bisect_right(self._erase_starts, end)
+        if left < right:
+            start = min(start, self._erase_starts[left])
+            end = max(end, self._erase_ends[right - 1])
+        self._erase_starts[left:right] = [start]
+        self._erase_ends[left:right] = [end]
+
+    def clear_erase(self, start, end):
+        self._remove_writes(start, end)
+        self._remove_erase(start, end)
+
+    def _remove_writes(self, start, end):
+        if end - start < len(self._writes):
+            for lba in range(start, end):
+                self._writes.pop(lba, None)
+        else:
+            for lba in [lba for lba in self._writes if start <= lba < end]:
+                del self._writes[lba]
+
+    def _remove_erase(self, start, end):
+        left = bisect.bisect_right(self._erase_ends, start)
+        right = bisect.bisect_left(self._erase_starts, end)
+        if left >= right:
+            return
+        remains = []
+        if self._erase_starts[left] < start:
+            remains.append((self._erase_starts[left], start))
+        if self._erase_ends[right - 1] > end:
+            remains.append((end, self._erase_ends[right - 1]))
+        self._erase_starts[left:right] = [remain[0] for remain in remains]
+        self._erase_ends[left:right] = [remain[1] for remain in remains]
+
+    def writes(self):
+        return sorted(self._writes.items())
+
+    def overlaps(self, start, end):
+        if end - start < len(self._writes):
+            if any(lba in self._writes for lba in range(start, end)):
+                return True
+        elif any(start <= lba < end for lba in self._writes):
+            return True
+        index = bisect.bisect_right(self._erase_ends, start)
+        return index < len(self._erase_starts) and self._erase_starts[index] < end
+
+    def erase_runs(self, max_size):
+        # write LBA 를 뺀 연속 erase 구간을 max_size 단위로 나눔
+        write_lbas = sorted(self._writes)
+        runs = []
+        for start, end in zip(self._erase_starts, self._erase_ends):
+            index = bisect.bisect_left(write_lbas, start)
+            piece_start = start
+            while piece_start < end:
+                piece_end = end
+                if index < len(write_lbas) and write_lbas[index] < end:
+                    piece_end = write_lbas[index]
+                    index += 1
+                for run_start in range(piece_start, piece_end, max_size):
+                    runs.append((run_start, min(max_size, piece_end - run_start)))
+                piece_start = piece_end + 1 if piece_end < end else end
+        return runs
+
+
+class BufferStore(ABC):
+    @abstractmethod
+    def create(self): pass
+
+    @abstractmethod
+    def load(self): pass
+
+    @abstractmethod
+    def add(self, buf): pass
+
+    @abstractmethod
+    def save(self, buf_lst): pass
+
+    def commit(self): pass
+
+    def compact(self): pass
+
+    # file lock 을 잡은 뒤 호출, 다른 process 가 바꾼 상태를 cache 에 남기지 않음
+    def refresh(self): pass
+
+
+class BufferDirectoryStore(BufferStore):
+    # buffer 폴더 안의 빈 파일 이름으로 buffer 상태 저장
+    def __init__(self, folder_path=BUFFER_FOLDER_PATH):
+        self._folder_path = folder_path
+
+    def create(self):
+        if not os.path.exists(self._folder_path):
+            os.makedirs(self._folder_path)
+
+    def load(self):
+        return os.listdir(self._folder_path)
+
+    def add(self, buf):
+        file_path = os.path.join(self._folder_path, buf)
+        open(file_path, 'a').close()
+
+    def save(self, buf_lst):
+        for filename in os.listdir(self._folder_path):
+            file_path = os.path.join(self._folder_path, filename)
+            os.remove(file_path)
+        for buf in buf_lst:
+            self.add(buf)
+
+
+class BufferJournalStore(BufferStore):
+    # append-only journal, 상태가 바뀔 때만 checksum 붙은 record 추가
+    def __init__(self, journal_path=BUFFER_JOURNAL_PATH, group_commit=1, sync=False):
+        self._journal_path = journal_path
+        self._group_commit = group_commit
+        self._sync = sync
+        self._state = None
+        self._pending = []
+        self._journal_size = 0
+        self._signature = None
+
+    def create(self):
+        if not os.path.exists(self._journal_path):
+            open(self._journal_path, 'ab').close()
+
+    def load(self):
+        if self._state is not None:
+            return list(self._state)
+
+        with open(self._journal_path, 'rb') as file:
+            data = file.read()
+            signature = file_signature(file.fileno())
+
+        state = []
+        offset = 0
+        while offset + JOURNAL_RECORD_HEADER.size <= len(data):
+            length, crc = JOURNAL_RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + JOURNAL_RECORD_HEADER.size:offset + JOURNAL_RECORD_HEADER.size + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            state = payload.decode().split("\n") if payload else []
+            offset += JOURNAL_RECORD_HEADER.size + length
+
+        # 마지막에 깨진 record 가 있으면 잘라냄
+        if offset != len(data):
+            with open(self._journal_path, 'r+b') as file:
+                file.truncate(offset)
+                signature = file_signature(file.fileno())
+        self._journal_size = offset
+        self._signature = signature
+        self._state = state
+        return list(state)
+
+    def refresh(self):
+        # 마지막으로 읽거나 쓴 뒤 journal 이 바뀌었으면 다음 load 에서 다시 읽음
+        if self._pending or file_signature(self._journal_path) == self._signature:
+            return
+        self._state = None
+
+    def add(self, buf):
+        self._state.append(buf)
+
+    def save(self, buf_lst):
+        if buf_lst == self._state:
+            return
+        self._state = list(buf_lst)
+        self._pending.append(self._record(self._state))
+        if len(self._pending) >= self._group_commit:
+            self.commit()
+
+    def commit(self):
+        if not self._pending:
+            return
+        if self._journal_size > JOURNAL_MAX_SIZE:
+            self.compact()
+            return
+
+        data = b"".join(self._pending)
+        with open(self._journal_path, 'ab') as file:
+            file.write(data)
+            self._sync_file(file)
+            file.flush()
+            self._signature = file_signature(file.fileno())
+        self._journal_size += len(data)
+        self._pending = []
+
+    def compact(self):
+        # 현재 상태 record 하나만 남긴 journal 로 교체
+        record = self._record(self._state)
+        tmp_path = self._journal_path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(record)
+            self._sync_file(file)
+            file.flush()
+            self._signature = file_signature(file.fileno())
+        os.replace(tmp_path, self._journal_path)
+        self._journal_size = len(record)
+        self._pending = []
+
+    def _record(self, buf_lst):
+        payload = "\n".join(buf_lst).encode()
+        return JOURNAL_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def _sync_file(self, file):
+        if self._sync:
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class Buffer:
+
+    def __init__(self, capacity=MAX_NAND_SIZE, store: BufferStore = None, buffer_size=BUFFER_SIZE,
+                 max_erase_size=MAX_ERASE_SIZE, flush_policy: FlushPolicy = None, output_txt: SSDText = None,
+                 metrics: SSDMetrics = None):
         self._folder_path = BUFFER_FOLDER_PATH
-        self._buf_lst = [''] * BUFFER_SIZE
+        self._store = store if store is not None else BufferDirectoryStore(self._folder_path)
+        self._capacity = capacity
+        self._lba_width = lba_width(capacity)
+        self._buffer_size = buffer_size
+        self._max_erase_size = max_erase_size
+        self._flush_policy = flush_policy if flush_policy is not None else BufferFullFlushPolicy()
+        self._metrics = metrics
+        self._buf_lst = [''] * self._buffer_size
         self._buffer_cnt = 0
-        self._output_txt: SSDText = SSDOutput()
+        self._output_txt: SSDText = output_txt if output_txt is not None else SSDOutput()
         self._run_command = []
-        self._buffer_cmd_memory = [[EMPTY, EMPTY_VALUE] for _ in range(MAX_NAND_SIZE)]
+        self._flushed = False
+        self._read_hit = False
+        self._buffer_cmd_memory = BufferMemory()
 
         self.create()
 
     def create(self):
-        if not os.path.exists(self._folder_path):
-            os.makedirs(self._folder_path)
+        self._store.create()
 
         self.get_exist_files()
         self._make_absent_files()
 
     def get_exist_files(self):
-        file_list = os.listdir(self._folder_path)
+        file_list = self._store.load()
         for file_name in file_list:
             splited_file_name = file_name.split("_")
             new_index = int(splited_file_name[0]) - 1
@@ -48,29 +309,47 @@ class Buffer:
                     self._set_buffer_with_erase(ERASE, lba, size)
 
     def _set_buffer_with_write(self, set_cmd, lba, value):
-        self._buffer_cmd_memory[lba][0] = WRITE if set_cmd == WRITE else EMPTY
-        self._buffer_cmd_memory[lba][1] = value if set_cmd == WRITE else EMPTY_VALUE
+        if set_cmd == WRITE:
+            self._buffer_cmd_memory.set_write(lba, value)
+        else:
+            self._buffer_cmd_memory.clear_write(lba)
 
     def _set_buffer_with_erase(self, set_cmd, lba, size):
-        for index in range(lba, lba + size):
-            self._buffer_cmd_memory[index][0] = ERASE if set_cmd == ERASE else EMPTY
-            self._buffer_cmd_memory[index][1] = ERASE_VALUE if set_cmd == ERASE else EMPTY_VALUE
+        end = min(lba + size, self._capacity)
+        if set_cmd == ERASE:
+            self._buffer_cmd_memory.set_erase(lba, end)
+        else:
+            self._buffer_cmd_memory.clear_erase(lba, end)
 
     def _make_absent_files(self):
         for index, buf in enumerate(self._buf_lst):
             if buf != '':
                 continue
             file_name = f'{index+1}_empty'
-            file_path = os.path.join(self._folder_path, file_name)
-            open(file_path, 'a').close()
+            self._store.add(file_name)
             self._buf_lst[index] = file_name
 
     def _get_buf_information(self, buf_val):
         _, cmd, lba, value = buf_val.split("_")
         return cmd, int(lba), value
 
+    @property
+    def flush_policy(self):
+        return self._flush_policy
+
+    @property
+    def buffer_cnt(self):
+        return self._buffer_cnt
+
+    @property
+    def buffer_size(self):
+        return self._buffer_size
+
     def run(self, sys_argv):
         self._run_command = []
+        self._flushed = False
+        self._read_hit = False
+        before_cnt = self._buffer_cnt
         cmd = sys_argv[1]
         if cmd == 'R':
             self._check_buffer_read(sys_argv)
@@ -78,17 +357,51 @@ class Buffer:
             self._check_buffer_write(sys_argv)
         elif cmd == 'E':
             self._check_buffer_erase(sys_argv)
+        elif cmd == 'RR':
+            self._check_buffer_range_read(sys_argv)
+        elif cmd == 'WR':
+            self._check_buffer_range_write(sys_argv)
+        elif cmd == 'FORMAT':
+            self._check_buffer_format(sys_argv)
         else:
             self._flush(self._buffer_cnt)
 
+        if cmd in ('W', 'E'):
+            # 새 slot 을 쓰지 않고 기존 buffer 에 합쳐진 경우
+            coalesced = not self._flushed and self._buffer_cnt <= before_cnt
+            self._flush_policy.on_update(coalesced)
+            if coalesced and self._metrics is not None:
+                self._metrics.count('buffer.coalesced')
+        self._apply_flush_policy(cmd)
+
         self._update_buffer_files()
         return self._run_command
 
+    def _apply_flush_policy(self, cmd):
+        flush_cnt = min(self._flush_policy.flush_count(self._buffer_cnt, cmd, self._read_hit), self._buffer_cnt)
+        if flush_cnt <= 0:
+            return
+
+        forwarded_command = self._run_command
+        self._run_command = []
+        self._flush(flush_cnt)
+        self._run_command += forwarded_command
+
+        # 일부만 flush 했으면 남은 buffer 를 앞으로 당김
+        if self._buffer_cnt > 0:
+            self._set_buffer_all_empty()
+            self._merge_erases()
+            self._merge_writes()
+
     def _check_buffer_read(self, sys_argv):
         lba = int(sys_argv[2])
 
-        if self._buffer_cmd_memory[lba][0] != EMPTY:
-            self._output_txt.write(f"{lba:02d} 0x{self._buffer_cmd_memory[lba][1]:08X}\n")  # f"0x{value:08X}"
+        self._read_hit = self._buffer_cmd_memory[lba][0] != EMPTY
+        self._flush_policy.on_read(self._read_hit)
+        if self._metrics is not None:
+            self._metrics.count('buffer.read_hit' if self._read_hit else 'buffer.read_miss')
+        if self._read_hit:
+            self._output_txt.write(f"{lba:0{self._lba_width}d} 0x{self._buffer_cmd_memory[lba][1]:08X}\n")  # f"0x{value:08X}"
         else:
             self._run_command.append(sys_argv)
 
@@ -96,7 +409,7 @@ class Buffer:
         lba = int(sys_argv[2])
         value = int(sys_argv[3], 16)
 
-        if self._buffer_cmd_memory[lba][0] != WRITE and self._buffer_cnt == BUFFER_SIZE:
+        if self._buffer_cmd_memory[lba][0] != WRITE and self._buffer_cnt == self._buffer_size:
             self._flush(self._buffer_cnt)
 
         self._set_buffer_all_empty()
@@ -117,38 +430,54 @@ class Buffer:
         self._merge_erases()
         self._merge_writes()
 
+    def _check_buffer_range_read(self, sys_argv):
+        lba = int(sys_argv[2])
+        size = int(sys_argv[3])
+
+        # 범위 안에 buffer 내용이 있으면 먼저 NAND 에 반영하고 한 번에 읽음
+        if self._buffer_cmd_memory.overlaps(lba, lba + size):
+            self._flush(self._buffer_cnt)
+        self._run_command.append(sys_argv)
+
+    def _check_buffer_range_write(self, sys_argv):
+        lba = int(sys_argv[2])
+        size = int(sys_argv[3])
+
+        # 범위 안의 buffer 내용은 덮어써지므로 버리고, range write 는 바로 NAND 로 보냄
+        self._set_buffer_with_erase(EMPTY, lba, size)
+        self._set_buffer_all_empty()
+        self._merge_erases()
+        self._merge_writes()
+
+        self._run_command.append(sys_argv)
+        self._output_txt.write("")
+
+    def _check_buffer_format(self, sys_argv):
+        # format 하면 buffer 내용은 NAND 에 반영할 필요 없이 버림
+        self._buffer_cmd_memory = BufferMemory()
+        self._set_buffer_all_empty()
+        self._run_command.append(sys_argv)
+        self._output_txt.write("")
+
     def _set_buffer_all_empty(self):
         self._buffer_cnt = 0
-        for index in range (BUFFER_SIZE):
+        for index in range (self._buffer_size):
             self._buf_lst[index] = f'{index+1}_empty'
 
     def _merge_writes(self):
-        for lba, memory_value in enumerate(self._buffer_cmd_memory):
-            if memory_value[0] != WRITE:
-                continue
-            if self._buffer_cnt == BUFFER_SIZE:
+        for lba, value in self._buffer_cmd_memory.writes():
+            if self._buffer_cnt == self._buffer_size:
                 self._flush(self._buffer_cnt)
 
-            self._buf_lst[self._buffer_cnt] = f"{self._buffer_cnt + 1}_W_{lba}_0x{memory_value[1]:08X}"
+            self._buf_lst[self._buffer_cnt] = f"{self._buffer_cnt + 1}_W_{lba}_0x{value:08X}"
             self._buffer_cnt += 1
 
     def _merge_erases(self):
-        erase_cnt = 0
-        first_lba = 0
-        for lba, memory_value in enumerate(self._buffer_cmd_memory):
-            if memory_value[0] != ERASE:
-                if erase_cnt > 0:
-                    erase_cnt = self._set_erase_command(first_lba, erase_cnt)
-                continue
-
-            first_lba = lba if erase_cnt == 0 else first_lba
-            erase_cnt += 1
-
-            if erase_cnt == MAX_ERASE_SIZE:
-                erase_cnt = self._set_erase_command(first_lba, erase_cnt)
+        for first_lba, erase_cnt in self._buffer_cmd_memory.erase_runs(self._max_erase_size):
+            self._set_erase_command(first_lba, erase_cnt)
 
     def _set_erase_command(self, lba, size):
-        if self._buffer_cnt == BUFFER_SIZE:
+        if self._buffer_cnt == self._buffer_size:
             self._flush(self._buffer_cnt)
 
         self._buf_lst[self._buffer_cnt] = f"{self._buffer_cnt + 1}_E_{lba}_{size}"
@@ -156,6 +485,12 @@ class Buffer:
         return 0
 
     def _flush(self, cnt):
+        if cnt > 0:
+            self._flushed = True
+            self._flush_policy.on_flush(cnt)
+            if self._metrics is not None:
+                self._metrics.count('buffer.flush')
+                self._metrics.observe('flush_batch', cnt)
         for i in range(cnt):
             self._remove_buffer_and_put_run_command(i)
             self._buf_lst[i] = f"{i + 1}_empty"
@@ -171,9 +506,12 @@ class Buffer:
         self._run_command.append([None, flushed_cmd, flushed_lba, flushed_value])
 
     def _update_buffer_files(self):
-        for filename in os.listdir(self._folder_path):
-            file_path = os.path.join(self._folder_path, filename)
-            os.remove(file_path)
-        for buf in self._buf_lst:
-            file_path = os.path.join(self._folder_path, buf)
-            open(file_path, 'a').close()
+        self._store.save(self._buf_lst)
+        # flush 된 command 가 NAND 에 쓰이기 전에 buffer 상태를 먼저 기록
+        if self._flushed:
+            self._store.compact()
+        elif self._run_command:
+            self._store.commit()
+
+    def close(self):
+        self._store.commit()
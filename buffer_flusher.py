@@ -0,0 +1,83 @@
+import threading
+import time
+
+from ssd_lock import LBARangeLock
+from ssd_texts import SSDNullOutput
+
+FLUSH_INTERVAL = 0.005
+# buffer 가 가득 차기 전(high-water)에 비워서 foreground write 가 동기 flush 를 만나지 않게 하되
+# 그 전까지는 모아 두어서 같은 LBA 에 대한 write 가 합쳐지게 함
+# threshold 를 주지 않으면 buffer 크기에서 FLUSH_HEADROOM 칸을 남긴 값
+FLUSH_HEADROOM = 2
+
+
+class BackgroundFlusher:
+    # buffer -> NAND flush 를 별도 thread 에서 수행
+    # lock 순서는 항상 buffer -> LBA 범위 -> nand, NAND 에 가야 하는 쪽은 buffer lock 을 놓기 전에 범위 lock 을 잡음
+    # drain 은 command 하나씩 nand lock 을 잡으므로, 다른 LBA 를 읽는 foreground command 는 drain 전체를 기다리지 않음
+    def __init__(self, ssd, buffer, interval=FLUSH_INTERVAL, threshold=None):
+        self._ssd = ssd
+        self._buffer = buffer
+        self._interval = interval
+        self._threshold = threshold if threshold is not None else max(1, buffer.buffer_size - FLUSH_HEADROOM)
+        self._buffer_lock = threading.Lock()
+        self._range_lock = LBARangeLock()
+        self._nand_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        # high-water 를 넘으면 interval 을 기다리지 않고 바로 깨움
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.drain_cnt = 0
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name="ssd-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.drain()
+
+    def run(self, sys_argv):
+        with self._buffer_lock:
+            run_command_lst = self._buffer.run(sys_argv)
+            if self._buffer.buffer_cnt >= self._threshold:
+                self._wakeup.set()
+            if not run_command_lst:
+                return
+            ranges = self._range_lock.acquire(self._ssd.command_ranges(run_command_lst))
+
+        try:
+            with self._nand_lock:
+                self._ssd.apply_commands(run_command_lst)
+        finally:
+            self._range_lock.release(ranges)
+
+    def drain(self):
+        with self._buffer_lock:
+            if self._buffer.buffer_cnt == 0:
+                return
+            run_command_lst = self._buffer.run([None, 'F'])
+            ranges = self._range_lock.acquire(self._ssd.command_ranges(run_command_lst))
+
+        # background flush 는 foreground 의 ssd_output.txt 결과를 건드리지 않음
+        for index, argv in enumerate(run_command_lst):
+            try:
+                with self._nand_lock:
+                    self._ssd.apply_commands([argv], SSDNullOutput())
+            finally:
+                self._range_lock.release([ranges[index]])
+            # GIL 을 내줘서 기다리던 foreground command 가 다음 command 전에 들어오게 함
+            time.sleep(0)
+        self.drain_cnt += 1
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+            if not self._stop_event.is_set() and self._buffer.buffer_cnt >= self._threshold:
+                self.drain()
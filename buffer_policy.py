@@ -0,0 +1,115 @@
+import time
+from abc import ABC, abstractmethod
+
+
+class FlushPolicy(ABC):
+    # buffer 가 가득 차면 flush 하는 것은 모든 policy 공통, 추가 flush 시점만 policy 가 결정
+    def __init__(self):
+        self.hit_cnt = 0
+        self.miss_cnt = 0
+        self.raw_cnt = 0
+        self.coalesce_cnt = 0
+        self.flush_cnt = 0
+        self.flushed_cmd_cnt = 0
+
+    def on_read(self, hit):
+        if hit:
+            self.hit_cnt += 1
+        else:
+            self.miss_cnt += 1
+
+    def on_update(self, coalesced):
+        self.raw_cnt += 1
+        if coalesced:
+            self.coalesce_cnt += 1
+
+    def on_flush(self, cnt):
+        self.flush_cnt += 1
+        self.flushed_cmd_cnt += cnt
+
+    @abstractmethod
+    def flush_count(self, buffer_cnt, cmd, hit): pass
+
+    def stats(self):
+        return {
+            'policy': type(self).__name__,
+            'hit': self.hit_cnt,
+            'miss': self.miss_cnt,
+            'raw': self.raw_cnt,
+            'coalesce': self.coalesce_cnt,
+            'flush': self.flush_cnt,
+            'flushed_cmd': self.flushed_cmd_cnt,
+        }
+
+
+class BufferFullFlushPolicy(FlushPolicy):
+    def flush_count(self, buffer_cnt, cmd, hit):
+        return 0
+
+
+class WatermarkFlushPolicy(FlushPolicy):
+    # high 개 이상 쌓이면 low 개만 남기고 flush
+    def __init__(self, high, low):
+        super().__init__()
+        if not 0 <= low < high:
+            raise ValueError("ERROR")
+        self._high = high
+        self._low = low
+
+    def flush_count(self, buffer_cnt, cmd, hit):
+        if cmd in ('W', 'E') and buffer_cnt >= self._high:
+            return buffer_cnt - self._low
+        return 0
+
+
+class AgeFlushPolicy(FlushPolicy):
+    # 가장 오래된 buffer 내용이 max_age 초를 넘기면 전부 flush
+    def __init__(self, max_age, clock=time.monotonic):
+        super().__init__()
+        self._max_age = max_age
+        self._clock = clock
+        self._oldest = None
+
+    def on_flush(self, cnt):
+        super().on_flush(cnt)
+        self._oldest = None
+
+    def flush_count(self, buffer_cnt, cmd, hit):
+        if buffer_cnt == 0:
+            self._oldest = None
+            return 0
+        now = self._clock()
+        if self._oldest is None:
+            self._oldest = now
+        if now - self._oldest >= self._max_age:
+            return buffer_cnt
+        return 0
+
+
+class ReadMissFlushPolicy(FlushPolicy):
+    # read 가 NAND 까지 가야 하면 그때 buffer 도 같이 비움
+    def flush_count(self, buffer_cnt, cmd, hit):
+        if cmd == 'R' and not hit:
+            return buffer_cnt
+        return 0
+
+
+class CoalesceRatioFlushPolicy(FlushPolicy):
+    # 최근 window 개 W/E 중 병합된 비율이 min_ratio 아래로 떨어지면 flush
+    def __init__(self, min_ratio, window=10):
+        super().__init__()
+        self._min_ratio = min_ratio
+        self._window = window
+        self._recent = []
+
+    def on_update(self, coalesced):
+        super().on_update(coalesced)
+        self._recent = (self._recent + [coalesced])[-self._window:]
+
+    def flush_count(self, buffer_cnt, cmd, hit):
+        if cmd not in ('W', 'E') or len(self._recent) < self._window:
+            return 0
+        if sum(self._recent) / len(self._recent) < self._min_ratio:
+            self._recent = []
+            return buffer_cnt
+        return 0
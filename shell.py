@@ -1,14 +1,140 @@
+import asyncio
+import atexit
+import collections
 import contextlib
 import datetime
 import glob
 import inspect
 import io
+import json
 import os
+import queue
 import random
+import shutil
 import sys
+import tempfile
+import threading
 import time
+import zipfile
 from abc import ABC, abstractmethod
-from ssd_interface import SSDInterface, SSDConcreteInterface
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from ssd import SSD
+from ssd_interface import SSDInterface, SSDConcreteInterface, SSDSocketInterface
+from ssd_shard import SSDShardRouter
+from ssd_trace import SSDTraceRecorder
+from ssd_texts import MAX_NAND_SIZE, SSDNand, SSDBinaryNand, SSDNumpyNand, SSDSparseNand, SSDOutput
+from ssd_workload import WorkloadSpec, run_workload, run_workload_async
+
+# fullread 에서 RR 한 번에 읽는 LBA 수
+RANGE_CHUNK_SIZE = 10000
+# workload 뒤에 붙일 수 있는 key=value 인자 최대 개수
+MAX_WORKLOAD_ARGS = 9
+# stream mode 에서 동시에 보내 두는 command 수와 모아서 출력하는 줄 수
+STREAM_QUEUE_DEPTH = 32
+STREAM_FLUSH_LINES = 4096
+
+
+class LogArchiver:
+    # rotate 된 until_*.log 를 background thread 에서 zip 으로 압축하고 개수 / 전체 크기 제한을 넘으면 오래된 것부터 지움
+    # 목록은 index 파일에 남겨 두어서 rotate 할 때마다 폴더를 다시 읽지 않음
+    INDEX_FILE = 'log_archive.json'
+    MAX_ARCHIVE_CNT = 20
+    MAX_ARCHIVE_BYTES = 1024 * 1024  # 1MB
+
+    def __init__(self, max_archive_cnt=MAX_ARCHIVE_CNT, max_archive_bytes=MAX_ARCHIVE_BYTES):
+        self._max_archive_cnt = max_archive_cnt
+        self._max_archive_bytes = max_archive_bytes
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = []
+        self._logs = None
+        self._archives = None
+
+    def _load(self):
+        # 처음 한 번만 index 를 읽고, index 가 없으면 그때만 폴더를 확인
+        if self._logs is not None:
+            return
+        try:
+            with open(self.INDEX_FILE, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            self._logs, self._archives = index['logs'], index['archives']
+        except (OSError, ValueError, KeyError):
+            self._logs = sorted(glob.glob("until_*.log"))
+            self._archives = [{'name': name, 'size': os.path.getsize(name)} for name in sorted(glob.glob("until_*.zip"))]
+
+    def _save(self):
+        with open(self.INDEX_FILE + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'logs': self._logs, 'archives': self._archives}, file, indent=2)
+        os.replace(self.INDEX_FILE + '.tmp', self.INDEX_FILE)
+
+    def rotated_logs(self):
+        with self._lock:
+            self._load()
+            return list(self._logs)
+
+    def add_log(self, name):
+        with self._lock:
+            self._load()
+            if name not in self._logs:
+                self._logs.append(name)
+            self._save()
+
+    def archive(self, name):
+        # 압축은 기다리지 않음, 실패하면 다시 목록에 넣어서 다음 rotate 때 또 시도
+        with self._lock:
+            self._load()
+            if name in self._logs:
+                self._logs.remove(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-archiver")
+            self._futures = [future for future in self._futures if not future.done()]
+            self._futures.append(self._executor.submit(self._compress, name))
+
+    def _compress(self, name):
+        zip_name = name[:-len(".log")] + ".zip"
+        try:
+            with zipfile.ZipFile(zip_name + '.tmp', 'w', zipfile.ZIP_DEFLATED) as archive:
+                archive.write(name, os.path.basename(name))
+            os.replace(zip_name + '.tmp', zip_name)
+            os.remove(name)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(zip_name + '.tmp')
+            # 다음 rotate 때 다시 시도하도록 목록에 되돌리고 index 에도 남김
+            with self._lock:
+                if self._logs is not None and os.path.exists(name) and name not in self._logs:
+                    self._logs.insert(0, name)
+                    self._save()
+            return
+        with self._lock:
+            self._load()
+            self._archives.append({'name': zip_name, 'size': os.path.getsize(zip_name)})
+            self._apply_retention()
+            self._save()
+
+    def _apply_retention(self):
+        total = sum(archive['size'] for archive in self._archives)
+        while self._archives and (len(self._archives) > self._max_archive_cnt or total > self._max_archive_bytes):
+            oldest = self._archives.pop(0)
+            total -= oldest['size']
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(oldest['name'])
+
+    def flush(self):
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            executor, self._executor = self._executor, None
+            # 다음에 쓸 때 (다른 폴더일 수 있음) index 를 다시 읽음
+            self._logs = None
+            self._archives = None
+        if executor is not None:
+            executor.shutdown(wait=True)
 
 
 class Logger:
@@ -26,24 +152,90 @@ class Logger:
         if self._initialized:
             return
         self._initialized = True
+        # print 는 queue 에 넣기만 하고, 파일 쓰기와 rotate 는 writer thread 가 모아서 처리
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._size = None
+        self._last_timestamp = None
+        self._rotate_cnt = 0
+        self.archiver = LogArchiver()
+        atexit.register(self.close)
 
     def print(self, header, message):
-        self.rotate_log_if_needed()
-        with open("latest.log", 'a', encoding='utf-8') as file:
-            now = datetime.datetime.now()
-            log = f"[{now.strftime('%y.%m.%d %H:%M')}] {header}\t: {message}\n"
-            log = log.expandtabs(tabsize=70)
-            file.write(log)
+        if self._writer is None:
+            self._start_writer()
+        self._queue.put((datetime.datetime.now(), header, message))
 
-    def rotate_log_if_needed(self):
-        if os.path.exists(self.LOG_FILE) and os.path.getsize(self.LOG_FILE) > self.MAX_SIZE:
-            for existing in glob.glob("until_*.log"):
-                os.rename(existing, existing.replace(".log", ".zip"))
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="shell-logger", daemon=True)
+                self._writer.start()
 
+    def _write_loop(self):
+        while True:
+            records = [self._queue.get()]
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_records([record for record in records if record is not None])
+            except Exception:
+                # log 를 못 써도 shell 은 계속 동작하도록 writer thread 는 살려 둠 (flush 가 멈추지 않게)
+                # 어디까지 썼는지 모르므로 다음 batch 에서 파일 크기를 다시 확인
+                self._size = None
+            finally:
+                for _ in records:
+                    self._queue.task_done()
+            if None in records:
+                return
+
+    def _write_records(self, records):
+        if not records:
+            return
+        if self._size is None:
+            self._size = os.path.getsize(self.LOG_FILE) if os.path.exists(self.LOG_FILE) else 0
+        self.rotate_log_if_needed(self._size)
+        logs = "".join(f"[{now.strftime('%y.%m.%d %H:%M')}] {header}\t: {message}\n".expandtabs(tabsize=70)
+                       for now, header, message in records)
+        with open("latest.log", 'a', encoding='utf-8') as file:
+            file.write(logs)
+        self._size += len(logs.encode('utf-8'))
+
+    def flush(self):
+        # 지금까지 print 한 내용이 파일에 써질 때까지 기다림
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+        self._size = None
+        self.archiver.close()
+
+    def rotate_log_if_needed(self, size=None):
+        # size 를 주면 writer thread 가 세고 있는 크기로 판단, 없으면 파일 크기를 확인
+        if size is None:
+            size = os.path.getsize(self.LOG_FILE) if os.path.exists(self.LOG_FILE) else 0
+        if size > self.MAX_SIZE:
+            # 직전에 rotate 된 log 는 background 에서 압축, 방금 rotate 한 log 는 다음 rotate 까지 그대로 둠
+            for existing in self.archiver.rotated_logs():
+                self.archiver.archive(existing)
+
+            # sleep 대신 같은 초에 다시 rotate 하면 번호를 붙여 이름이 겹치지 않게 함
             timestamp = time.strftime("until_%y%m%d_%Hh_%Mm_%Ss")
-            new_name = f"{timestamp}.log"
+            self._rotate_cnt = self._rotate_cnt + 1 if timestamp == self._last_timestamp else 0
+            self._last_timestamp = timestamp
+            new_name = f"{timestamp}.log" if self._rotate_cnt == 0 else f"{timestamp}_{self._rotate_cnt}.log"
             os.rename(self.LOG_FILE, new_name)
-            time.sleep(1)
+            self.archiver.add_log(new_name)
+            self._size = 0
 
 
 class Command(ABC):
@@ -91,7 +283,8 @@ class ShellEraseCommand(Command):
         self.erase_size = erase_size
 
     def execute(self):
-        if (0 > self.st_lba or self.st_lba > 99) or (1 > self.erase_size or self.erase_size > 100) or (self.st_lba + self.erase_size > 100):
+        capacity = self.shell.capacity
+        if (0 > self.st_lba or self.st_lba > capacity - 1) or (1 > self.erase_size or self.erase_size > capacity) or (self.st_lba + self.erase_size > capacity):
             self.shell.logger.print(f"{self.execute.__qualname__}()", f"FAIL")
             raise Exception()
 
@@ -112,7 +305,7 @@ class ShellEraseRangeCommand(Command):
         self.en_lba = en_lba
 
     def execute(self) -> None:
-        if self.st_lba > self.en_lba or self.st_lba < 0 or self.en_lba > 100:
+        if self.st_lba > self.en_lba or self.st_lba < 0 or self.en_lba > self.shell.capacity:
             raise ValueError
 
         erase_range = self.en_lba - self.st_lba + 1  # inclusive range
@@ -125,8 +318,7 @@ class ShellFullWriteCommand(Command):
         self.value = value
 
     def execute(self):
-        for lba in range(100):
-            self.shell.send_command('W', lba, self.value)
+        self.shell.send_command('WR', 0, self.value, size=self.shell.capacity)
 
         print("[Full Write] Done")
         self.shell.logger.print(f"{self.execute.__qualname__}()", "DONE")
@@ -137,13 +329,15 @@ class ShellFullReadCommand(Command):
 
     def execute(self):
         print("[Full Read]")
-        for lba in range(100):
+        for st_lba in range(0, self.shell.capacity, RANGE_CHUNK_SIZE):
             try:
-                self.shell.send_command('R', lba)
-                value = self.shell.get_response_value()
-                if value == "ERROR":
-                    print(value)
-                print(f"LBA {lba} : {value}")
+                size = min(RANGE_CHUNK_SIZE, self.shell.capacity - st_lba)
+                self.shell.send_command('RR', st_lba, size=size)
+                values = self.shell.get_response_values()
+                for offset, value in enumerate(values):
+                    if value == "ERROR":
+                        print(value)
+                    print(f"LBA {st_lba + offset} : {value}")
             except Exception as e:
                 self.shell.logger.print(f"{self.execute.__qualname__}()", "FAIL")
                 raise e
@@ -155,7 +349,7 @@ class ShellFullWriteAndReadCompareCommand(Command):
         super().__init__(shell)
 
     def execute(self):
-        for st_lba in range(0, 100, 5):
+        for st_lba in range(0, self.shell.capacity - 4, 5):
             for offset in range(5):
                 random_value = random.randint(0, 0xFFFFFFFF)
                 self.shell.send_command('W', st_lba + offset, random_value)
@@ -200,12 +394,12 @@ class ShellEraseAndWriteAgingCommand(Command):
         random_value1, random_value2 = [random.randint(0, 0xFFFFFFFF) for _ in range(2)]
         self.shell.send_command('W', lba, random_value1)
         self.shell.send_command('W', lba, random_value2)
-        ShellEraseRangeCommand(self.shell, lba, min(lba + 2, 99)).execute()
+        ShellEraseRangeCommand(self.shell, lba, min(lba + 2, self.shell.capacity - 1)).execute()
 
     def execute(self):
         self.shell.send_command('E', 0, 3)
         for _ in range(30):
-            for lba in range(2, 100, 2):
+            for lba in range(2, self.shell.capacity, 2):
                 try:
                     self._aging(lba)
                 except Exception as e:
@@ -222,14 +416,15 @@ class ShellWriteReadAgingCommand(Command):
 
     def execute(self):
         random_value = random.randint(0, 0xFFFFFFFF)
+        last_lba = self.shell.capacity - 1
         for _ in range(200):
             self.shell.send_command('W', 0, random_value)
-            self.shell.send_command('W', 99, random_value)
+            self.shell.send_command('W', last_lba, random_value)
 
             self.shell.send_command('R', 0)
             ref_value = self.shell.get_response_value()
 
-            self.shell.send_command('R', 99)
+            self.shell.send_command('R', last_lba)
             comp_value = self.shell.get_response_value()
 
             if ref_value != comp_value:
@@ -265,6 +460,10 @@ class ShellHelpCommand(Command):
               'exit : exit program\n',
               'fullwrite Value : write value all memory Index               ex)[Full Write] Done\n',
               'fullread : read all memory Index value                       ex)[Full Read] ...\n',
+              'format : reset all memory Index to 0x00000000               ex)[Format] Done\n',
+              'stats : show command counters and latency histograms        ex)[Stats] ...\n',
+              'workload [seq|rand] [read=% write=% erase=%] [range=0-99] [bs=N] [ops=N|time=S] [qd=N] [seed=N]\n',
+              '         : run a generated workload and report IOPS and latency  ex)[Workload] ...\n',
               '1_FullWriteAndReadCompare : compare write and read on every 5 Index \n',
               '2_PartialLBAWrite : Write a random value at the 0~4 index and check if the values are the same 30 times.\n',
               '3_WriteReadAging : Write a random value at index 0.99 and check if the values are the same 200 times.\n',
@@ -272,33 +471,230 @@ class ShellHelpCommand(Command):
               )
         self.shell.logger.print(f"{self.execute.__qualname__}()", "DONE")
 
+class ShellFormatCommand(Command):
+    def __init__(self, shell):
+        super().__init__(shell)
+
+    def execute(self):
+        self.shell.send_command('FORMAT')
+        print("[Format] Done")
+        self.shell.logger.print(f"{self.execute.__qualname__}()", "DONE")
+
+class ShellStatsCommand(Command):
+    def __init__(self, shell):
+        super().__init__(shell)
+
+    def execute(self):
+        self.shell.send_command('STATS')
+        print("[Stats]")
+        print(self.shell.get_response().rstrip("\n"))
+        self.shell.logger.print(f"{self.execute.__qualname__}()", "DONE")
+
+class ShellWorkloadCommand(Command):
+    def __init__(self, shell, tokens):
+        super().__init__(shell)
+        self.spec = WorkloadSpec.parse(tokens, shell.capacity)
+
+    def execute(self):
+        if self.spec.qd == 1:
+            report = run_workload(self.spec, self._execute)
+        else:
+            report = asyncio.run(self._run_queued())
+        print("[Workload]")
+        for line in report.lines():
+            print(line)
+        self.shell.logger.print(f"{self.execute.__qualname__}()", "DONE")
+
+    def _execute(self, args):
+        if self.shell.trace is not None:
+            self.shell.trace.record(args)
+        return self.shell.ssd_interface.execute(args)
+
+    async def _run_queued(self):
+        # qd > 1 도 qd = 1 과 같은 interface (같은 SSD, 또는 같은 server) 의 queue 로 보냄
+        queue_interface = self.shell.ssd_interface.queue_interface(self.spec.qd)
+        try:
+            return await run_workload_async(self.spec, queue_interface)
+        finally:
+            await queue_interface.close()
+
+
+class ShellStream:
+    # stdin / 파일의 shell command 를 한 줄씩 끝나기를 기다리지 않고 queue pair 로 이어서 보냄
+    # read / write / erase / erase_range / flush 는 in flight 로 두고 (같은 LBA 끼리는 순서 유지, 인접 R / W 는 합쳐짐)
+    # 그 외 command 는 앞의 command 가 다 끝난 뒤 원래대로 실행, 출력은 입력 순서대로 모아서 씀
+    def __init__(self, shell, out=None, queue_depth=STREAM_QUEUE_DEPTH):
+        self.shell = shell
+        self._out = out if out is not None else sys.stdout
+        self._queue_depth = queue_depth
+        self._pending = collections.deque()
+        self._lines = []
+        self.command_cnt = 0
+        self.error_cnt = 0
+
+    def run(self, file):
+        asyncio.run(self._run(file))
+        self.shell.logger.print(f"{self.run.__qualname__}()", f"{self.command_cnt} commands, {self.error_cnt} errors")
+
+    async def _run(self, file):
+        # shell 이 쓰는 interface (같은 SSD, 또는 같은 server) 의 queue 로 보냄
+        interface = self.shell.ssd_interface
+        queue_interface = interface.queue_interface(self._queue_depth)
+        if isinstance(interface, SSDConcreteInterface):
+            # 결과는 stream 출력으로만 내보내므로 나머지 command 도 ssd_output.txt 를 쓰지 않음
+            self.shell.ssd_interface = SSDConcreteInterface(output_sink=False, ssd=interface.ssd)
+        try:
+            for line in file:
+                args = line.split()
+                if not args:
+                    continue
+                if args[0].lower() == "exit":
+                    break
+                self.command_cnt += 1
+                if not await self._submit(queue_interface, args):
+                    await self._drain()
+                    # workload 처럼 안에서 event loop 를 쓰는 command 도 있으므로 다른 thread 에서 실행
+                    await asyncio.to_thread(self._run_command, args)
+                self._collect()
+            await self._drain()
+        finally:
+            await queue_interface.close()
+            self.shell.ssd_interface = interface
+            self._flush_output()
+
+    async def _submit(self, interface, args):
+        # in flight 로 보낼 수 있는 command 면 True
+        try:
+            if args[0] == 'read' and len(args) == 2:
+                lba = int(args[1])
+                futures = [await self._send(interface, [None, 'R', lba])]
+                self._pending.append((futures, lambda results: [f"[Read] LBA {lba}: {self._value(results[0])}"]))
+            elif args[0] == 'write' and len(args) == 3:
+                argv = [None, 'W', int(args[1]), f"0x{int(args[2], 16):08X}"]
+                futures = [await self._send(interface, argv)]
+                self._pending.append((futures, lambda results: ['[Write] Done'] if results[0].output == '' else []))
+            elif args[0] in ('erase', 'erase_range') and len(args) == 3:
+                st_lba = int(args[1])
+                erase_size = int(args[2]) if args[0] == 'erase' else int(args[2]) - st_lba + 1
+                if st_lba < 0 or erase_size < 1 or st_lba + erase_size > self.shell.capacity:
+                    raise ValueError("INVALID COMMAND")
+                futures = [await self._send(interface, [None, 'E', lba, min(10, st_lba + erase_size - lba)])
+                           for lba in range(st_lba, st_lba + erase_size, 10)]
+                self._pending.append((futures, lambda results: []))
+            elif args[0] == 'flush' and len(args) == 1:
+                self._pending.append(([await self._send(interface, [None, 'F'])], lambda results: []))
+            else:
+                return False
+        except ValueError:
+            self._pending.append(([], lambda results: ["INVALID COMMAND"]))
+        return True
+
+    async def _send(self, interface, argv):
+        if self.shell.trace is not None:
+            self.shell.trace.record(argv)
+        return await interface.submit(argv)
+
+    @staticmethod
+    def _value(result):
+        parts = result.output.split()
+        return parts[1] if len(parts) == 2 else result.output
+
+    def _collect(self):
+        # 앞에서부터 끝난 것만 출력에 넣음
+        while self._pending and all(future.done() for future in self._pending[0][0]):
+            futures, formatter = self._pending.popleft()
+            results = [future.result() for future in futures]
+            lines = formatter(results)
+            self.error_cnt += sum(result.is_error for result in results) + (lines == ["INVALID COMMAND"])
+            self._lines.extend(lines)
+        if len(self._lines) >= STREAM_FLUSH_LINES:
+            self._flush_output()
+
+    async def _drain(self):
+        if self._pending:
+            await asyncio.gather(*(future for futures, _ in self._pending for future in futures))
+            self._collect()
+        self._flush_output()
+
+    def _run_command(self, args):
+        with contextlib.redirect_stdout(self._out):
+            try:
+                self.shell.main_function(args)
+            except Exception:
+                self.error_cnt += 1
+                print("INVALID COMMAND")
+
+    def _flush_output(self):
+        if self._lines:
+            self._out.write("\n".join(self._lines) + "\n")
+            self._lines.clear()
+        self._out.flush()
+
+def create_ssd_interface():
+    # SSD_SERVER_SOCKET 이 있으면 떠 있는 ssd_server.py 에 연결
+    socket_path = os.environ.get('SSD_SERVER_SOCKET')
+    if socket_path:
+        return SSDSocketInterface(socket_path)
+    # SSD_SHARD_CNT 가 있으면 LBA 공간을 나누어 맡는 worker process 들을 띄워서 사용
+    shard_cnt = os.environ.get('SSD_SHARD_CNT')
+    if shard_cnt:
+        capacity = int(os.environ.get('SSD_NAND_CAPACITY', MAX_NAND_SIZE))
+        return SSDConcreteInterface(ssd=SSD(True, SSDShardRouter(capacity, int(shard_cnt))))
+    return SSDConcreteInterface()
+
+
 class Shell:
-    def __init__(self):
+    def __init__(self, capacity=None, ssd_interface: SSDInterface = None, trace: SSDTraceRecorder = None):
         self.logger = Logger()
-        self.ssd_interface: SSDInterface = SSDConcreteInterface()
-
-    def send_command(self, command, lba=0, value=None):
+        self.ssd_interface: SSDInterface = ssd_interface if ssd_interface is not None else create_ssd_interface()
+        # capacity 를 주지 않으면 device 의 LBA 개수를 따름
+        self.capacity = capacity if capacity is not None else self.ssd_interface.capacity
+        # SSD_SHELL_TRACE_PATH 가 있으면 shell 이 보낸 command 를 trace 파일에 기록
+        if trace is None and os.environ.get('SSD_SHELL_TRACE_PATH'):
+            trace = SSDTraceRecorder(os.environ['SSD_SHELL_TRACE_PATH'])
+        self.trace = trace
+
+    def send_command(self, command, lba=0, value=None, size=None):
+        if command in ('W', 'WR') and type(value) is int:
+            value = f"0x{value:08X}"
         if command == 'W':
-            if type(value) is int:
-                value = f"0x{value:08X}"
-            return self.ssd_interface.run([None, 'W', lba, value])
-        if command == 'R':
-            return self.ssd_interface.run([None, 'R', lba])
-        if command == 'E':
-            return self.ssd_interface.run([None, 'E', lba, value])
-        if command == 'F':
-            return self.ssd_interface.run([None, 'F'])
-        return None
+            args = [None, 'W', lba, value]
+        elif command == 'R':
+            args = [None, 'R', lba]
+        elif command == 'E':
+            args = [None, 'E', lba, value]
+        elif command in ('F', 'FORMAT', 'STATS'):
+            args = [None, command]
+        elif command == 'RR':
+            args = [None, 'RR', lba, size]
+        elif command == 'WR':
+            args = [None, 'WR', lba, size, value]
+        else:
+            return None
+
+        if self.trace is not None:
+            self.trace.record(args)
+        return self.ssd_interface.run(args)
 
     def get_response(self):
         return self.ssd_interface.get_response()
 
     def get_response_value(self):
         output = self.ssd_interface.get_response()
-        if len(output.split()) == 2:
-            return output.split()[1]
+        parts = output.split()
+        if len(parts) == 2:
+            return parts[1]
         return output
 
+    def get_response_values(self):
+        # RR 응답, 한 줄에 LBA 하나
+        output = self.ssd_interface.get_response()
+        values = []
+        for line in output.splitlines() or [output]:
+            parts = line.split()
+            values.append(parts[1] if len(parts) == 2 else line)
+        return values
+
     # help : 프로그램 사용법
 
 
@@ -326,7 +722,10 @@ class Shell:
             ('help', 1): lambda: ShellHelpCommand(self),
             ('erase', 3): lambda: ShellEraseCommand(self, int(args[1]), int(args[2])),
             ('erase_range', 3): lambda: ShellEraseRangeCommand(self, int(args[1]), int(args[2])),
-            ('flush',1): lambda:ShellFlushCommand(self)
+            ('flush',1): lambda:ShellFlushCommand(self),
+            ('format', 1): lambda: ShellFormatCommand(self),
+            ('stats', 1): lambda: ShellStatsCommand(self),
+            **{('workload', cnt): lambda: ShellWorkloadCommand(self, args[1:]) for cnt in range(1, MAX_WORKLOAD_ARGS + 2)}
         }
         return command_dict
 
@@ -345,25 +744,101 @@ class Shell:
         }
         return option_dict
 
+    def run_option_command(self, command):
+        # script 한 줄(scenario)을 실행하고 출력 내용을 돌려줌
+        output_capture = io.StringIO()
+        with contextlib.redirect_stdout(output_capture):
+            # self.command_dictionary(command[0:2])[(command[0:2], 1)]()
+            shellCommand: Command = self.command_dictionary(command[0:2])[(command[0:2], 1)]()
+            shellCommand.execute()
+        return output_capture.getvalue().strip()
+
     def option_main(self, path):
         if os.path.exists(path):
             with open(path, "r", encoding="utf-8") as file:
                 command_lines = file.readlines()
             for command in command_lines:
                 print(command[0:-1] + ' ' * self.option_dict()[command[0:2]] + '___   Run...', end=' ', flush=True)
-                output_capture = io.StringIO()
-                with contextlib.redirect_stdout(output_capture):
-                    # self.command_dictionary(command[0:2])[(command[0:2], 1)]()
-                    shellCommand: Command = self.command_dictionary(command[0:2])[(command[0:2], 1)]()
-                    shellCommand.execute()
-                print(output_capture.getvalue().strip())
-                if (output_capture.getvalue().strip()) == 'FAIL': return
+                output = self.run_option_command(command)
+                print(output)
+                if output == 'FAIL': return
         else:
             print("ERROR")
 
+    def option_main_parallel(self, path, jobs):
+        # scenario 마다 별도 process, 별도 폴더(빈 NAND / buffer)에서 실행하고 결과는 script 순서대로 출력
+        # FAIL 이 나오면 거기서 멈추고 아직 시작하지 않은 scenario 는 취소, FAIL 난 폴더는 남겨 둠
+        if not os.path.exists(path):
+            print("ERROR")
+            return
+        with open(path, "r", encoding="utf-8") as file:
+            command_lines = [line.rstrip("\n") for line in file if line.strip()]
+        paddings = [self.option_dict()[command[0:2]] for command in command_lines]
+
+        root = tempfile.mkdtemp(prefix="shell_scenarios_", dir=os.getcwd())
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_scenario_worker)
+        try:
+            futures = [executor.submit(_run_scenario, command, root) for command in command_lines]
+            for command, padding, future in zip(command_lines, paddings, futures):
+                output, elapsed, folder = future.result()
+                print(command + ' ' * padding + '___   Run...', output, f"({elapsed:.3f}s)", flush=True)
+                if output == 'FAIL':
+                    print(f"device kept in {folder}")
+                    return
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            with contextlib.suppress(OSError):
+                os.rmdir(root)
+
+
+def _init_scenario_worker():
+    # fork 로 받은 logger writer thread 는 child 에 없으므로 새로 만들게 함
+    Logger._instance = None
+    # scenario 끼리 같은 server 를 공유하지 않도록 항상 process 안의 SSD 사용
+    os.environ.pop('SSD_SERVER_SOCKET', None)
+
+
+def _run_scenario(command, root):
+    folder = tempfile.mkdtemp(prefix=f"{command[0:2]}", dir=root)
+    cwd = os.getcwd()
+    os.chdir(folder)
+    # NAND / output singleton 이 이전 scenario 폴더의 상태를 들고 있지 않도록 초기화
+    for text_cls in (SSDNand, SSDBinaryNand, SSDNumpyNand, SSDSparseNand, SSDOutput):
+        text_cls._instance = None
+    try:
+        start = time.perf_counter()
+        shell = Shell()
+        output = shell.run_option_command(command)
+        elapsed = time.perf_counter() - start
+        shell.logger.close()
+        if shell.trace is not None:
+            shell.trace.close()
+    finally:
+        os.chdir(cwd)
+    if output != 'FAIL':
+        shutil.rmtree(folder, ignore_errors=True)
+    return output, elapsed, folder
+
 
 if __name__ == "__main__":
-    if len(sys.argv) == 1:
-        Shell().main()
-    elif len(sys.argv) == 2:
-        Shell().option_main(sys.argv[1])
+    shell = Shell()
+    try:
+        if len(sys.argv) == 1:
+            shell.main()
+        elif sys.argv[1] == '--stream':
+            # python shell.py --stream [commands.txt] : 파일(없으면 stdin)의 command 를 이어서 실행
+            if len(sys.argv) == 3:
+                with open(sys.argv[2], "r", encoding="utf-8") as file:
+                    ShellStream(shell).run(file)
+            else:
+                ShellStream(shell).run(sys.stdin)
+        elif len(sys.argv) == 2:
+            # SSD_SHELL_JOBS 가 2 이상이면 scenario 를 process pool 에서 나눠 실행
+            jobs = int(os.environ.get('SSD_SHELL_JOBS', 1))
+            if jobs > 1:
+                shell.option_main_parallel(sys.argv[1], jobs)
+            else:
+                shell.option_main(sys.argv[1])
+    finally:
+        if shell.trace is not None:
+            shell.trace.close()
@@ -1,45 +1,307 @@
+import contextlib
+import os
 import sys
+import threading
+
+from buffer import Buffer, BufferStore, BufferJournalStore, BUFFER_SIZE
+from buffer_flusher import BackgroundFlusher
+from buffer_policy import FlushPolicy
+from ssd_lock import SSDFileLock, LBARangeLock
+from ssd_metrics import SSDMetrics, DEFAULT_METRICS
+from ssd_timing import NandTimingModel, SSDTimedNand
+from ssd_trace import SSDTraceRecorder
+from ssd_commands import SSDCommand, SSDErrorCommand, SSDWriteCommand, SSDReadCommand, SSDEraseCommand, SSDFlushCommand, \
+    SSDRangeReadCommand, SSDRangeWriteCommand, SSDFormatCommand, SSDStatsCommand
+from ssd_result import SSDResult, ERROR_OUTPUT
+from ssd_texts import SSDNand, SSDBinaryNand, SSDNumpyNand, SSDSparseNand, SSDText, SSDTeeOutput, SSDNullOutput, \
+    MAX_NAND_SIZE, NAND_BIN_RECORD
+
+NAND_BACKENDS = {
+    'text': SSDNand,
+    'binary': SSDBinaryNand,
+    'sparse': SSDSparseNand,
+    'numpy': SSDNumpyNand,
+}
 
-from buffer import Buffer
-from ssd_commands import SSDCommand, SSDErrorCommand, SSDWriteCommand, SSDReadCommand, SSDEraseCommand, SSDFlushCommand
-from ssd_texts import SSDNand, SSDOutput
 
 class SSD:
-    def __init__(self, no_buf_mode = False):
+    def __init__(self, no_buf_mode = False, nand_txt: SSDText = None, buffer_store: BufferStore = None,
+                 buffer_size=BUFFER_SIZE, flush_policy: FlushPolicy = None, resident_buffer=False,
+                 output_txt: SSDText = None, file_lock: SSDFileLock = None, timing_model: NandTimingModel = None,
+                 metrics: SSDMetrics = None, trace: SSDTraceRecorder = None):
         self._no_buf_mode = no_buf_mode
+        self._nand_txt = nand_txt
+        self._buffer_store = buffer_store
+        self._buffer_size = buffer_size
+        self._flush_policy = flush_policy
+        self._resident_buffer = resident_buffer
+        # metrics 를 주지 않으면 process 안의 SSD 들이 DEFAULT_METRICS 를 같이 사용
+        self._metrics = metrics if metrics is not None else DEFAULT_METRICS
+        # output_txt 는 결과를 추가로 남길 sink, 기본은 ssd_output.txt
+        self._output_txt = SSDTeeOutput(output_txt, self._metrics)
+        self._buffer = None
+        self._flusher = None
+        # file_lock : process 간 lock, 한 process 안에서는 buffer lock + NAND LBA 범위 lock
+        self._file_lock = file_lock
+        self._file_locked = False
+        self._buffer_lock = threading.Lock()
+        self._range_lock = LBARangeLock()
+        # timing_model 이 있으면 NAND 작업과 buffer 처리를 모의 시간으로 계산
+        self._timing_model = timing_model
+        self._timed_nand = None
+        # trace 가 있으면 들어온 command 를 모두 기록 (ssd_trace.py 로 재현)
+        self._trace = trace
 
-    def run(self, sys_argv):
+    def _nand(self) -> SSDText:
+        nand_txt = self._nand_txt if self._nand_txt is not None else SSDNand()
+        if self._timing_model is None:
+            return nand_txt
+        if self._timed_nand is None:
+            self._timed_nand = SSDTimedNand(nand_txt, self._timing_model)
+        return self._timed_nand
 
-        command, args = self._get_command(sys_argv)
-        command.check_input_validity(args)
+    @property
+    def timing_model(self):
+        return self._timing_model
 
-        if self._no_buf_mode:
-            command.run_command(args)
-            return
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def _output(self) -> SSDText:
+        return self._output_txt
+
+    def _new_buffer(self):
+        return Buffer(self._nand().capacity, self._buffer_store, self._buffer_size,
+                      flush_policy=self._flush_policy, output_txt=self._output(), metrics=self._metrics)
+
+    def _get_buffer(self):
+        # resident 모드면 process 가 살아있는 동안 buffer 를 다시 만들지 않음
+        if not self._resident_buffer:
+            return self._new_buffer()
+        if self._buffer is None:
+            self._buffer = self._new_buffer()
+        return self._buffer
+
+    def start_background_flush(self, **kwargs):
+        # buffer 를 계속 유지하고 flush 는 background thread 에서 수행
+        if self._flusher is None:
+            self._resident_buffer = True
+            self._flusher = BackgroundFlusher(self, self._get_buffer(), **kwargs)
+            self._flusher.start()
+        return self._flusher
 
-        buffer = Buffer()
-        run_command_lst = buffer.run(sys_argv)
+    def stop_background_flush(self):
+        if self._flusher is not None:
+            self._flusher.stop()
+            self._flusher = None
 
-        if not run_command_lst:
+    def close(self):
+        self.stop_background_flush()
+        if self._buffer is not None:
+            self._buffer.close()
+        elif self._buffer_store is not None:
+            self._buffer_store.commit()
+        if self._file_locked:
+            self._file_locked = False
+            self._file_lock.release()
+        if self._trace is not None:
+            self._trace.flush()
+
+    @contextlib.contextmanager
+    def _device_lock(self):
+        # per-process 모드는 command 마다 잡고, resident 모드는 buffer 를 메모리에 들고 있으므로 close 까지 잡고 있음
+        if self._file_lock is None:
+            yield
+            return
+        if not self._resident_buffer:
+            self._acquire_file_lock()
+            try:
+                yield
+            finally:
+                self._file_lock.release()
             return
+        with self._buffer_lock:
+            if not self._file_locked:
+                self._acquire_file_lock()
+                self._file_locked = True
+        yield
+
+    def _acquire_file_lock(self):
+        # 다른 process (resident server 등) 가 제한 시간 넘게 잡고 있으면 ERROR 로 끝냄
+        if not self._file_lock.acquire():
+            self._metrics.count('lock.timeout')
+            self._output_txt.write(ERROR_OUTPUT)
+            raise ValueError(ERROR_OUTPUT)
+        # lock 을 기다리는 동안 다른 process 가 journal / NAND 를 바꿨을 수 있음
+        if self._buffer_store is not None:
+            self._buffer_store.refresh()
+        nand_txt = self._nand_txt if self._nand_txt is not None else SSDNand()
+        nand_txt.refresh()
+
+    @property
+    def capacity(self):
+        return self._nand().capacity
 
+    @property
+    def no_buf_mode(self):
+        return self._no_buf_mode
+
+    def is_valid(self, sys_argv):
+        command, args = self._get_command(sys_argv, SSDNullOutput())
+        try:
+            command.check_input_validity(args)
+        except ValueError:
+            return False
+        return True
+
+    def _lock_ranges(self, run_command_lst):
+        if not self._nand().range_parallel:
+            return [(0, self._nand().capacity)]
+        return self.command_ranges(run_command_lst)
+
+    def command_ranges(self, run_command_lst):
+        # command 마다 건드리는 LBA 범위 [start, end)
+        capacity = self._nand().capacity
+        ranges = []
         for argv in run_command_lst:
-            command, args = self._get_command(argv)
+            cmd = argv[1]
+            if cmd in ('R', 'W'):
+                ranges.append((int(argv[2]), int(argv[2]) + 1))
+            elif cmd in ('E', 'RR', 'WR'):
+                ranges.append((int(argv[2]), min(int(argv[2]) + int(argv[3]), capacity)))
+            else:
+                ranges.append((0, capacity))
+        return ranges
+
+    def execute(self, sys_argv) -> SSDResult:
+        # run 과 같지만 결과를 ssd_output.txt 를 다시 읽지 않고 바로 돌려줌
+        self._output_txt.reset()
+        try:
+            self.run(sys_argv)
+        except ValueError:
+            return SSDResult(sys_argv[1], ERROR_OUTPUT)
+        result = SSDResult(sys_argv[1], self._output_txt.read())
+        if self._timing_model is not None:
+            result.latency_us = self._timing_model.last_latency_us
+        return result
+
+    def run(self, sys_argv):
+        if self._trace is not None:
+            self._trace.record(sys_argv)
+
+        with self._metrics.timer('parse'):
+            command, args = self._get_command(sys_argv)
+            try:
+                command.check_input_validity(args)
+            except ValueError:
+                self._metrics.count('cmd.error')
+                raise
+        self._metrics.count(f"cmd.{sys_argv[1]}")
+
+        if command.bypass_buffer:
             command.run_command(args)
+            return
+
+        if self._timing_model is None:
+            self._run(sys_argv, command, args)
+            return
+        self._timing_model.begin()
+        try:
+            self._run(sys_argv, command, args)
+        finally:
+            self._timing_model.end()
+
+    def _run(self, sys_argv, command, args):
+        with self._device_lock():
+            if self._no_buf_mode:
+                with self._range_lock.hold(self._lock_ranges([sys_argv])), self._metrics.timer('nand'):
+                    command.run_command(args)
+                    self._count_nand_bytes(sys_argv)
+                return
+
+            if self._flusher is not None:
+                self._flusher.run(sys_argv)
+                return
 
-    def _get_command(self, sys_argv) -> (SSDCommand, list):
+            # NAND 범위 lock 은 buffer lock 을 놓기 전에 잡아서 flush 된 내용보다 read 가 먼저 NAND 에 가지 않게 함
+            with self._buffer_lock:
+                buffer = self._get_buffer()
+                with self._metrics.timer('buffer'):
+                    run_command_lst = buffer.run(sys_argv)
+                if not self._resident_buffer:
+                    # per-process 모드는 device lock 을 놓기 전에 group commit 으로 모아 둔 record 를 남김
+                    buffer.close()
+                if self._timing_model is not None:
+                    self._timing_model.buffer_hit()
+                if not run_command_lst:
+                    return
+                ranges = self._range_lock.acquire(self._lock_ranges(run_command_lst))
+
+            try:
+                self.apply_commands(run_command_lst)
+            finally:
+                self._range_lock.release(ranges)
+
+    def apply_commands(self, run_command_lst, output_txt: SSDText = None):
+        # flush 된 command 와 buffer 를 지나친 read 를 NAND 한 번의 read-modify-write 로 처리
+        with self._metrics.timer('nand'), self._nand().batch():
+            for argv in run_command_lst:
+                command, args = self._get_command(argv, output_txt)
+                command.run_command(args)
+                self._count_nand_bytes(argv)
+
+    def _count_nand_bytes(self, argv):
+        cmd = argv[1]
+        if cmd in ('R', 'W'):
+            lba_cnt = 1
+        elif cmd in ('E', 'RR', 'WR'):
+            lba_cnt = min(int(argv[3]), self.capacity - int(argv[2]))
+        elif cmd == 'FORMAT':
+            lba_cnt = self.capacity
+        else:
+            return
+        name = 'nand.bytes_read' if cmd in ('R', 'RR') else 'nand.bytes_written'
+        self._metrics.count(name, NAND_BIN_RECORD.size * lba_cnt)
+
+    def _get_command(self, sys_argv, output_txt: SSDText = None) -> (SSDCommand, list):
         cmd = sys_argv[1]
+        if output_txt is None:
+            output_txt = self._output()
 
         if cmd == 'W':
-            return SSDWriteCommand(SSDNand(), SSDOutput()), sys_argv[2:]
+            return SSDWriteCommand(self._nand(), output_txt), sys_argv[2:]
         elif cmd == 'R':
-            return SSDReadCommand(SSDNand(), SSDOutput()), sys_argv[2:]
+            return SSDReadCommand(self._nand(), output_txt), sys_argv[2:]
         elif cmd == 'E':
-            return SSDEraseCommand(SSDNand(), SSDOutput()), sys_argv[2:]
+            return SSDEraseCommand(self._nand(), output_txt), sys_argv[2:]
         elif cmd == 'F':
-            return SSDFlushCommand(SSDNand(), SSDOutput()), sys_argv[2:]
+            return SSDFlushCommand(self._nand(), output_txt), sys_argv[2:]
+        elif cmd == 'RR':
+            return SSDRangeReadCommand(self._nand(), output_txt), sys_argv[2:]
+        elif cmd == 'WR':
+            return SSDRangeWriteCommand(self._nand(), output_txt), sys_argv[2:]
+        elif cmd == 'FORMAT':
+            return SSDFormatCommand(self._nand(), output_txt), sys_argv[2:]
+        elif cmd == 'STATS':
+            return SSDStatsCommand(self._nand(), output_txt, self._metrics), sys_argv[2:]
         else:
-            return SSDErrorCommand(SSDNand(), SSDOutput()), []
+            return SSDErrorCommand(self._nand(), output_txt), []
+
+
+def create_ssd_from_env(buffer_store=None, **kwargs):
+    # SSD_NAND_BACKEND=binary 이면 ssd_nand.bin 을 mmap 으로 사용
+    # SSD_NAND_CAPACITY 로 LBA 개수 지정 (기본 100)
+    # SSD_BUFFER_STORE=journal 이면 ./buffer 폴더 대신 buffer.journal 사용
+    nand_backend = NAND_BACKENDS[os.environ.get('SSD_NAND_BACKEND', 'text')]
+    capacity = int(os.environ.get('SSD_NAND_CAPACITY', MAX_NAND_SIZE))
+    if buffer_store is None and os.environ.get('SSD_BUFFER_STORE') == 'journal':
+        buffer_store = BufferJournalStore()
+    kwargs.setdefault('file_lock', SSDFileLock())
+    # SSD_TRACE_PATH 가 있으면 들어온 command 를 trace 파일에 이어서 기록
+    if os.environ.get('SSD_TRACE_PATH'):
+        kwargs.setdefault('trace', SSDTraceRecorder(os.environ['SSD_TRACE_PATH']))
+    return SSD(nand_txt=nand_backend(capacity=capacity), buffer_store=buffer_store, **kwargs)
 
 
 if __name__ == "__main__":
@@ -47,5 +309,11 @@ if __name__ == "__main__":
     # sys.argv[1] = 'W'
     # sys.argv[2] = '3'
 
-    ssd = SSD()
-    ssd.run(sys.argv)
+    ssd = create_ssd_from_env()
+    try:
+        ssd.run(sys.argv)
+    finally:
+        ssd.close()
+        # SSD_METRICS_PATH 가 있으면 이번 process 의 metrics 를 파일로 남김
+        if os.environ.get('SSD_METRICS_PATH'):
+            ssd.metrics.dump(os.environ['SSD_METRICS_PATH'])
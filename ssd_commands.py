@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
 
-from ssd_texts import SSDNand, SSDOutput, SSDText, MAX_NAND_SIZE
+from ssd_metrics import SSDMetrics
+from ssd_texts import SSDNand, SSDOutput, SSDText
 
 
 class SSDCommand(ABC):
+    # buffer 를 거치지 않고 바로 실행하는 command (stats 등)
+    bypass_buffer = False
+
     def __init__(self, nand_txt: SSDText, output_txt: SSDText):
         self._nand_txt = nand_txt
         self._output_txt = output_txt
@@ -52,7 +56,7 @@ class SSDReadCommand(SSDCommand):
             return False
 
         self.args_parser(args)
-        if not 0 <= self._lba < MAX_NAND_SIZE:
+        if not 0 <= self._lba < self._nand_txt.capacity:
             return False
         return True
 
@@ -63,8 +67,7 @@ class SSDReadCommand(SSDCommand):
             self._raise_error()
 
     def execute(self):
-        lines = self._nand_txt.read()
-        target_line = lines[self._lba]
+        target_line = self._nand_txt.read_lba(self._lba)
         self._output_txt.write(target_line)
 
 
@@ -80,7 +83,7 @@ class SSDWriteCommand(SSDCommand):
             return False
 
         self.args_parser(args)
-        if not 0 <= self._lba < MAX_NAND_SIZE:
+        if not 0 <= self._lba < self._nand_txt.capacity:
             return False
         if not 0 <= self._value <= 0xFFFFFFFF:
             return False
@@ -94,14 +97,8 @@ class SSDWriteCommand(SSDCommand):
             self._raise_error()
 
     def execute(self):
-        # ssd_nand.txt 파일 읽기
-        ssd_nand_txt = self._nand_txt.read()
-
-        newline = f"{self._lba:02d} 0x{self._value:08X}\n"
-        ssd_nand_txt[self._lba] = newline
-
-        # 파일 다시 쓰기
-        self._nand_txt.write(ssd_nand_txt)
+        # 해당 LBA 만 기록
+        self._nand_txt.write_lba(self._lba, self._value)
 
         # sse_output.txt 파일 초기화
         self._output_txt.write("")
@@ -118,7 +115,7 @@ class SSDEraseCommand(SSDCommand):
             return False
 
         self.args_parser(args)
-        if not 0 <= self._lba < MAX_NAND_SIZE:
+        if not 0 <= self._lba < self._nand_txt.capacity:
             return False
         if not 1 <= self._size <= 10:
             return False
@@ -133,13 +130,10 @@ class SSDEraseCommand(SSDCommand):
 
     def execute(self):
         end_index = self._lba + self._size
-        if end_index > MAX_NAND_SIZE:
-            end_index = MAX_NAND_SIZE
+        if end_index > self._nand_txt.capacity:
+            end_index = self._nand_txt.capacity
 
-        ssd_nand_txt = self._nand_txt.read()
-        for i in range(self._lba, end_index):
-            ssd_nand_txt[i] = f"{i:02d} 0x00000000\n"
-        self._nand_txt.write(ssd_nand_txt)
+        self._nand_txt.erase_lba(self._lba, end_index - self._lba)
 
 
 class SSDFlushCommand(SSDCommand):
@@ -155,4 +149,105 @@ class SSDFlushCommand(SSDCommand):
 
     def args_parser(self, args: list): pass
 
-    def execute(self): pass
\ No newline at end of file
+    def execute(self):
+        self._nand_txt.flush()
+
+
+class SSDFormatCommand(SSDCommand):
+    def _check_input_validity(self, args: list):
+        if args:
+            return False
+        return True
+
+    def args_parser(self, args: list): pass
+
+    def execute(self):
+        self._nand_txt.format()
+        self._output_txt.write("")
+
+
+class SSDStatsCommand(SSDCommand):
+    bypass_buffer = True
+
+    def __init__(self, nand_txt: SSDText, output_txt: SSDText, metrics: SSDMetrics):
+        super().__init__(nand_txt, output_txt)
+        self._metrics = metrics
+
+    def _check_input_validity(self, args: list):
+        if args:
+            return False
+        return True
+
+    def args_parser(self, args: list): pass
+
+    def execute(self):
+        self._output_txt.write(self._metrics.format())
+
+
+class SSDRangeReadCommand(SSDCommand):
+    def __init__(self, nand_txt: SSDText, output_txt: SSDText):
+        super().__init__(nand_txt, output_txt)
+        self._lba = 0
+        self._size = 0
+
+    def _check_input_validity(self, args: list):
+        if len(args) != 2:
+            return False
+
+        self.args_parser(args)
+        if not 0 <= self._lba < self._nand_txt.capacity:
+            return False
+        if not 1 <= self._size <= self._nand_txt.capacity - self._lba:
+            return False
+        return True
+
+    def args_parser(self, args: list):
+        try:
+            self._lba = int(args[0])
+            self._size = int(args[1])
+        except ValueError:
+            self._raise_error()
+
+    def execute(self):
+        # 한 줄에 LBA 하나씩, 한 번에 응답
+        lines = self._nand_txt.read_lba_range(self._lba, self._size)
+        self._output_txt.write("".join(lines))
+
+
+class SSDRangeWriteCommand(SSDCommand):
+    def __init__(self, nand_txt: SSDText, output_txt: SSDText):
+        super().__init__(nand_txt, output_txt)
+        self._lba = 0
+        self._size = 0
+        self._values = []
+
+    def _check_input_validity(self, args: list):
+        if len(args) != 3:
+            return False
+
+        self.args_parser(args)
+        if not 0 <= self._lba < self._nand_txt.capacity:
+            return False
+        if not 1 <= self._size <= self._nand_txt.capacity - self._lba:
+            return False
+        if len(self._values) not in (1, self._size):
+            return False
+        if not all(0 <= value <= 0xFFFFFFFF for value in self._values):
+            return False
+        return True
+
+    def args_parser(self, args: list):
+        # value 는 "0x1" 하나(전체 채움) 또는 "0x1,0x2,..." size 개
+        try:
+            self._lba = int(args[0])
+            self._size = int(args[1])
+            self._values = [int(value, 16) for value in str(args[2]).split(",")]
+        except ValueError:
+            self._raise_error()
+
+    def execute(self):
+        if len(self._values) == self._size:
+            self._nand_txt.write_lba_range(self._lba, self._values)
+        else:
+            self._nand_txt.fill_lba_range(self._lba, self._size, self._values[0])
+        self._output_txt.write("")
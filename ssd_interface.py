@@ -1,6 +1,12 @@
+import asyncio
+import collections
+import os
+import socket
 from abc import ABC, abstractmethod
-from ssd import SSD
-from ssd_texts import SSDOutput, SSDText
+from ssd import SSD, create_ssd_from_env
+from ssd_queue import SSDQueuePair, QUEUE_DEPTH
+from ssd_result import SSDResult, ERROR_OUTPUT
+from ssd_texts import SSDOutput, SSDText, SSDNullOutput, MAX_NAND_SIZE
 
 
 class SSDInterface(ABC):
@@ -12,12 +18,198 @@ class SSDInterface(ABC):
     def get_response(self):
         ...
 
+    @property
+    def capacity(self):
+        # device 를 직접 볼 수 없으면 SSD 쪽과 같은 SSD_NAND_CAPACITY 를 따름
+        return int(os.environ.get('SSD_NAND_CAPACITY', MAX_NAND_SIZE))
+
+    def execute(self, args) -> SSDResult:
+        try:
+            self.run(args)
+        except ValueError:
+            return SSDResult(args[1], ERROR_OUTPUT)
+        return SSDResult(args[1], self.get_response())
+
+    def queue_interface(self, queue_depth=QUEUE_DEPTH) -> 'SSDAsyncInterface':
+        # 같은 device 에 결과를 기다리지 않고 queue_depth 개까지 보내는 interface
+        raise NotImplementedError("queue is not supported by this interface")
+
 
 class SSDConcreteInterface(SSDInterface):
+    # output_sink=False 면 ssd_output.txt 를 쓰지 않고 결과만 돌려줌
+    # ssd 를 주지 않으면 ssd.py 와 같은 설정(SSD_NAND_BACKEND, SSD_NAND_CAPACITY, file lock)으로 하나 만들어 계속 사용
+    def __init__(self, output_sink=True, ssd: SSD = None):
+        self._output_sink = output_sink
+        self._ssd = ssd
+        self._result = None
+
+    @property
+    def ssd(self):
+        if self._ssd is None:
+            self._ssd = create_ssd_from_env() if self._output_sink else create_ssd_from_env(output_txt=SSDNullOutput())
+        return self._ssd
+
+    @property
+    def capacity(self):
+        return self.ssd.capacity
+
+    def execute(self, args) -> SSDResult:
+        self._result = self.ssd.execute(args)
+        return self._result
+
     def run(self, args):
-        ssd = SSD()
-        ssd.run(args)
+        if self.execute(args).is_error:
+            raise ValueError(ERROR_OUTPUT)
+
+    def queue_interface(self, queue_depth=QUEUE_DEPTH):
+        return SSDQueueInterface(SSDQueuePair(self.ssd, queue_depth=queue_depth))
 
     def get_response(self):
+        if self._result is not None:
+            return self._result.output
         ssd_output_txt: SSDText = SSDOutput()
         return ssd_output_txt.read()
+
+
+class SSDSocketInterface(SSDInterface):
+    # ssd_server.py 의 SSDServer 에 연결해서 command 를 보냄
+    def __init__(self, socket_path):
+        self._socket_path = socket_path
+        self._socket = None
+        self._reader = None
+        self._response = ""
+
+    def _connect(self):
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self._socket_path)
+            self._reader = self._socket.makefile('rb')
+
+    def run(self, args):
+        self._connect()
+        line = " ".join(str(arg) for arg in args[1:]) + "\n"
+        self._socket.sendall(line.encode())
+        line_cnt = int(self._reader.readline())
+        self._response = "\n".join(self._reader.readline().decode().rstrip("\n") for _ in range(line_cnt))
+        # SSDConcreteInterface 와 같이 ERROR 응답이면 예외로 알림
+        if self._response == ERROR_OUTPUT:
+            raise ValueError(ERROR_OUTPUT)
+
+    def get_response(self):
+        return self._response
+
+    def queue_interface(self, queue_depth=QUEUE_DEPTH):
+        return SSDSocketQueueInterface(self._socket_path, queue_depth)
+
+    def close(self):
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+            self._socket = None
+            self._reader = None
+
+
+class SSDAsyncInterface(ABC):
+    # 결과를 기다리지 않고 여러 command 를 보내 둘 수 있는 interface
+    @abstractmethod
+    async def submit(self, args) -> asyncio.Future:
+        ...
+
+    async def execute(self, args) -> SSDResult:
+        return await (await self.submit(args))
+
+    async def execute_many(self, args_lst) -> list:
+        futures = [await self.submit(args) for args in args_lst]
+        return list(await asyncio.gather(*futures))
+
+    async def close(self):
+        pass
+
+
+class SSDQueueInterface(SSDAsyncInterface):
+    # SSDQueuePair 의 completion 을 tag 별 future 로 돌려줌
+    def __init__(self, queue_pair: SSDQueuePair = None, queue_depth=QUEUE_DEPTH):
+        self._queue_pair = queue_pair if queue_pair is not None else SSDQueuePair(queue_depth=queue_depth)
+        self._waiters = {}
+        self._reaper = None
+
+    async def submit(self, args) -> asyncio.Future:
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+        future = asyncio.get_running_loop().create_future()
+        tag = await self._queue_pair.submit(args)
+        self._waiters[tag] = future
+        return future
+
+    async def _reap(self):
+        while True:
+            completion = await self._queue_pair.complete()
+            self._waiters.pop(completion.tag).set_result(completion.result)
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        await self._queue_pair.stop()
+
+
+class SSDSocketQueueInterface(SSDAsyncInterface):
+    # ssd_server.py 에 연결을 하나 더 열어서 응답을 기다리지 않고 queue_depth 개까지 이어서 보냄 (pipelining)
+    # server 는 한 연결의 command 를 받은 순서대로 처리하므로 응답도 보낸 순서대로 옴
+    def __init__(self, socket_path, queue_depth=QUEUE_DEPTH):
+        self._socket_path = socket_path
+        self._queue_depth = queue_depth
+        self._reader = None
+        self._writer = None
+        self._slots = None
+        self._waiters = collections.deque()
+        self._reaper = None
+        # 여러 task 가 처음 submit 을 동시에 불러도 연결은 하나만 열도록
+        self._connect_lock = asyncio.Lock()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_unix_connection(self._socket_path)
+                self._slots = asyncio.Semaphore(self._queue_depth)
+                self._reaper = asyncio.create_task(self._reap())
+
+    async def submit(self, args) -> asyncio.Future:
+        await self._connect()
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((args[1], future))
+        self._writer.write((" ".join(str(arg) for arg in args[1:]) + "\n").encode())
+        await self._writer.drain()
+        return future
+
+    async def _reap(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    raise ConnectionError("ssd server closed the connection")
+                lines = [(await self._reader.readline()).decode().rstrip("\n") for _ in range(int(line))]
+                cmd, future = self._waiters.popleft()
+                self._slots.release()
+                future.set_result(SSDResult(cmd, "\n".join(lines)))
+        except (ConnectionError, ValueError) as error:
+            while self._waiters:
+                _, future = self._waiters.popleft()
+                future.set_exception(error)
+
+    async def close(self):
+        if self._writer is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+            self._reader = None
@@ -0,0 +1,98 @@
+import contextlib
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SSD_LOCK_PATH = "./ssd.lock"
+# resident server 가 lock 을 계속 들고 있으면 기다리다 멈추지 않고 실패하도록 제한 시간을 둠
+LOCK_TIMEOUT = 5.0
+LOCK_POLL_INTERVAL = 0.01
+
+
+class SSDFileLock:
+    # 여러 process 가 같은 NAND / buffer 를 쓸 때 잡는 advisory lock
+    # fcntl 이 없는 OS 에서는 process 안 lock 만 동작
+    # timeout=None 이면 끝까지 기다림, 아니면 그 안에 못 잡을 때 acquire 가 False 를 돌려줌
+    def __init__(self, path=SSD_LOCK_PATH, timeout=LOCK_TIMEOUT):
+        self._path = path
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._file = None
+
+    def acquire(self):
+        if self._timeout is None:
+            self._lock.acquire()
+            if fcntl is not None:
+                self._file = open(self._path, 'a+b')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            return True
+
+        deadline = time.monotonic() + self._timeout
+        if not self._lock.acquire(timeout=self._timeout):
+            return False
+        if fcntl is None:
+            return True
+        self._file = open(self._path, 'a+b')
+        while True:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self._file.close()
+                    self._file = None
+                    self._lock.release()
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError(f"ssd lock timeout: {self._path}")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class LBARangeLock:
+    # [start, end) 범위 lock, 겹치지 않는 범위끼리는 동시에 잡을 수 있음
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._held = []
+
+    def _overlaps(self, ranges):
+        return any(start < held_end and held_start < end
+                   for start, end in ranges for held_start, held_end in self._held)
+
+    def acquire(self, ranges):
+        # 여러 범위를 한 번에 잡아야 lock 순서 때문에 deadlock 이 생기지 않음
+        ranges = list(ranges)
+        with self._cond:
+            self._cond.wait_for(lambda: not self._overlaps(ranges))
+            self._held.extend(ranges)
+        return ranges
+
+    def release(self, ranges):
+        with self._cond:
+            for lba_range in ranges:
+                self._held.remove(lba_range)
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def hold(self, ranges):
+        ranges = self.acquire(ranges)
+        try:
+            yield
+        finally:
+            self.release(ranges)
@@ -0,0 +1,128 @@
+import collections
+import contextlib
+import json
+import threading
+import time
+
+METRICS_PATH = "./ssd_metrics.json"
+# HDR histogram 처럼 2 의 거듭제곱 구간마다 2 ** SUB_BUCKET_BITS 개로 나눔 (상대 오차 약 3%)
+SUB_BUCKET_BITS = 5
+PERCENTILES = (50, 90, 99, 99.9)
+STAGES = ('parse', 'buffer', 'nand', 'output')
+
+
+class LatencyHistogram:
+    # 값(ns 등 정수)을 log-linear bucket 에 세기만 하므로 기록 비용이 일정함
+    def __init__(self):
+        self._buckets = collections.Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _bucket(value):
+        shift = max(value.bit_length() - SUB_BUCKET_BITS - 1, 0)
+        return shift, value >> shift
+
+    @staticmethod
+    def _bucket_value(bucket):
+        # bucket 안의 중간 값
+        shift, sub = bucket
+        return (sub << shift) + ((1 << shift) >> 1)
+
+    def record(self, value):
+        value = max(int(value), 0)
+        self._buckets[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return 0
+        rank = percent / 100 * self.count
+        seen = 0
+        for bucket in sorted(self._buckets, key=self._bucket_value):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                return min(max(self._bucket_value(bucket), self.min), self.max)
+        return self.max
+
+    def snapshot(self, scale=1):
+        if self.count == 0:
+            return {'count': 0}
+        snapshot = {'count': self.count, 'min': self.min / scale, 'mean': self.total / self.count / scale,
+                    'max': self.max / scale}
+        for percent in PERCENTILES:
+            snapshot[f"p{percent:g}"] = self.percentile(percent) / scale
+        return snapshot
+
+
+class SSDMetrics:
+    # command 별 counter 와 단계별(parse, buffer, nand, output) latency histogram
+    # 단계 timer 가 겹치면 (buffer / nand 안에서 결과를 쓰는 output 등) 안쪽 단계 시간은 바깥 단계에서 빼고 기록
+    def __init__(self, clock=time.perf_counter_ns):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = collections.Counter()
+        self._histograms = collections.defaultdict(LatencyHistogram)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, value):
+        with self._lock:
+            self._histograms[name].record(value)
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        # thread 마다 진행 중인 timer 들의 안쪽 단계 시간 합을 stack 으로 들고 있음
+        nested = self._local.__dict__.setdefault('nested', [])
+        nested.append(0)
+        start = self._clock()
+        try:
+            yield
+        finally:
+            elapsed = self._clock() - start
+            inner = nested.pop()
+            if nested:
+                nested[-1] += elapsed
+            self.observe(stage, elapsed - inner)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        # latency 는 usec, 그 외 histogram(flush batch 크기 등)은 값 그대로
+        with self._lock:
+            return {
+                'counters': dict(sorted(self._counters.items())),
+                'latency_us': {stage: self._histograms[stage].snapshot(1000)
+                               for stage in STAGES if stage in self._histograms},
+                'histograms': {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())
+                               if name not in STAGES},
+            }
+
+    def dump(self, path=METRICS_PATH):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+    def format(self):
+        snapshot = self.snapshot()
+        lines = [f"{name} {value}" for name, value in snapshot['counters'].items()]
+        for group in ('latency_us', 'histograms'):
+            for name, histogram in snapshot[group].items():
+                fields = " ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                                  for key, value in histogram.items())
+                lines.append(f"{name}{'_us' if group == 'latency_us' else ''} {fields}")
+        return "\n".join(lines) + "\n"
+
+
+# process 안의 SSD 들이 같이 쓰는 기본 metrics
+DEFAULT_METRICS = SSDMetrics()
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from ssd import SSD, create_ssd_from_env
+from ssd_result import SSDResult, ERROR_OUTPUT
+from ssd_texts import SSDNullOutput
+
+QUEUE_DEPTH = 32
+MAX_MERGE_SIZE = 32
+
+
+class SSDCompletion:
+    # completion queue entry, 제출할 때 받은 tag 로 어떤 command 의 결과인지 구분
+    def __init__(self, tag, result: SSDResult):
+        self.tag = tag
+        self.result = result
+
+    def __repr__(self):
+        return f"SSDCompletion({self.tag!r}, {self.result!r})"
+
+
+class SSDQueuePair:
+    # NVMe 처럼 submission queue 에 넣은 command 를 queue_depth 개까지 동시에 실행하고
+    # 끝나는 순서대로 completion queue 에 넣음 (제출 순서와 다를 수 있음)
+    # 같은 LBA 를 건드리는 command 끼리는 제출 순서대로 실행
+    def __init__(self, ssd: SSD = None, queue_depth=QUEUE_DEPTH, merge=True, max_merge_size=MAX_MERGE_SIZE):
+        # ssd 를 주지 않아서 여기서 만든 SSD 는 stop 에서 닫음 (buffer flush, file lock 해제)
+        self._owned_ssd = None
+        if ssd is None:
+            ssd = self._owned_ssd = create_ssd_from_env(resident_buffer=True, output_txt=SSDNullOutput())
+        self._ssd = ssd
+        self._queue_depth = queue_depth
+        self._merge = merge
+        self._max_merge_size = max_merge_size
+        self._tags = itertools.count()
+        self._submission = collections.deque()
+        self._completion = None
+        self._slots = None
+        self._submitted = None
+        self._completed = None
+        self._in_flight = []
+        self._executor = None
+        self._dispatcher = None
+        self.merged_cnt = 0
+
+    @property
+    def queue_depth(self):
+        return self._queue_depth
+
+    async def start(self):
+        if self._dispatcher is None:
+            self._completion = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self._queue_depth)
+            self._submitted = asyncio.Event()
+            self._completed = asyncio.Event()
+            self._executor = ThreadPoolExecutor(max_workers=self._queue_depth, thread_name_prefix="ssd-queue")
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+            self._executor.shutdown(wait=True)
+        if self._owned_ssd is not None:
+            self._owned_ssd.close()
+            self._owned_ssd = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    async def submit(self, args, tag=None):
+        # args 는 [None, 'W', 3, '0x0000ABCD'] 형식, queue_depth 개가 이미 진행 중이면 자리가 날 때까지 기다림
+        await self.start()
+        if tag is None:
+            tag = next(self._tags)
+        await self._slots.acquire()
+        self._submission.append((tag, list(args)))
+        self._submitted.set()
+        return tag
+
+    async def complete(self) -> SSDCompletion:
+        return await self._completion.get()
+
+    def _command_range(self, argv):
+        capacity = self._ssd.capacity
+        try:
+            if argv[1] in ('R', 'W'):
+                return int(argv[2]), int(argv[2]) + 1
+            if argv[1] in ('E', 'RR', 'WR'):
+                return int(argv[2]), min(int(argv[2]) + int(argv[3]), capacity)
+        except (IndexError, ValueError):
+            pass
+        return 0, capacity
+
+    def _is_blocked(self, lba_range):
+        start, end = lba_range
+        return any(start < held_end and held_start < end for held_start, held_end in self._in_flight)
+
+    def _pop_merged(self):
+        # 이미 queue 에 있는 연속된 LBA 의 R 또는 W 를 RR / WR 하나로 합침
+        # RR / WR 은 buffer 를 거치지 않으므로 buffer 를 쓰는 SSD 에서는 합치지 않음 (W 는 buffer 에서 합쳐짐)
+        entries = [self._submission.popleft()]
+        cmd = entries[0][1][1]
+        if not self._merge or not self._ssd.no_buf_mode or cmd not in ('R', 'W') or \
+                not self._ssd.is_valid(entries[0][1]):
+            return entries, entries[0][1]
+
+        while self._submission and len(entries) < self._max_merge_size:
+            argv = self._submission[0][1]
+            if argv[1] != cmd or not self._ssd.is_valid(argv) or int(argv[2]) != int(entries[-1][1][2]) + 1:
+                break
+            entries.append(self._submission.popleft())
+
+        if len(entries) == 1:
+            return entries, entries[0][1]
+        self.merged_cnt += len(entries) - 1
+        lba = int(entries[0][1][2])
+        if cmd == 'R':
+            return entries, [None, 'RR', lba, len(entries)]
+        values = ",".join(f"0x{int(str(argv[3]), 16):08X}" for _, argv in entries)
+        return entries, [None, 'WR', lba, len(entries), values]
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._submission:
+                self._submitted.clear()
+                await self._submitted.wait()
+                continue
+
+            entries, argv = self._pop_merged()
+            lba_range = self._command_range(argv)
+            while self._is_blocked(lba_range):
+                self._completed.clear()
+                await self._completed.wait()
+
+            self._in_flight.append(lba_range)
+            future = loop.run_in_executor(self._executor, self._ssd.execute, argv)
+            future.add_done_callback(lambda done, entries=entries, argv=argv, lba_range=lba_range:
+                                     self._on_complete(entries, argv, lba_range, done))
+
+    def _on_complete(self, entries, argv, lba_range, done):
+        self._in_flight.remove(lba_range)
+        result = done.result() if done.exception() is None else SSDResult(argv[1], ERROR_OUTPUT)
+        if len(entries) == 1:
+            results = [result]
+        elif result.is_error or result.cmd == 'WR':
+            results = [SSDResult(argv[1], result.output) for _, argv in entries]
+        else:
+            results = [SSDResult('R', line + "\n") for line in result.output.splitlines()]
+
+        for (tag, _), entry_result in zip(entries, results):
+            self._completion.put_nowait(SSDCompletion(tag, entry_result))
+            self._slots.release()
+        self._completed.set()
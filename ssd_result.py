@@ -0,0 +1,40 @@
+ERROR_OUTPUT = "ERROR"
+
+
+class SSDResult:
+    # SSD command 한 개의 결과, output 은 ssd_output.txt 에 쓰던 문자열 그대로
+    def __init__(self, cmd, output):
+        self.cmd = cmd
+        self.output = output
+        self.lba = None
+        self.value = None
+        self.values = []
+        # SSD 에 timing model 이 있을 때만 채움
+        self.latency_us = None
+
+        # RR 은 "NN 0xXXXXXXXX" 가 여러 줄
+        lines = [line.split() for line in output.splitlines()]
+        if lines and all(len(parts) == 2 for parts in lines):
+            try:
+                self.values = [int(parts[1], 16) for parts in lines]
+            except ValueError:
+                return
+            self.lba = int(lines[0][0])
+            if len(self.values) == 1:
+                self.value = self.values[0]
+
+    @property
+    def is_error(self):
+        return self.output == ERROR_OUTPUT
+
+    @property
+    def value_text(self):
+        if self.value is None:
+            return self.output
+        return f"0x{self.value:08X}"
+
+    def __eq__(self, other):
+        return isinstance(other, SSDResult) and (self.cmd, self.output) == (other.cmd, other.output)
+
+    def __repr__(self):
+        return f"SSDResult({self.cmd!r}, {self.output!r})"
@@ -0,0 +1,58 @@
+import os
+import socketserver
+import sys
+
+from buffer import BufferJournalStore
+from ssd import SSD, create_ssd_from_env
+from ssd_texts import SSDNullOutput, SSDText
+
+SSD_SERVER_SOCKET = "./ssd.sock"
+
+
+class SSDRequestHandler(socketserver.StreamRequestHandler):
+    # 한 줄에 command 하나 ("W 3 0x0000ABCD"), 응답은 줄 수 한 줄 + 그 줄들 (RR 은 여러 줄)
+    def handle(self):
+        for line in self.rfile:
+            args = line.decode().split()
+            if not args:
+                continue
+            lines = self.server.execute(args).rstrip("\n").split("\n")
+            self.wfile.write(f"{len(lines)}\n".encode() + "".join(f"{line}\n" for line in lines).encode())
+            self.wfile.flush()
+
+
+class SSDServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # NAND 와 buffer 를 process 안에 유지하는 SSD service
+    daemon_threads = True
+
+    def __init__(self, socket_path=SSD_SERVER_SOCKET, nand_txt: SSDText = None):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self._socket_path = socket_path
+        if nand_txt is None:
+            self._ssd = create_ssd_from_env(buffer_store=BufferJournalStore(), resident_buffer=True,
+                                            output_txt=SSDNullOutput())
+        else:
+            self._ssd = SSD(nand_txt=nand_txt, buffer_store=BufferJournalStore(), resident_buffer=True,
+                            output_txt=SSDNullOutput())
+        super().__init__(socket_path, SSDRequestHandler)
+
+    def execute(self, args):
+        # resident SSD 가 buffer lock 과 LBA 범위 lock 으로 client thread 들을 직렬화
+        return self._ssd.execute([None] + args).output
+
+    def server_close(self):
+        super().server_close()
+        self._ssd.close()
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+
+
+if __name__ == "__main__":
+    # python ssd_server.py [socket_path]
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else SSD_SERVER_SOCKET
+    with SSDServer(socket_path) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
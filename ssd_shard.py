@@ -0,0 +1,204 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from buffer import BufferJournalStore
+from ssd import SSD, NAND_BACKENDS
+from ssd_result import ERROR_OUTPUT
+from ssd_texts import SSDNandText, SSDNullOutput, lba_width, MAX_NAND_SIZE
+
+SHARD_FOLDER_PATH = "./shards"
+SHARD_NAND_BACKEND = 'binary'
+SHARD_NAND_FILES = {
+    'binary': "ssd_nand.bin",
+    'numpy': "ssd_nand.bin",
+    'sparse': "ssd_nand.sparse",
+}
+
+
+def _shard_main(conn, folder, capacity, backend, delay_us=0):
+    # shard 하나를 맡는 worker process, 자기 NAND image 와 buffer 를 가지고 SSD.execute 로 처리
+    # delay_us 는 command 마다 CPU 를 쓰지 않고 기다리는 모의 NAND 시간 (benchmark 용)
+    nand_cls = NAND_BACKENDS[backend]
+    nand_cls._instance = None
+    nand = nand_cls(os.path.join(folder, SHARD_NAND_FILES[backend]), capacity)
+    ssd = SSD(nand_txt=nand, buffer_store=BufferJournalStore(os.path.join(folder, "buffer.journal")),
+              resident_buffer=True, output_txt=SSDNullOutput())
+    try:
+        while True:
+            argv_lst = conn.recv()
+            if argv_lst is None:
+                break
+            outputs = [ssd.execute([None] + argv).output for argv in argv_lst]
+            if delay_us:
+                time.sleep(delay_us * len(argv_lst) / 1e6)
+            conn.send(outputs)
+    finally:
+        ssd.close()
+        nand.close()
+        conn.close()
+
+
+class SSDShard:
+    # worker process 와 연결된 pipe
+    # 여러 thread 가 보낸 요청은 sender thread 가 모아 두었다가 한 번의 pipe 왕복으로 보냄
+    # (한 batch 가 worker 에서 처리되는 동안 들어온 요청이 다음 batch 가 됨)
+    def __init__(self, index, start, end, folder, backend, delay_us=0):
+        self.index = index
+        self.start = start
+        self.end = end
+        os.makedirs(folder, exist_ok=True)
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_shard_main,
+                                                args=(child_conn, folder, end - start, backend, delay_us),
+                                                name=f"ssd-shard-{index}", daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._cond = threading.Condition()
+        self._pending = []
+        self._closed = False
+        self.batch_cnt = 0
+        self._sender = threading.Thread(target=self._send_loop, name=f"ssd-shard-{index}-sender", daemon=True)
+        self._sender.start()
+
+    def submit(self, argv_lst) -> Future:
+        future = Future()
+        with self._cond:
+            self._pending.append((future, argv_lst))
+            self._cond.notify()
+        return future
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    break
+                batch, self._pending = self._pending, []
+            try:
+                self._conn.send([argv for _, argv_lst in batch for argv in argv_lst])
+                outputs = self._conn.recv()
+            except (EOFError, OSError) as error:
+                for future, _ in batch:
+                    future.set_exception(error)
+                continue
+            self.batch_cnt += 1
+            index = 0
+            for future, argv_lst in batch:
+                future.set_result(outputs[index:index + len(argv_lst)])
+                index += len(argv_lst)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._sender.join()
+        self._conn.send(None)
+        self._process.join()
+        self._conn.close()
+
+
+class SSDShardRouter(SSDNandText):
+    # LBA 공간을 shard_cnt 개로 나누어 각 worker process 에 맡기는 NAND
+    # 범위 command 는 shard 경계에서 나누어 모든 shard 에 먼저 보내고 결과를 모음
+    range_parallel = True
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, capacity=MAX_NAND_SIZE, shard_cnt=None, folder=SHARD_FOLDER_PATH, backend=SHARD_NAND_BACKEND,
+                 delay_us=0):
+        shard_cnt = shard_cnt if shard_cnt is not None else os.cpu_count()
+        self._capacity = capacity
+        self._lba_width = lba_width(capacity)
+        self._shard_size = -(-capacity // shard_cnt)
+        self._shards = [SSDShard(index, start, min(start + self._shard_size, capacity),
+                                 os.path.join(folder, f"shard{index}"), backend, delay_us)
+                        for index, start in enumerate(range(0, capacity, self._shard_size))]
+
+    @property
+    def shard_cnt(self):
+        return len(self._shards)
+
+    @property
+    def batch_cnt(self):
+        # worker 들과 주고받은 pipe 왕복 횟수
+        return sum(shard.batch_cnt for shard in self._shards)
+
+    def _split(self, lba, size):
+        # [lba, lba + size) 를 (shard, shard 안 LBA, 요청 안 offset, 길이) 로 나눔
+        if lba < 0 or size < 0 or lba + size > self._capacity:
+            raise ValueError(ERROR_OUTPUT)
+        parts = []
+        offset = 0
+        while offset < size:
+            shard = self._shards[(lba + offset) // self._shard_size]
+            length = min(size - offset, shard.end - (lba + offset))
+            parts.append((shard, lba + offset - shard.start, offset, length))
+            offset += length
+        return parts
+
+    def _scatter(self, requests):
+        # requests : [(shard, [argv, ...])], 모두 보낸 뒤에 결과를 기다려서 shard 들이 동시에 처리
+        futures = [shard.submit(argv_lst) for shard, argv_lst in requests]
+        results = [future.result() for future in futures]
+        # worker 가 ERROR 를 돌려주면 다른 backend 처럼 ValueError 로 알림 (SSD.execute 에서 ERROR 결과가 됨)
+        if any(output == ERROR_OUTPUT for outputs in results for output in outputs):
+            raise ValueError(ERROR_OUTPUT)
+        return results
+
+    def _line(self, lba, value):
+        return f"{lba:0{self._lba_width}d} 0x{value:08X}\n"
+
+    def read_lba(self, lba):
+        shard, local_lba, _, _ = self._split(lba, 1)[0]
+        output = self._scatter([(shard, [['R', local_lba]])])[0][0]
+        return self._line(lba, int(output.split()[1], 16))
+
+    def write_lba(self, lba, value):
+        self.write_lba_range(lba, [value])
+
+    def erase_lba(self, lba, size):
+        self._scatter([(shard, [['E', local_lba, length]]) for shard, local_lba, _, length in self._split(lba, size)])
+
+    def read_lba_range(self, lba, size):
+        parts = self._split(lba, size)
+        outputs = self._scatter([(shard, [['RR', local_lba, length]]) for shard, local_lba, _, length in parts])
+        lines = []
+        for (_, _, offset, _), output in zip(parts, outputs):
+            lines += [self._line(lba + offset + index, int(line.split()[1], 16))
+                      for index, line in enumerate(output[0].splitlines())]
+        return lines
+
+    def write_lba_range(self, lba, values):
+        self._scatter([(shard, [['WR', local_lba, length, ",".join(f"0x{value:08X}" for value in
+                                                                     values[offset:offset + length])]])
+                       for shard, local_lba, offset, length in self._split(lba, len(values))])
+
+    def fill_lba_range(self, lba, size, value):
+        self._scatter([(shard, [['WR', local_lba, length, f"0x{value:08X}"]])
+                       for shard, local_lba, _, length in self._split(lba, size)])
+
+    def format(self):
+        self._scatter([(shard, [['FORMAT']]) for shard in self._shards])
+
+    def flush(self):
+        self._scatter([(shard, [['F']]) for shard in self._shards])
+
+    def read(self):
+        return self.read_lba_range(0, self._capacity)
+
+    def write(self, output):
+        values = []
+        for line in output[:self._capacity]:
+            try:
+                values.append(int(line.split()[1], 16))
+            except (IndexError, ValueError):
+                values.append(0)
+        self.write_lba_range(0, values)
+
+    def close(self):
+        for shard in self._shards:
+            shard.close()
@@ -1,13 +1,55 @@
+import contextlib
+import mmap
+import os
+import struct
+import threading
 from abc import ABC, abstractmethod
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 MAX_NAND_SIZE = 100
+NAND_BIN_PATH = "ssd_nand.bin"
+NAND_TXT_PATH = "ssd_nand.txt"
+NAND_SPARSE_PATH = "ssd_nand.sparse"
+
+# ssd_nand.bin : header(magic, version, record size, capacity) + LBA 당 4 byte
+NAND_BIN_MAGIC = b"SSDN"
+NAND_BIN_VERSION = 1
+NAND_BIN_HEADER = struct.Struct("<4sHHI")
+NAND_BIN_RECORD = struct.Struct("<I")
+
+# ssd_nand.sparse : header(magic, version, capacity) + append-only (op, lba, value) record
+NAND_SPARSE_MAGIC = b"SSDS"
+NAND_SPARSE_VERSION = 1
+NAND_SPARSE_HEADER = struct.Struct("<4sHQ")
+NAND_SPARSE_RECORD = struct.Struct("<BQI")
+NAND_SPARSE_WRITE = 1
+NAND_SPARSE_ERASE = 2
+
+
+def lba_width(capacity):
+    return max(2, len(str(capacity - 1)))
+
+
+def file_signature(path):
+    # 다른 process 가 파일을 바꿨는지 확인하는 값 (교체되면 inode, append 되면 size 가 바뀜)
+    # path 대신 열린 파일의 fd 를 주면 그 파일 자체의 값이므로, 그 사이 교체된 경우도 다르게 나옴
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
 
 
 class SSDText(ABC):
     _instance = None
 
     def __new__(cls, *args, **kwargs):
-        if not cls._instance:
+        # 상속받은 부모의 instance 를 돌려주지 않도록 class 마다 따로 singleton 을 둠
+        if cls.__dict__.get('_instance') is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
@@ -18,33 +60,497 @@ class SSDText(ABC):
     def write(self, output): pass
 
 
-class SSDNand(SSDText):
-    def __init__(self):
-        if not hasattr(self, 'initialized'):
+class SSDNandText(SSDText):
+    _capacity = MAX_NAND_SIZE
+    # 겹치지 않는 LBA 범위를 여러 thread 가 동시에 다뤄도 되는 backend 인지
+    range_parallel = False
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @abstractmethod
+    def read_lba(self, lba): pass
+
+    @abstractmethod
+    def write_lba(self, lba, value): pass
+
+    @abstractmethod
+    def erase_lba(self, lba, size): pass
+
+    @contextlib.contextmanager
+    def batch(self):
+        yield
+
+    def read_lba_range(self, lba, size):
+        with self.batch():
+            return [self.read_lba(index) for index in range(lba, lba + size)]
+
+    def write_lba_range(self, lba, values):
+        with self.batch():
+            for index, value in enumerate(values):
+                self.write_lba(lba + index, value)
+
+    def fill_lba_range(self, lba, size, value):
+        self.write_lba_range(lba, [value] * size)
+
+    def format(self):
+        self.erase_lba(0, self._capacity)
+
+    def _check_capacity(self, capacity):
+        # singleton 을 다시 만들 때 다른 capacity 를 주면 조용히 무시하지 않고 알림
+        if capacity is not None and capacity != self._capacity:
+            raise ValueError(f"NAND capacity mismatch: {self._capacity} != {capacity}")
+
+    def flush(self):
+        pass
+
+    def refresh(self):
+        # file lock 을 잡은 뒤 호출, 메모리에 들고 있는 NAND 상태가 있으면 다시 읽음
+        pass
+
+
+class SSDNand(SSDNandText):
+    def __init__(self, capacity=None, in_place=True):
+        if hasattr(self, 'initialized'):
+            self._check_capacity(capacity)
+        else:
             self.initialized = True
-            ssd_nand_txt = []
-            for i in range(0, MAX_NAND_SIZE):
-                newline = f"{i:02d} 0x0000000O\n"
-                ssd_nand_txt.append(newline)
-            self.write(ssd_nand_txt)
+            # capacity 를 주지 않으면 기본 100
+            self._capacity = capacity = capacity if capacity is not None else MAX_NAND_SIZE
+            self._in_place = in_place
+            # "NN 0xXXXXXXXX\n" 고정 길이 record, LBA 자리수는 capacity 에 맞춰 늘림
+            self._lba_width = lba_width(capacity)
+            self._record_len = self._lba_width + len(" 0x00000000\n")
+            self._batch_file = None
+            self._batch_lines = None
+            self._batch_dirty = False
+            # 기존 image 가 없거나 format 이 맞지 않을 때만 새로 만듦
+            if not self._is_valid_image():
+                self.write([self._line(i, 0) for i in range(self._capacity)])
 
     def read(self):
-        with open("ssd_nand.txt", 'r', encoding='utf-8') as file:
+        with open(NAND_TXT_PATH, 'r', encoding='utf-8') as file:
             lines = file.readlines()
-            fixed_size_lines = lines + ["\n"] * (MAX_NAND_SIZE - len(lines))
-            fixed_size_lines = fixed_size_lines[:MAX_NAND_SIZE]
+            fixed_size_lines = lines + ["\n"] * (self._capacity - len(lines))
+            fixed_size_lines = fixed_size_lines[:self._capacity]
             return fixed_size_lines
 
     def write(self, output):
-        with open("ssd_nand.txt", 'w', encoding='utf-8') as file:
+        with open(NAND_TXT_PATH, 'w', encoding='utf-8') as file:
             file.writelines(output)
 
+    def _line(self, lba, value):
+        return f"{lba:0{self._lba_width}d} 0x{value:08X}\n"
+
+    def _is_fixed_width(self):
+        return self._in_place and os.path.exists(NAND_TXT_PATH) and \
+            os.path.getsize(NAND_TXT_PATH) == self._capacity * self._record_len
+
+    def _is_valid_image(self):
+        # 전체를 읽지 않고 크기와 처음/마지막 record 만 확인
+        if not os.path.exists(NAND_TXT_PATH) or os.path.getsize(NAND_TXT_PATH) != self._capacity * self._record_len:
+            return False
+        last_lba = self._capacity - 1
+        with open(NAND_TXT_PATH, 'rb') as file:
+            first = file.read(self._record_len)
+            file.seek(last_lba * self._record_len)
+            last = file.read(self._record_len)
+        for lba, record in ((0, first), (last_lba, last)):
+            if not self._is_valid_records(lba, record):
+                return False
+            try:
+                int(record[self._lba_width + 3:-1], 16)
+            except ValueError:
+                return False
+        return True
+
+    def _is_valid_records(self, lba, data):
+        # 덮어쓸 위치의 record 가 같은 LBA 의 고정 길이 record 인지 확인
+        for index in range(len(data) // self._record_len):
+            record = data[index * self._record_len:(index + 1) * self._record_len]
+            if record[:self._lba_width] != f"{lba + index:0{self._lba_width}d}".encode() or \
+                    record[self._lba_width:self._lba_width + 3] != b" 0x" or record[-1:] != b"\n":
+                return False
+        return len(data) > 0 and len(data) % self._record_len == 0
+
+    @contextlib.contextmanager
+    def _records(self):
+        if self._batch_file is not None:
+            yield self._batch_file
+            return
+        with open(NAND_TXT_PATH, 'r+b') as file:
+            yield file
+
+    def _patch_records(self, lba, lines):
+        # 고정 길이 format 이면 해당 offset 만 덮어씀, 아니면 False
+        if self._batch_file is None and not self._is_fixed_width():
+            return False
+        with self._records() as file:
+            file.seek(lba * self._record_len)
+            if not self._is_valid_records(lba, file.read(len(lines) * self._record_len)):
+                return False
+            file.seek(lba * self._record_len)
+            file.write("".join(lines).encode())
+        return True
+
+    @contextlib.contextmanager
+    def batch(self):
+        # 여러 command 를 NAND 파일 한 번 열고/읽고 한 번 써서 처리
+        if self._batch_file is not None or self._batch_lines is not None:
+            yield
+            return
+
+        if self._is_fixed_width():
+            with open(NAND_TXT_PATH, 'r+b') as file:
+                self._batch_file = file
+                try:
+                    yield
+                finally:
+                    self._batch_file = None
+            return
+
+        self._batch_lines = self.read()
+        self._batch_dirty = False
+        try:
+            yield
+        finally:
+            ssd_nand_txt, self._batch_lines = self._batch_lines, None
+            if self._batch_dirty:
+                self.write(ssd_nand_txt)
+
+    def read_lba(self, lba):
+        if self._batch_lines is not None:
+            return self._batch_lines[lba]
+        if self._batch_file is not None or self._is_fixed_width():
+            with self._records() as file:
+                file.seek(lba * self._record_len)
+                record = file.read(self._record_len)
+            if self._is_valid_records(lba, record):
+                return record.decode()
+        return self.read()[lba]
+
+    def _update_lines(self, lba, lines):
+        if self._batch_lines is not None:
+            self._batch_lines[lba:lba + len(lines)] = lines
+            self._batch_dirty = True
+            return
+        if self._patch_records(lba, lines):
+            return
+        ssd_nand_txt = self.read()
+        ssd_nand_txt[lba:lba + len(lines)] = lines
+        self.write(ssd_nand_txt)
+
+    def write_lba(self, lba, value):
+        self._update_lines(lba, [self._line(lba, value)])
+
+    def erase_lba(self, lba, size):
+        self._update_lines(lba, [self._line(i, 0) for i in range(lba, lba + size)])
+
+
+class SSDBinaryNand(SSDNandText):
+    range_parallel = True
+
+    def __init__(self, path=NAND_BIN_PATH, capacity=None):
+        if hasattr(self, 'initialized'):
+            self._check_capacity(capacity)
+        else:
+            self.initialized = True
+            self._path = path
+            self._capacity = capacity = capacity if capacity is not None else MAX_NAND_SIZE
+            self._lba_width = lba_width(capacity)
+            self._file = None
+            self._mmap = None
+            self._open()
+
+    def _open(self):
+        size = NAND_BIN_HEADER.size + NAND_BIN_RECORD.size * self._capacity
+        if not self._is_valid_image(size):
+            self._format(size)
+
+        self._file = open(self._path, 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+    def _is_valid_image(self, size):
+        if not os.path.exists(self._path) or os.path.getsize(self._path) != size:
+            return False
+        with open(self._path, 'rb') as file:
+            header = file.read(NAND_BIN_HEADER.size)
+        return header == NAND_BIN_HEADER.pack(NAND_BIN_MAGIC, NAND_BIN_VERSION,
+                                              NAND_BIN_RECORD.size, self._capacity)
+
+    def _format(self, size):
+        with open(self._path, 'wb') as file:
+            file.write(NAND_BIN_HEADER.pack(NAND_BIN_MAGIC, NAND_BIN_VERSION,
+                                            NAND_BIN_RECORD.size, self._capacity))
+            file.truncate(size)
+
+    def _offset(self, lba):
+        return NAND_BIN_HEADER.size + NAND_BIN_RECORD.size * lba
+
+    def read_value(self, lba):
+        return NAND_BIN_RECORD.unpack_from(self._mmap, self._offset(lba))[0]
+
+    def read_lba(self, lba):
+        return f"{lba:0{self._lba_width}d} 0x{self.read_value(lba):08X}\n"
+
+    def write_lba(self, lba, value):
+        NAND_BIN_RECORD.pack_into(self._mmap, self._offset(lba), value)
+
+    def erase_lba(self, lba, size):
+        start = self._offset(lba)
+        self._mmap[start:start + NAND_BIN_RECORD.size * size] = bytes(NAND_BIN_RECORD.size * size)
+
+    def read_lba_range(self, lba, size):
+        values = struct.unpack_from(f"<{size}I", self._mmap, self._offset(lba))
+        return [f"{lba + index:0{self._lba_width}d} 0x{value:08X}\n" for index, value in enumerate(values)]
+
+    def write_lba_range(self, lba, values):
+        struct.pack_into(f"<{len(values)}I", self._mmap, self._offset(lba), *values)
+
+    def fill_lba_range(self, lba, size, value):
+        start = self._offset(lba)
+        self._mmap[start:start + NAND_BIN_RECORD.size * size] = NAND_BIN_RECORD.pack(value) * size
+
+    def read(self):
+        return [self.read_lba(lba) for lba in range(self._capacity)]
+
+    def write(self, output):
+        for lba, line in enumerate(output[:self._capacity]):
+            try:
+                value = int(line.split()[1], 16)
+            except (IndexError, ValueError):
+                value = 0
+            self.write_lba(lba, value)
+
+    def export_text(self, path=NAND_TXT_PATH):
+        # 사람이 읽는 debug 용 view, 동작에는 사용하지 않음
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(self.read())
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+        type(self)._instance = None
+
+
+class SSDNumpyNand(SSDBinaryNand):
+    # ssd_nand.bin 과 같은 image 를 uint32 array 로 memmap, 범위 연산은 slice 한 번
+    def __init__(self, path=NAND_BIN_PATH, capacity=None):
+        if numpy is None:
+            raise ImportError("numpy is required for SSDNumpyNand")
+        super().__init__(path, capacity)
+
+    def _open(self):
+        size = NAND_BIN_HEADER.size + NAND_BIN_RECORD.size * self._capacity
+        if not self._is_valid_image(size):
+            self._format(size)
+
+        self._mmap = numpy.memmap(self._path, dtype='<u4', mode='r+', offset=NAND_BIN_HEADER.size,
+                                  shape=(self._capacity,))
+
+    def read_value(self, lba):
+        return int(self._mmap[lba])
+
+    def write_lba(self, lba, value):
+        self._mmap[lba] = value
+
+    def erase_lba(self, lba, size):
+        self._mmap[lba:lba + size] = 0
+
+    def read_lba_range(self, lba, size):
+        values = self._mmap[lba:lba + size].tolist()
+        return [f"{lba + index:0{self._lba_width}d} 0x{value:08X}\n" for index, value in enumerate(values)]
+
+    def write_lba_range(self, lba, values):
+        self._mmap[lba:lba + len(values)] = numpy.asarray(values, dtype='<u4')
+
+    def fill_lba_range(self, lba, size, value):
+        self._mmap[lba:lba + size] = value
+
+    def mismatch_lbas(self, lba, expected):
+        # verify 용, expected 는 값 하나(pattern) 또는 LBA 별 값
+        size = len(expected) if isinstance(expected, (list, tuple)) else self._capacity - lba
+        expected = numpy.asarray(expected, dtype='<u4')
+        return (numpy.flatnonzero(self._mmap[lba:lba + size] != expected) + lba).tolist()
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap = None
+        type(self)._instance = None
+
+
+class SSDSparseNand(SSDNandText):
+    def __init__(self, path=NAND_SPARSE_PATH, capacity=None):
+        if hasattr(self, 'initialized'):
+            self._check_capacity(capacity)
+        else:
+            self.initialized = True
+            self._path = path
+            self._capacity = capacity = capacity if capacity is not None else MAX_NAND_SIZE
+            self._lba_width = lba_width(capacity)
+            self._values = {}
+            self._record_cnt = 0
+            self._file = None
+            self._batch_records = None
+            self._signature = None
+            self._load()
+
+    def _load(self):
+        header = NAND_SPARSE_HEADER.pack(NAND_SPARSE_MAGIC, NAND_SPARSE_VERSION, self._capacity)
+        data = b""
+        if os.path.exists(self._path):
+            with open(self._path, 'rb') as file:
+                data = file.read()
+
+        if data[:NAND_SPARSE_HEADER.size] != header:
+            self._compact()
+            return
+
+        # 마지막 record 가 잘려 있으면 무시
+        end = len(data) - (len(data) - NAND_SPARSE_HEADER.size) % NAND_SPARSE_RECORD.size
+        for offset in range(NAND_SPARSE_HEADER.size, end, NAND_SPARSE_RECORD.size):
+            op, lba, value = NAND_SPARSE_RECORD.unpack_from(data, offset)
+            if op == NAND_SPARSE_WRITE:
+                self._set(lba, value)
+            else:
+                self._clear(lba, value)
+        self._record_cnt = (end - NAND_SPARSE_HEADER.size) // NAND_SPARSE_RECORD.size
+        self._file = open(self._path, 'r+b')
+        self._file.seek(end)
+        # 잘린 record 가 있을 때만 자름, 아니면 lock 없이 열어도 다른 process 가 추가한 record 를 지우지 않음
+        if end != len(data):
+            self._file.truncate()
+        self._signature = file_signature(self._file.fileno())
+
+    def refresh(self):
+        # 다른 process 가 record 를 추가하거나 compact 했으면 처음부터 다시 읽음
+        if file_signature(self._path) == self._signature:
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._values = {}
+        self._record_cnt = 0
+        self._load()
+
+    def _compact(self):
+        # 살아있는 LBA 만 남기고 다시 기록
+        if self._file is not None:
+            self._file.close()
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(NAND_SPARSE_HEADER.pack(NAND_SPARSE_MAGIC, NAND_SPARSE_VERSION, self._capacity))
+            for lba in sorted(self._values):
+                file.write(NAND_SPARSE_RECORD.pack(NAND_SPARSE_WRITE, lba, self._values[lba]))
+        os.replace(tmp_path, self._path)
+        self._record_cnt = len(self._values)
+        self._file = open(self._path, 'ab')
+        self._signature = file_signature(self._file.fileno())
+
+    def _append(self, op, lba, value):
+        if self._batch_records is not None:
+            self._batch_records.append(NAND_SPARSE_RECORD.pack(op, lba, value))
+            return
+        self._write_records([NAND_SPARSE_RECORD.pack(op, lba, value)])
+
+    def _write_records(self, records):
+        self._file.write(b"".join(records))
+        self._file.flush()
+        self._record_cnt += len(records)
+        if self._record_cnt > 2 * len(self._values) + 1024:
+            self._compact()
+        else:
+            self._signature = file_signature(self._file.fileno())
+
+    @contextlib.contextmanager
+    def batch(self):
+        # batch 동안의 record 를 모아서 한 번에 기록
+        if self._batch_records is not None:
+            yield
+            return
+        self._batch_records = []
+        try:
+            yield
+        finally:
+            records, self._batch_records = self._batch_records, None
+            if records:
+                self._write_records(records)
+
+    def _set(self, lba, value):
+        if value == 0:
+            self._values.pop(lba, None)
+        else:
+            self._values[lba] = value
+
+    def _clear(self, lba, size):
+        if size < len(self._values):
+            for index in range(lba, lba + size):
+                self._values.pop(index, None)
+        else:
+            for index in [index for index in self._values if lba <= index < lba + size]:
+                del self._values[index]
+
+    @property
+    def written_cnt(self):
+        return len(self._values)
+
+    def read_value(self, lba):
+        return self._values.get(lba, 0)
+
+    def read_lba(self, lba):
+        return f"{lba:0{self._lba_width}d} 0x{self.read_value(lba):08X}\n"
+
+    def write_lba(self, lba, value):
+        self._set(lba, value)
+        self._append(NAND_SPARSE_WRITE, lba, value)
+
+    def erase_lba(self, lba, size):
+        self._clear(lba, size)
+        self._append(NAND_SPARSE_ERASE, lba, size)
+
+    def read(self):
+        return [self.read_lba(lba) for lba in range(self._capacity)]
+
+    def write(self, output):
+        self._values = {}
+        for lba, line in enumerate(output[:self._capacity]):
+            try:
+                self._set(lba, int(line.split()[1], 16))
+            except (IndexError, ValueError):
+                continue
+        self._compact()
+
+    def format(self):
+        # batch 안에서 format 하면 그 앞의 record 는 버림
+        if self._batch_records is not None:
+            del self._batch_records[:]
+        self._values = {}
+        self._compact()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        type(self)._instance = None
+
 
 class SSDOutput(SSDText):
     def __init__(self):
         if not hasattr(self, 'initialized'):
             self.initialized = True
-            self.write("")
+            if not os.path.exists("ssd_output.txt"):
+                self.write("")
 
     def read(self):
         with open("ssd_output.txt", 'r', encoding='utf-8') as file:
@@ -53,3 +559,39 @@ class SSDOutput(SSDText):
     def write(self, output):
         with open("ssd_output.txt", 'w', encoding='utf-8') as file:
             file.write(output)
+
+
+class SSDNullOutput(SSDText):
+    # 결과를 남기지 않는 output (background flush 등)
+    def read(self):
+        return ""
+
+    def write(self, output):
+        pass
+
+
+class SSDTeeOutput(SSDText):
+    # 마지막 결과를 메모리에 두고, sink(기본 ssd_output.txt) 에도 같이 기록
+    # 결과는 thread 별로 보관 (resident 모드에서는 여러 client thread 가 같은 SSD 를 사용)
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, sink: SSDText = None, metrics=None):
+        self._sink = sink
+        self._metrics = metrics
+        self._local = threading.local()
+
+    def read(self):
+        return getattr(self._local, 'output', "")
+
+    def write(self, output):
+        self._local.output = output
+        sink = self._sink if self._sink is not None else SSDOutput()
+        if self._metrics is None:
+            sink.write(output)
+            return
+        with self._metrics.timer('output'):
+            sink.write(output)
+
+    def reset(self):
+        self._local.output = ""
@@ -0,0 +1,124 @@
+import time
+
+from ssd_texts import SSDNandText
+
+# 일반적인 TLC NAND 수준의 기본값 (usec)
+NAND_READ_US = 50.0
+NAND_PROGRAM_US = 600.0
+NAND_ERASE_US = 3000.0
+BUFFER_HIT_US = 1.0
+NAND_CHANNEL_CNT = 4
+NAND_DIE_CNT = 2
+
+
+class NandTimingModel:
+    # 모의 device 시간을 계산하는 model, LBA 는 channel x die 에 번갈아 배치
+    # die 마다 바쁜 시간이 끝나는 시점을 기억해서, 서로 다른 die 의 작업은 겹쳐서 진행
+    def __init__(self, read_us=NAND_READ_US, program_us=NAND_PROGRAM_US, erase_us=NAND_ERASE_US,
+                 buffer_hit_us=BUFFER_HIT_US, channel_cnt=NAND_CHANNEL_CNT, die_cnt=NAND_DIE_CNT,
+                 clock=time.perf_counter):
+        self._op_us = {'read': read_us, 'program': program_us, 'erase': erase_us}
+        self._buffer_hit_us = buffer_hit_us
+        self._die_free_us = [0.0] * (channel_cnt * die_cnt)
+        self._clock = clock
+        self._end_us = 0.0
+        self._wall_start = None
+        self.now_us = 0.0
+        self.wall_s = 0.0
+        self.command_cnt = 0
+        self.last_latency_us = 0.0
+        self.op_cnt = {'read': 0, 'program': 0, 'erase': 0, 'buffer_hit': 0}
+
+    @property
+    def die_cnt(self):
+        return len(self._die_free_us)
+
+    def schedule(self, op, lba, size=1):
+        # read / program 은 LBA 하나당, erase 는 범위가 걸친 die 마다 한 번
+        die_cnt = self.die_cnt
+        for index in range(min(size, die_cnt)):
+            die = (lba + index) % die_cnt
+            cnt = 1 if op == 'erase' else (size - index + die_cnt - 1) // die_cnt
+            start = max(self.now_us, self._die_free_us[die])
+            self._die_free_us[die] = start + self._op_us[op] * cnt
+            self._end_us = max(self._end_us, self._die_free_us[die])
+            self.op_cnt[op] += cnt
+
+    def buffer_hit(self):
+        self._end_us = max(self._end_us, self.now_us + self._buffer_hit_us)
+        self.op_cnt['buffer_hit'] += 1
+
+    def begin(self):
+        self._end_us = self.now_us
+        self._wall_start = self._clock()
+
+    def end(self):
+        # command 하나가 끝나는 시점까지 모의 시간을 진행하고 그 latency 를 돌려줌
+        self.last_latency_us = self._end_us - self.now_us
+        self.now_us = self._end_us
+        self.wall_s += self._clock() - self._wall_start
+        self.command_cnt += 1
+        return self.last_latency_us
+
+    def stats(self):
+        device_s = self.now_us / 1e6
+        return {
+            'commands': self.command_cnt,
+            'device_time_us': self.now_us,
+            'wall_time_s': self.wall_s,
+            'mean_latency_us': self.now_us / self.command_cnt if self.command_cnt else 0.0,
+            'modeled_iops': self.command_cnt / device_s if device_s else 0.0,
+            **self.op_cnt,
+        }
+
+
+class SSDTimedNand(SSDNandText):
+    # 다른 NAND backend 를 감싸서 모든 NAND 작업을 timing model 에 기록
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, nand_txt: SSDNandText, timing_model: NandTimingModel):
+        self._nand_txt = nand_txt
+        self._timing_model = timing_model
+        self._capacity = nand_txt.capacity
+        self.range_parallel = nand_txt.range_parallel
+
+    def read_lba(self, lba):
+        self._timing_model.schedule('read', lba)
+        return self._nand_txt.read_lba(lba)
+
+    def write_lba(self, lba, value):
+        self._timing_model.schedule('program', lba)
+        self._nand_txt.write_lba(lba, value)
+
+    def erase_lba(self, lba, size):
+        self._timing_model.schedule('erase', lba, size)
+        self._nand_txt.erase_lba(lba, size)
+
+    def read_lba_range(self, lba, size):
+        self._timing_model.schedule('read', lba, size)
+        return self._nand_txt.read_lba_range(lba, size)
+
+    def write_lba_range(self, lba, values):
+        self._timing_model.schedule('program', lba, len(values))
+        self._nand_txt.write_lba_range(lba, values)
+
+    def fill_lba_range(self, lba, size, value):
+        self._timing_model.schedule('program', lba, size)
+        self._nand_txt.fill_lba_range(lba, size, value)
+
+    def format(self):
+        self._timing_model.schedule('erase', 0, self._capacity)
+        self._nand_txt.format()
+
+    def batch(self):
+        return self._nand_txt.batch()
+
+    def flush(self):
+        self._nand_txt.flush()
+
+    def read(self):
+        return self._nand_txt.read()
+
+    def write(self, output):
+        self._nand_txt.write(output)
@@ -0,0 +1,176 @@
+import argparse
+import os
+import struct
+import sys
+import threading
+import time
+
+from ssd_metrics import LatencyHistogram, PERCENTILES
+
+# trace 파일 : header(magic, version) + command 당 (시각 ns, op, lba, size, value) record
+# WR 의 값 목록과 형식이 맞지 않는 command 는 뒤에 payload 를 붙임
+TRACE_MAGIC = b"SSDT"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<4sH")
+TRACE_RECORD = struct.Struct("<QBQII")
+TRACE_FLUSH_SIZE = 64 * 1024
+
+TRACE_RAW = 0
+TRACE_OPS = {'R': 1, 'W': 2, 'E': 3, 'F': 4, 'RR': 5, 'WR': 6, 'FORMAT': 7, 'STATS': 8}
+TRACE_WR_VALUES = 9
+TRACE_OP_NAMES = {code: name for name, code in TRACE_OPS.items()}
+
+
+def encode_command(timestamp_ns, argv):
+    cmd = argv[1] if len(argv) > 1 else ""
+    try:
+        if cmd == 'R' and len(argv) == 3:
+            return TRACE_RECORD.pack(timestamp_ns, TRACE_OPS[cmd], int(argv[2]), 1, 0)
+        if cmd == 'W' and len(argv) == 4:
+            return TRACE_RECORD.pack(timestamp_ns, TRACE_OPS[cmd], int(argv[2]), 1, int(str(argv[3]), 16))
+        if cmd in ('E', 'RR') and len(argv) == 4:
+            return TRACE_RECORD.pack(timestamp_ns, TRACE_OPS[cmd], int(argv[2]), int(argv[3]), 0)
+        if cmd in ('F', 'FORMAT', 'STATS') and len(argv) == 2:
+            return TRACE_RECORD.pack(timestamp_ns, TRACE_OPS[cmd], 0, 0, 0)
+        if cmd == 'WR' and len(argv) == 5:
+            values = [int(value, 16) for value in str(argv[4]).split(",")]
+            if len(values) == 1:
+                return TRACE_RECORD.pack(timestamp_ns, TRACE_OPS[cmd], int(argv[2]), int(argv[3]), values[0])
+            return TRACE_RECORD.pack(timestamp_ns, TRACE_WR_VALUES, int(argv[2]), int(argv[3]), len(values)) + \
+                struct.pack(f"<{len(values)}I", *values)
+    except (ValueError, struct.error):
+        pass
+    # 잘못된 command 도 그대로 재현할 수 있도록 문자열로 남김
+    text = " ".join(str(arg) for arg in argv[1:]).encode()
+    return TRACE_RECORD.pack(timestamp_ns, TRACE_RAW, 0, 0, len(text)) + text
+
+
+def read_trace(path):
+    # (시각 ns, argv) 를 순서대로 돌려줌, 마지막 record 가 잘려 있으면 무시
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:TRACE_HEADER.size] != TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION):
+        raise ValueError("ERROR")
+
+    offset = TRACE_HEADER.size
+    while offset + TRACE_RECORD.size <= len(data):
+        timestamp_ns, op, lba, size, value = TRACE_RECORD.unpack_from(data, offset)
+        offset += TRACE_RECORD.size
+        if op == TRACE_RAW:
+            if offset + value > len(data):
+                return
+            argv = [None] + data[offset:offset + value].decode().split()
+            offset += value
+        elif op == TRACE_WR_VALUES:
+            if offset + 4 * value > len(data):
+                return
+            values = struct.unpack_from(f"<{value}I", data, offset)
+            offset += 4 * value
+            argv = [None, 'WR', lba, size, ",".join(f"0x{item:08X}" for item in values)]
+        else:
+            argv = [None, TRACE_OP_NAMES[op]]
+            if argv[1] == 'R':
+                argv += [lba]
+            elif argv[1] == 'W':
+                argv += [lba, f"0x{value:08X}"]
+            elif argv[1] in ('E', 'RR'):
+                argv += [lba, size]
+            elif argv[1] == 'WR':
+                argv += [lba, size, f"0x{value:08X}"]
+        yield timestamp_ns, argv
+
+
+class SSDTraceRecorder:
+    # SSD.run / Shell.send_command 로 들어온 command 를 trace 파일에 이어서 기록
+    # record 단위로 모아서 쓰므로 여러 process 가 같은 파일에 append 해도 record 가 섞이지 않음
+    def __init__(self, path, clock=time.time_ns):
+        self._path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending = bytearray()
+        if not os.path.exists(path) or os.path.getsize(path) < TRACE_HEADER.size:
+            with open(path, 'wb') as file:
+                file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION))
+        self._file = open(path, 'ab', buffering=0)
+
+    def record(self, argv):
+        with self._lock:
+            self._pending += encode_command(self._clock(), argv)
+            if len(self._pending) >= TRACE_FLUSH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._file.write(bytes(self._pending))
+            self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+                self._file.close()
+                self._file = None
+
+
+def replay_trace(path, ssd, pacing=False, speed=1.0):
+    # shell 을 거치지 않고 ssd.execute 로 바로 실행, pacing 이면 기록된 간격을 speed 배로 맞춤
+    histogram = LatencyHistogram()
+    command_cnt = 0
+    error_cnt = 0
+    first_ns = None
+    start_ns = time.perf_counter_ns()
+    for timestamp_ns, argv in read_trace(path):
+        if pacing:
+            if first_ns is None:
+                first_ns = timestamp_ns
+            delay_ns = (timestamp_ns - first_ns) / speed - (time.perf_counter_ns() - start_ns)
+            if delay_ns > 0:
+                time.sleep(delay_ns / 1e9)
+
+        command_start_ns = time.perf_counter_ns()
+        if ssd.execute(argv).is_error:
+            error_cnt += 1
+        histogram.record(time.perf_counter_ns() - command_start_ns)
+        command_cnt += 1
+
+    elapsed_s = (time.perf_counter_ns() - start_ns) / 1e9
+    return {
+        'commands': command_cnt,
+        'errors': error_cnt,
+        'elapsed_s': elapsed_s,
+        'iops': command_cnt / elapsed_s if elapsed_s else 0.0,
+        'latency_us': histogram.snapshot(1000),
+    }
+
+
+def main(argv=None):
+    # python ssd_trace.py trace.bin [--pace] [--speed 2]
+    # backend 와 buffer 설정은 ssd.py 와 같은 SSD_NAND_BACKEND / SSD_NAND_CAPACITY / SSD_BUFFER_STORE 사용
+    from ssd import create_ssd_from_env
+    from ssd_texts import SSDNullOutput
+
+    parser = argparse.ArgumentParser(description="replay an SSD command trace")
+    parser.add_argument('trace')
+    parser.add_argument('--pace', action='store_true', help="keep the recorded command intervals")
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--no-buffer', action='store_true')
+    args = parser.parse_args(argv)
+
+    ssd = create_ssd_from_env(no_buf_mode=args.no_buffer, resident_buffer=True, output_txt=SSDNullOutput(), trace=None)
+    try:
+        report = replay_trace(args.trace, ssd, args.pace, args.speed)
+    finally:
+        ssd.close()
+
+    print(f"commands {report['commands']} errors {report['errors']} elapsed {report['elapsed_s']:.3f}s "
+          f"iops {report['iops']:.0f}")
+    latency = report['latency_us']
+    print("latency(us) " + " ".join(f"p{percent:g}={latency.get(f'p{percent:g}', 0):.1f}" for percent in PERCENTILES))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import asyncio
+import random
+import time
+
+from ssd_metrics import LatencyHistogram, DEFAULT_METRICS
+
+WORKLOAD_DEFAULT_OPS = 1000
+MAX_ERASE_BLOCK = 10
+
+
+class WorkloadSpec:
+    # fio 처럼 "rand read=70 write=30 range=0-99 bs=1 ops=1000 qd=4 seed=1" 형식
+    def __init__(self, capacity, pattern='rand', read=100, write=0, erase=0, start=0, end=None, bs=1,
+                 ops=None, duration=None, qd=1, seed=0):
+        self.capacity = capacity
+        self.pattern = pattern
+        self.read = read
+        self.write = write
+        self.erase = erase
+        self.start = start
+        self.end = end if end is not None else capacity - 1
+        self.bs = bs
+        self.ops = ops if ops is not None or duration is not None else WORKLOAD_DEFAULT_OPS
+        self.duration = duration
+        self.qd = qd
+        self.seed = seed
+        self._check()
+
+    def _check(self):
+        if self.pattern not in ('seq', 'rand'):
+            raise ValueError("INVALID WORKLOAD")
+        if min(self.read, self.write, self.erase) < 0 or self.read + self.write + self.erase <= 0:
+            raise ValueError("INVALID WORKLOAD")
+        if not 0 <= self.start <= self.end < self.capacity or not 1 <= self.bs <= self.end - self.start + 1:
+            raise ValueError("INVALID WORKLOAD")
+        if self.erase and self.bs > MAX_ERASE_BLOCK:
+            raise ValueError("INVALID WORKLOAD")
+        if self.qd < 1 or (self.ops is not None and self.ops < 1) or (self.duration is not None and self.duration <= 0):
+            raise ValueError("INVALID WORKLOAD")
+
+    @classmethod
+    def parse(cls, tokens, capacity):
+        kwargs = {}
+        try:
+            for token in tokens:
+                if token in ('seq', 'rand'):
+                    kwargs['pattern'] = token
+                    continue
+                key, value = token.split('=')
+                if key in ('read', 'write', 'erase', 'bs', 'ops', 'qd', 'seed'):
+                    kwargs[key] = int(value)
+                elif key == 'time':
+                    kwargs['duration'] = float(value)
+                elif key == 'range':
+                    start, end = value.split('-')
+                    kwargs['start'], kwargs['end'] = int(start), int(end)
+                else:
+                    raise ValueError("INVALID WORKLOAD")
+        except ValueError:
+            raise ValueError("INVALID WORKLOAD")
+        return cls(capacity, **kwargs)
+
+
+def generate_commands(spec: WorkloadSpec):
+    # ops 개 (duration 만 주면 끝없이) command 를 만듦, 같은 seed 면 같은 순서
+    rand = random.Random(spec.seed)
+    total = spec.read + spec.write + spec.erase
+    cursor = spec.start
+    index = 0
+    while spec.ops is None or index < spec.ops:
+        if spec.pattern == 'seq':
+            if cursor + spec.bs > spec.end + 1:
+                cursor = spec.start
+            lba = cursor
+            cursor += spec.bs
+        else:
+            lba = rand.randint(spec.start, spec.end - spec.bs + 1)
+
+        pick = rand.randrange(total)
+        if pick < spec.read:
+            yield [None, 'R', lba] if spec.bs == 1 else [None, 'RR', lba, spec.bs]
+        elif pick < spec.read + spec.write:
+            value = f"0x{rand.randint(0, 0xFFFFFFFF):08X}"
+            yield [None, 'W', lba, value] if spec.bs == 1 else [None, 'WR', lba, spec.bs, value]
+        else:
+            yield [None, 'E', lba, spec.bs]
+        index += 1
+
+
+class WorkloadReport:
+    def __init__(self, metrics=DEFAULT_METRICS):
+        self._metrics = metrics
+        self._counters = dict(metrics.snapshot()['counters'])
+        self.histogram = LatencyHistogram()
+        self.ops = 0
+        self.errors = 0
+        self.elapsed_s = 0.0
+        self._start = time.perf_counter()
+
+    def record(self, latency_ns, result):
+        self.histogram.record(latency_ns)
+        self.ops += 1
+        if result.is_error:
+            self.errors += 1
+
+    def finish(self):
+        self.elapsed_s = time.perf_counter() - self._start
+        return self
+
+    @property
+    def iops(self):
+        return self.ops / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def read_hit_rate(self):
+        # 같은 process 안의 SSD 일 때만 알 수 있음 (socket 으로 연결된 server 는 None)
+        counters = self._metrics.snapshot()['counters']
+        hit = counters.get('buffer.read_hit', 0) - self._counters.get('buffer.read_hit', 0)
+        miss = counters.get('buffer.read_miss', 0) - self._counters.get('buffer.read_miss', 0)
+        return hit / (hit + miss) if hit + miss else None
+
+    def lines(self):
+        latency = self.histogram.snapshot(1000)
+        hit_rate = self.read_hit_rate
+        return [
+            f"ops {self.ops} errors {self.errors} elapsed {self.elapsed_s:.3f}s iops {self.iops:.0f}",
+            "latency(us) " + " ".join(f"{key}={value:.1f}" for key, value in latency.items()
+                                      if key.startswith('p') or key == 'mean'),
+            f"buffer read hit {'n/a' if hit_rate is None else f'{hit_rate * 100:.1f}%'}",
+        ]
+
+
+def run_workload(spec: WorkloadSpec, execute, metrics=DEFAULT_METRICS):
+    # queue depth 1, execute(args) -> SSDResult 를 한 번에 하나씩 호출
+    report = WorkloadReport(metrics)
+    deadline = time.perf_counter() + spec.duration if spec.duration is not None else None
+    for args in generate_commands(spec):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        start = time.perf_counter_ns()
+        result = execute(args)
+        report.record(time.perf_counter_ns() - start, result)
+    return report.finish()
+
+
+async def run_workload_async(spec: WorkloadSpec, interface, metrics=DEFAULT_METRICS):
+    # interface(SSDAsyncInterface) 에 qd 개까지 동시에 보내 둠
+    report = WorkloadReport(metrics)
+    deadline = time.perf_counter() + spec.duration if spec.duration is not None else None
+    in_flight = set()
+
+    async def issue(args):
+        start = time.perf_counter_ns()
+        result = await interface.execute(args)
+        report.record(time.perf_counter_ns() - start, result)
+
+    for args in generate_commands(spec):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        if len(in_flight) >= spec.qd:
+            _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        in_flight.add(asyncio.create_task(issue(args)))
+    if in_flight:
+        await asyncio.wait(in_flight)
+    return report.finish()
@@ -1,8 +1,13 @@
+import random
+from unittest import mock
+
 import pytest
 import os.path
 from pytest_mock import MockerFixture
-from buffer import Buffer, BUFFER_FOLDER_PATH, WRITE, ERASE, EMPTY_VALUE, ERASE_VALUE
+from buffer import Buffer, BufferJournalStore, BufferMemory, BUFFER_FOLDER_PATH, JOURNAL_RECORD_HEADER, EMPTY, WRITE, ERASE, \
+    EMPTY_VALUE, ERASE_VALUE
 from unittest.mock import call
+from buffer_policy import WatermarkFlushPolicy, ReadMissFlushPolicy, AgeFlushPolicy, CoalesceRatioFlushPolicy
 
 TEST_LBA = 3
 TEST_WRITE_VALUE = 0x1234ABCD
@@ -254,7 +259,8 @@ def test_erase_commands_split_by_write_are_not_merged(buffer: Buffer, mocker: Mo
 
 def test_buffer_create():
     buffer = Buffer()
-    file_list = os.listdir(BUFFER_FOLDER_PATH)
+    # listdir 순서는 filesystem 마다 다르므로 정렬해서 비교
+    file_list = sorted(os.listdir(BUFFER_FOLDER_PATH))
 
     assert os.path.exists(BUFFER_FOLDER_PATH)
     assert buffer._buf_lst == file_list
@@ -272,3 +278,291 @@ def test_buffer_run(mocker: MockerFixture, func, sys_argv):
     mocker.patch(f"buffer.Buffer.{func}")
     buffer = Buffer()
     assert buffer.run(sys_argv) == []
+
+
+def test_erase_at_end_of_nand_is_buffered(buffer: Buffer):
+    buffer._check_buffer_erase([None, 'E', '98', '5'])
+
+    assert buffer._buf_lst[0] == '1_E_98_2'
+    assert buffer._buffer_cnt == 1
+
+
+def test_large_capacity_memory_is_sparse(mocker: MockerFixture):
+    mocker.patch("os.makedirs")
+    mocker.patch("os.listdir", return_value=[])
+    mocker.patch("builtins.open", mocker.mock_open())
+    mocker.patch("buffer.SSDOutput", return_value=mocker.Mock(write=mocker.Mock()))
+    buffer = Buffer(10 ** 7)
+
+    buffer.run([None, 'W', 9_999_999, '0x0000000A'])
+    buffer.run([None, 'E', 5_000_000, 10])
+
+    assert len(buffer._buffer_cmd_memory) == 11
+    assert buffer._buf_lst[:2] == ['1_E_5000000_10', '2_W_9999999_0x0000000A']
+
+
+@pytest.fixture
+def journal_path(tmp_path, mocker: MockerFixture):
+    mocker.patch("buffer.SSDOutput", return_value=mocker.Mock(write=mocker.Mock()))
+    return str(tmp_path / "buffer.journal")
+
+
+def test_journal_replay_recovers_buffer(journal_path):
+    buffer = Buffer(store=BufferJournalStore(journal_path))
+    buffer.run([None, 'W', 1, '0x00000001'])
+    buffer.run([None, 'E', 10, 3])
+
+    replayed = Buffer(store=BufferJournalStore(journal_path))
+
+    assert replayed._buf_lst == ['1_E_10_3', '2_W_1_0x00000001', '3_empty', '4_empty', '5_empty']
+    assert replayed._buffer_cnt == 2
+    assert replayed._buffer_cmd_memory[11][0] == ERASE
+
+
+def test_journal_read_does_not_append(journal_path):
+    buffer = Buffer(store=BufferJournalStore(journal_path))
+    buffer.run([None, 'W', 1, '0x00000001'])
+    size = os.path.getsize(journal_path)
+
+    buffer.run([None, 'R', 1])
+    buffer.run([None, 'R', 2])
+
+    assert os.path.getsize(journal_path) == size
+
+
+def test_journal_ignores_torn_record(journal_path):
+    buffer = Buffer(store=BufferJournalStore(journal_path))
+    buffer.run([None, 'W', 1, '0x00000001'])
+    size = os.path.getsize(journal_path)
+    with open(journal_path, 'ab') as file:
+        file.write(b"\x20\x00\x00\x00\xde\xad")
+
+    replayed = Buffer(store=BufferJournalStore(journal_path))
+
+    assert replayed._buf_lst[0] == '1_W_1_0x00000001'
+    assert os.path.getsize(journal_path) == size
+
+
+def test_journal_group_commit(journal_path):
+    store = BufferJournalStore(journal_path, group_commit=3)
+    buffer = Buffer(store=store)
+    buffer.run([None, 'W', 1, '0x00000001'])
+    buffer.run([None, 'W', 2, '0x00000002'])
+    assert os.path.getsize(journal_path) == 0
+
+    buffer.run([None, 'W', 3, '0x00000003'])
+    assert os.path.getsize(journal_path) > 0
+    buffer.run([None, 'W', 4, '0x00000004'])
+    buffer.close()
+
+    replayed = Buffer(store=BufferJournalStore(journal_path))
+    assert replayed._buffer_cnt == 4
+
+
+def test_journal_compacts_on_flush(journal_path):
+    buffer = Buffer(store=BufferJournalStore(journal_path))
+    for lba in range(5):
+        buffer.run([None, 'W', lba, '0x00000001'])
+
+    assert len(buffer.run([None, 'F'])) == 5
+    assert os.path.getsize(journal_path) == JOURNAL_RECORD_HEADER.size + len(
+        "\n".join(['1_empty', '2_empty', '3_empty', '4_empty', '5_empty']))
+    assert Buffer(store=BufferJournalStore(journal_path))._buffer_cnt == 0
+
+
+class DenseBufferModel:
+    # LBA 마다 상태를 두고 전체를 scan 하던 기존 구현 (property test 기준)
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.memory = [[0, 0] for _ in range(capacity + 1)]
+        self.buf_lst = [f'{i + 1}_empty' for i in range(5)]
+        self.cnt = 0
+        self.run_command = []
+        self.read_value = None
+
+    def run(self, argv):
+        self.run_command = []
+        self.read_value = None
+        cmd = argv[1]
+        if cmd == 'R':
+            lba = argv[2]
+            if self.memory[lba][0] != 0:
+                self.read_value = self.memory[lba][1]
+            else:
+                self.run_command.append(argv)
+        elif cmd == 'W':
+            lba, value = argv[2], int(argv[3], 16)
+            if self.memory[lba][0] != WRITE and self.cnt == 5:
+                self.flush(self.cnt)
+            self.reset()
+            self.merge_erases()
+            self.memory[lba] = [WRITE, value]
+            self.merge_writes()
+        elif cmd == 'E':
+            lba, size = argv[2], argv[3]
+            self.reset()
+            for index in range(lba, min(lba + size, self.capacity)):
+                self.memory[index] = [ERASE, 0]
+            self.merge_erases()
+            self.merge_writes()
+        else:
+            self.flush(self.cnt)
+        return self.run_command
+
+    def reset(self):
+        self.cnt = 0
+        self.buf_lst = [f'{i + 1}_empty' for i in range(5)]
+
+    def merge_writes(self):
+        for lba, (state, value) in enumerate(self.memory):
+            if state != WRITE:
+                continue
+            if self.cnt == 5:
+                self.flush(self.cnt)
+            self.buf_lst[self.cnt] = f"{self.cnt + 1}_W_{lba}_0x{value:08X}"
+            self.cnt += 1
+
+    def merge_erases(self):
+        erase_cnt, first_lba = 0, 0
+        for lba, (state, _) in enumerate(self.memory):
+            if state != ERASE:
+                if erase_cnt > 0:
+                    erase_cnt = self.add_erase(first_lba, erase_cnt)
+                continue
+            first_lba = lba if erase_cnt == 0 else first_lba
+            erase_cnt += 1
+            if erase_cnt == 10:
+                erase_cnt = self.add_erase(first_lba, erase_cnt)
+
+    def add_erase(self, lba, size):
+        if self.cnt == 5:
+            self.flush(self.cnt)
+        self.buf_lst[self.cnt] = f"{self.cnt + 1}_E_{lba}_{size}"
+        self.cnt += 1
+        return 0
+
+    def flush(self, cnt):
+        for i in range(cnt):
+            _, cmd, lba, value = self.buf_lst[i].split("_")
+            lba = int(lba)
+            size = 1 if cmd == 'W' else int(value)
+            for index in range(lba, lba + size):
+                self.memory[index] = [0, 0]
+            self.run_command.append([None, cmd, lba, value])
+            self.buf_lst[i] = f"{i + 1}_empty"
+        self.cnt = 0
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_interval_buffer_matches_dense_model(buffer: Buffer, seed):
+    rand = random.Random(seed)
+    capacity = 100
+    model = DenseBufferModel(capacity)
+    buffer._output_txt = mock.Mock()
+
+    for _ in range(300):
+        op = rand.random()
+        lba = rand.randrange(capacity)
+        if op < 0.4:
+            argv = [None, 'W', lba, f"0x{rand.randint(0, 0xFFFFFFFF):08X}"]
+        elif op < 0.7:
+            argv = [None, 'E', lba, rand.randint(1, 10)]
+        elif op < 0.95:
+            argv = [None, 'R', lba]
+        else:
+            argv = [None, 'F']
+
+        buffer._output_txt.reset_mock()
+        assert buffer.run(argv) == model.run(argv)
+        assert buffer._buf_lst == model.buf_lst
+        assert buffer._buffer_cnt == model.cnt
+        if model.read_value is not None:
+            buffer._output_txt.write.assert_called_once_with(f"{lba:02d} 0x{model.read_value:08X}\n")
+
+
+def test_interval_memory_split_and_merge():
+    memory = BufferMemory()
+    memory.set_erase(10, 20)
+    memory.set_erase(20, 25)
+    memory.set_write(15, 0xA)
+    memory.clear_erase(22, 23)
+
+    assert memory.erase_runs(10) == [(10, 5), (16, 6), (23, 2)]
+    assert memory[15] == [WRITE, 0xA]
+    assert memory[22] == [EMPTY, EMPTY_VALUE]
+    assert memory[24] == [ERASE, ERASE_VALUE]
+    assert len(memory) == 14
+
+
+@pytest.mark.parametrize("start,end,expected", [(0, 10, False), (0, 11, True), (15, 16, True), (22, 23, False),
+                                                (25, 40, False), (24, 25, True), (40, 1000, True)])
+def test_buffer_memory_overlaps(start, end, expected):
+    memory = BufferMemory()
+    memory.set_erase(10, 22)
+    memory.set_erase(23, 25)
+    memory.set_write(15, 0xA)
+    memory.set_write(500, 0xB)
+
+    assert memory.overlaps(start, end) == expected
+
+
+def test_configurable_buffer_depth(journal_path):
+    buffer = Buffer(store=BufferJournalStore(journal_path), buffer_size=8)
+    for lba in range(8):
+        assert buffer.run([None, 'W', lba, '0x00000001']) == []
+
+    assert buffer.buffer_cnt == 8
+    assert len(buffer.run([None, 'W', 50, '0x00000001'])) == 8
+    assert buffer._buf_lst[0] == '1_W_50_0x00000001'
+
+
+def test_watermark_flush_policy(journal_path):
+    policy = WatermarkFlushPolicy(high=4, low=1)
+    buffer = Buffer(store=BufferJournalStore(journal_path), flush_policy=policy)
+    for lba in range(3):
+        buffer.run([None, 'W', lba, '0x00000001'])
+
+    run_command = buffer.run([None, 'W', 3, '0x00000001'])
+
+    assert [argv[2] for argv in run_command] == [0, 1, 2]
+    assert buffer._buf_lst[:2] == ['1_W_3_0x00000001', '2_empty']
+    assert policy.stats()['flush'] == 1
+    assert policy.stats()['flushed_cmd'] == 3
+
+
+def test_read_miss_flush_policy(journal_path):
+    policy = ReadMissFlushPolicy()
+    buffer = Buffer(store=BufferJournalStore(journal_path), flush_policy=policy)
+    buffer.run([None, 'W', 1, '0x00000001'])
+
+    assert buffer.run([None, 'R', 1]) == []
+    assert buffer.run([None, 'R', 2]) == [[None, 'W', 1, '0x00000001'], [None, 'R', 2]]
+    assert policy.hit_cnt == 1
+    assert policy.miss_cnt == 1
+    assert buffer.buffer_cnt == 0
+
+
+def test_age_flush_policy(journal_path):
+    now = [0.0]
+    policy = AgeFlushPolicy(max_age=1.0, clock=lambda: now[0])
+    buffer = Buffer(store=BufferJournalStore(journal_path), flush_policy=policy)
+    buffer.run([None, 'W', 1, '0x00000001'])
+
+    now[0] = 0.5
+    assert buffer.run([None, 'W', 2, '0x00000002']) == []
+    now[0] = 1.5
+    assert len(buffer.run([None, 'R', 50])) == 3
+
+
+def test_coalesce_ratio_flush_policy(journal_path):
+    policy = CoalesceRatioFlushPolicy(min_ratio=0.5, window=4)
+    buffer = Buffer(store=BufferJournalStore(journal_path), buffer_size=10, flush_policy=policy)
+    for _ in range(3):
+        buffer.run([None, 'W', 1, '0x00000001'])
+    assert buffer.buffer_cnt == 1
+    assert policy.coalesce_cnt == 2
+
+    assert buffer.run([None, 'W', 2, '0x00000001']) == []
+    assert buffer.run([None, 'W', 3, '0x00000001']) == []
+    assert len(buffer.run([None, 'W', 4, '0x00000001'])) == 4
+    assert buffer.buffer_cnt == 0
@@ -5,6 +5,26 @@ from unittest.mock import call, MagicMock, patch
 import unittest
 from unittest import mock
 from shell import *
+from ssd_result import SSDResult
+from buffer import BufferJournalStore
+from ssd_texts import SSDSparseNand, SSDBinaryNand, SSDNullOutput
+from ssd_workload import generate_commands
+from ssd_lock import SSDFileLock, SSD_LOCK_PATH
+from ssd_server import SSDServer
+from ssd_texts import SSDNand, SSDOutput
+
+
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(monkeypatch, tmp_path):
+    # latest.log / until_* / ssd_nand.txt 가 repo 폴더에 쌓이지 않도록 test 마다 임시 폴더에서 새로 만듦
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Logger, '_instance', None)
+    monkeypatch.setattr(SSDNand, '_instance', None)
+    monkeypatch.setattr(SSDOutput, '_instance', None)
+    yield
+    # 임시 폴더를 떠나기 전에 남은 log 를 씀
+    if Logger._instance is not None:
+        Logger._instance.close()
 
 
 class Test_shell:
@@ -13,6 +33,8 @@ class Test_shell:
         self.shell = Shell()
         self.get_response = mocker.patch.object(self.shell, 'get_response')
         self.get_response_value = mocker.patch.object(self.shell, 'get_response_value')
+        self.get_response_values = mocker.patch.object(self.shell, 'get_response_values',
+                                                       return_value=['0x00000000'] * 100)
         self.mock_print = mocker.patch('builtins.print')
         self.rand_num = mocker.patch('random.randint', return_value=12345678)
         self.shell.send_command = mocker.Mock()
@@ -22,7 +44,7 @@ class Test_shell:
         self.shell = Shell()
         self.shell.ssd_interface = mocker.Mock()
 
-    @pytest.mark.parametrize('command', ['E', 'W', 'R', 'F'])
+    @pytest.mark.parametrize('command', ['E', 'W', 'R', 'F', 'RR', 'WR', 'FORMAT', 'STATS'])
     def test_send_command(self, setup_ssdinterface, command):
         self.shell.ssd_interface.run.return_value = 'OK'
         result = self.shell.send_command(command, 10, 10)
@@ -30,6 +52,13 @@ class Test_shell:
         self.shell.ssd_interface.run.assert_called_once()
         assert result == 'OK'
 
+    def test_send_command_records_trace(self, setup_ssdinterface, mocker):
+        self.shell.trace = mocker.Mock()
+        self.shell.send_command('W', 3, 0xABCD)
+
+        self.shell.trace.record.assert_called_once_with([None, 'W', 3, "0x0000ABCD"])
+        self.shell.ssd_interface.run.assert_called_once_with([None, 'W', 3, "0x0000ABCD"])
+
     def test_response(self, setup_ssdinterface):
         self.shell.ssd_interface.get_response.return_value = 'RESPONSE'
         assert self.shell.get_response() == 'RESPONSE'
@@ -99,19 +128,20 @@ class Test_shell:
         # Act
         ShellFullReadCommand(self.shell).execute()
         # Assert
-        assert self.shell.send_command.call_count == 100
+        self.shell.send_command.assert_called_once_with('RR', 0, size=100)
+        self.mock_print.assert_any_call("LBA 99 : 0x00000000")
         self.mock_print.assert_any_call("[Full Read]")
 
     @pytest.mark.parametrize('values', ['ERROR'])
     def test_fullread_errors(self, setup_shell, values):
-        self.get_response_value.return_value = values
+        self.get_response_values.return_value = [values]
         # Act
         ShellFullReadCommand(self.shell).execute()
         # Assert
         self.mock_print.assert_any_call("ERROR")
 
     def test_fullread_raises_exception(self, setup_shell):
-        self.get_response_value.side_effect = ValueError("ERROR")
+        self.get_response_values.side_effect = ValueError("ERROR")
         # Act & #Assert
         with pytest.raises(ValueError, match="ERROR"):
             ShellFullReadCommand(self.shell).execute()
@@ -120,7 +150,7 @@ class Test_shell:
         # Act
         ShellFullWriteCommand(self.shell, value=12341234).execute()
         # Assert
-        assert self.shell.send_command.call_count == 100
+        self.shell.send_command.assert_called_once_with('WR', 0, 12341234, size=100)
         self.mock_print.assert_called_once_with("[Full Write] Done")
 
     def test_FullWriteAndReadCompare_pass(self, setup_shell):
@@ -188,6 +218,80 @@ class Test_shell:
         # Assert
         assert self.shell.send_command.call_count == 1
 
+    def test_Stats(self, setup_shell):
+        self.get_response.return_value = "cmd.W 3\n"
+        # Act
+        ShellStatsCommand(self.shell).execute()
+        # Assert
+        self.shell.send_command.assert_called_once_with('STATS')
+        self.mock_print.assert_any_call("cmd.W 3")
+
+    def test_Format(self, setup_shell):
+        # Act
+        ShellFormatCommand(self.shell).execute()
+        # Assert
+        self.shell.send_command.assert_called_once_with('FORMAT')
+        self.mock_print.assert_called_once_with("[Format] Done")
+
+    def test_workload_spec_parse(self):
+        spec = WorkloadSpec.parse(['seq', 'read=70', 'write=30', 'range=10-19', 'bs=2', 'ops=7', 'qd=4', 'seed=3'], 100)
+        assert (spec.pattern, spec.read, spec.write, spec.erase) == ('seq', 70, 30, 0)
+        assert (spec.start, spec.end, spec.bs, spec.ops, spec.qd, spec.seed) == (10, 19, 2, 7, 4, 3)
+
+        commands = list(generate_commands(spec))
+        assert [args[2] for args in commands] == [10, 12, 14, 16, 18, 10, 12]
+        assert {args[1] for args in commands} <= {'RR', 'WR'}
+        assert commands == list(generate_commands(spec))
+
+    @pytest.mark.parametrize('tokens', [['range=0-100'], ['read=0'], ['bs=11', 'erase=10'], ['qd=0'], ['iodepth=4'],
+                                        ['ops=x']])
+    def test_workload_invalid(self, tokens):
+        with pytest.raises(ValueError, match="INVALID WORKLOAD"):
+            WorkloadSpec.parse(tokens, 100)
+
+    def test_Workload(self, setup_ssdinterface, mocker):
+        mock_print = mocker.patch('builtins.print')
+        self.shell.ssd_interface.execute.return_value = SSDResult('R', '01 0x00000000')
+        self.shell.main_function(['workload', 'rand', 'read=50', 'write=50', 'ops=20', 'seed=1'])
+
+        assert self.shell.ssd_interface.execute.call_count == 20
+        mock_print.assert_any_call("[Workload]")
+        assert any(str(args[0]).startswith("ops 20 errors 0") for args, _ in mock_print.call_args_list)
+
+    def test_Workload_queue_depth(self, mocker, tmp_path):
+        mock_print = mocker.patch('builtins.print')
+        SSDSparseNand._instance = None
+        ssd = SSD(True, SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity=100), output_txt=SSDNullOutput())
+        shell = Shell(ssd_interface=SSDConcreteInterface(ssd=ssd))
+        ShellWorkloadCommand(shell, ['seq', 'read=0', 'write=100', 'range=0-9', 'ops=10', 'qd=4', 'seed=5']).execute()
+
+        expected = [args[3] for args in generate_commands(WorkloadSpec.parse(
+            ['seq', 'read=0', 'write=100', 'range=0-9', 'ops=10', 'seed=5'], 100))]
+        assert [ssd.execute([None, 'R', lba]).output.split()[1] for lba in range(10)] == expected
+        assert any(str(args[0]).startswith("ops 10 errors 0") for args, _ in mock_print.call_args_list)
+
+    def test_Workload_queue_depth_over_server(self, mocker, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        mock_print = mocker.patch('builtins.print')
+        SSDSparseNand._instance = None
+        server = SSDServer(str(tmp_path / "ssd.sock"), SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity=100))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        shell = Shell(ssd_interface=SSDSocketInterface(str(tmp_path / "ssd.sock")))
+        try:
+            # server 가 device 를 들고 있어도 shell 쪽에 SSD 를 따로 만들지 않고 socket 으로 보냄
+            ShellWorkloadCommand(shell, ['seq', 'read=0', 'write=100', 'range=0-9', 'ops=10', 'qd=4', 'seed=5']).execute()
+
+            expected = [args[3] for args in generate_commands(WorkloadSpec.parse(
+                ['seq', 'read=0', 'write=100', 'range=0-9', 'ops=10', 'seed=5'], 100))]
+            assert [shell.ssd_interface.execute([None, 'R', lba]).output.split()[1] for lba in range(10)] == expected
+            assert any(str(args[0]).startswith("ops 10 errors 0") for args, _ in mock_print.call_args_list)
+            assert not os.path.exists(tmp_path / "ssd.lock")
+        finally:
+            shell.ssd_interface.close()
+            server.shutdown()
+            server.server_close()
+
     def test_main_function_invaild_case(self, setup_shell):
         # Act & Assert
         with pytest.raises(ValueError, match="INVALID COMMAND"):
@@ -233,6 +337,76 @@ class Test_shell:
         # Assert
         self.mock_print.assert_called_with('ERROR')
 
+    def test_option_main_parallel_ordered(self, monkeypatch, tmp_path, capsys):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "run_list.lst").write_text("2_PartialLBAWrite\n1_FullWriteAndReadCompare\n2_PartialLBAWrite\n")
+        shell = Shell()
+        # shell 자신의 device 는 그대로 두고 scenario 는 각자 임시 폴더에서 실행
+        before = {path.name: path.read_bytes() for path in tmp_path.iterdir() if path.is_file()}
+        # Act
+        shell.option_main_parallel("run_list.lst", 2)
+        # Assert
+        lines = [line.split() for line in capsys.readouterr().out.splitlines()]
+        assert [line[0] for line in lines] == ["2_PartialLBAWrite", "1_FullWriteAndReadCompare", "2_PartialLBAWrite"]
+        assert all(line[3] == "PASS" and line[4].endswith("s)") for line in lines)
+        assert {path.name: path.read_bytes() for path in tmp_path.iterdir()} == before
+
+    def test_option_main_parallel_fail_fast(self, mocker, monkeypatch, tmp_path, capsys):
+        monkeypatch.chdir(tmp_path)
+        # fork 된 worker 도 같은 patch 를 봄
+        mocker.patch.object(ShellPartialLBAWriteCommand, 'execute', lambda self: print('FAIL'))
+        (tmp_path / "run_list.lst").write_text("1_FullWriteAndReadCompare\n2_PartialLBAWrite\n3_WriteReadAging\n")
+        # Act
+        Shell().option_main_parallel("run_list.lst", 2)
+        # Assert
+        lines = capsys.readouterr().out.splitlines()
+        assert [line.split()[3] for line in lines[:2]] == ["PASS", "FAIL"]
+        assert lines[2].startswith("device kept in")
+        assert len(lines) == 3
+
+    def test_stream_keeps_order(self, tmp_path):
+        SSDSparseNand._instance = None
+        ssd = SSD(nand_txt=SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity=100),
+                  buffer_store=BufferJournalStore(str(tmp_path / "buffer.journal")), resident_buffer=True,
+                  output_txt=SSDNullOutput())
+        shell = Shell(ssd_interface=SSDConcreteInterface(output_sink=False, ssd=ssd))
+        commands = io.StringIO("write 3 0xAB\nread 3\nread 4\nerase_range 0 14\nread 3\nwrite 5 zz\n"
+                               "format\nbogus\n\nwrite 7 0x7\nflush\nread 7\nread 100\nexit\nread 1\n")
+        out = io.StringIO()
+        # Act
+        stream = ShellStream(shell, out, queue_depth=4)
+        stream.run(commands)
+        # Assert
+        assert out.getvalue().splitlines() == [
+            "[Write] Done", "[Read] LBA 3: 0x000000AB", "[Read] LBA 4: 0x00000000", "[Read] LBA 3: 0x00000000",
+            "INVALID COMMAND", "[Format] Done", "INVALID COMMAND", "[Write] Done", "[Read] LBA 7: 0x00000007",
+            "[Read] LBA 100: ERROR"]
+        assert (stream.command_cnt, stream.error_cnt) == (12, 3)
+        assert shell.ssd_interface.ssd is ssd
+
+    def test_stream_over_server(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        SSDSparseNand._instance = None
+        nand = SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity=100)
+        server = SSDServer(str(tmp_path / "ssd.sock"), nand)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        shell = Shell(ssd_interface=SSDSocketInterface(str(tmp_path / "ssd.sock")))
+        commands = io.StringIO("write 3 0xAB\nread 3\nwrite 3 0xCD\nread 3\nread 100\nflush\nread 4\n")
+        out = io.StringIO()
+        try:
+            # command 는 server 로 가고 shell 쪽에 SSD 를 따로 만들지 않음
+            ShellStream(shell, out, queue_depth=4).run(commands)
+            assert out.getvalue().splitlines() == [
+                "[Write] Done", "[Read] LBA 3: 0x000000AB", "[Write] Done", "[Read] LBA 3: 0x000000CD",
+                "[Read] LBA 100: ERROR", "[Read] LBA 4: 0x00000000"]
+            assert nand.read_value(3) == 0xCD
+            assert not os.path.exists(tmp_path / "ssd.lock")
+        finally:
+            shell.ssd_interface.close()
+            server.shutdown()
+            server.server_close()
+
     @patch('ssd.SSD.run')
     def test_SSDConcreteInterface_run(self, mock_ssd_run):
         shell = Shell()
@@ -245,6 +419,55 @@ class Test_shell:
         shell.get_response()
         assert mock_ssd_output_read.call_count == 1
 
+    @patch('ssd_texts.SSDOutput.read')
+    def test_SSDConcreteInterface_response_without_file_read(self, mock_ssd_output_read):
+        interface = SSDConcreteInterface(output_sink=False)
+        with patch('ssd.SSD.execute', return_value=SSDResult('R', '01 0x0000ABCD')):
+            shell = Shell(ssd_interface=interface)
+            shell.send_command('R', 1)
+
+        assert shell.get_response_value() == '0x0000ABCD'
+        mock_ssd_output_read.assert_not_called()
+
+    def test_shell_capacity_follows_device(self, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv('SSD_NAND_BACKEND', 'binary')
+        monkeypatch.setenv('SSD_NAND_CAPACITY', '1000')
+        SSDBinaryNand._instance = None
+        shell = Shell()
+        try:
+            assert shell.capacity == 1000
+            shell.send_command('W', 500, 0x1)
+            shell.send_command('R', 500)
+            assert shell.get_response_value() == '0x00000001'
+        finally:
+            shell.ssd_interface.ssd.close()
+            SSDBinaryNand._instance.close()
+
+    def test_shell_ssd_times_out_on_held_file_lock(self, monkeypatch, tmp_path):
+        fcntl = pytest.importorskip("fcntl")
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr('ssd.SSDFileLock', lambda: SSDFileLock(timeout=0.05))
+        shell = Shell()
+        # 다른 process (resident server) 가 ssd.lock 을 들고 있는 상태
+        with open(SSD_LOCK_PATH, 'a+b') as holder:
+            fcntl.flock(holder.fileno(), fcntl.LOCK_EX)
+            with pytest.raises(ValueError):
+                shell.send_command('R', 0)
+            assert shell.get_response() == 'ERROR'
+            fcntl.flock(holder.fileno(), fcntl.LOCK_UN)
+        shell.send_command('W', 1, 0x1)
+        shell.send_command('R', 1)
+        assert shell.get_response_value() == '0x00000001'
+
+    def test_create_ssd_interface_uses_server_socket(self, monkeypatch):
+        monkeypatch.setenv('SSD_SERVER_SOCKET', '/tmp/ssd.sock')
+        assert isinstance(Shell().ssd_interface, SSDSocketInterface)
+
+        monkeypatch.delenv('SSD_SERVER_SOCKET')
+        assert isinstance(Shell().ssd_interface, SSDConcreteInterface)
+
+
 
 class Test_logger():
 
@@ -256,12 +479,14 @@ class Test_logger():
         assert self.logger._initialized is True
 
     def test_print_calls_rotate_and_writes(self, setup_logger,mocker):
+        self.logger.flush()
         mock_rotate = mocker.patch.object(self.logger, "rotate_log_if_needed")
         mock_open = mocker.mock_open()
         mocker.patch("builtins.open", mock_open)
         fake_now = datetime.datetime(2025, 7, 16, 15, 0)
         mocker.patch("datetime.datetime", mocker.Mock(now=lambda: fake_now))
         self.logger.print("HEADER", "message")
+        self.logger.flush()
 
         mock_rotate.assert_called_once()
         mock_open.assert_called_once_with("latest.log", 'a', encoding='utf-8')
@@ -274,18 +499,110 @@ class Test_logger():
     def test_rotate_log_if_needed_renames(self, setup_logger, mocker):
         mocker.patch("os.path.exists", return_value=True)
         mocker.patch("os.path.getsize", return_value=Logger.MAX_SIZE + 1)
-        mocker.patch("glob.glob", return_value=["until_250708_17h_12m_52s.log"])
+        mocker.patch.object(self.logger.archiver, "rotated_logs", return_value=["until_250708_17h_12m_52s.log"])
+        mock_archive = mocker.patch.object(self.logger.archiver, "archive")
+        mock_add_log = mocker.patch.object(self.logger.archiver, "add_log")
         mock_rename = mocker.patch("os.rename")
         mocker.patch("time.strftime", return_value="until_250710_09h_00m_00s")
 
         self.logger.rotate_log_if_needed()
 
-        assert mock_rename.call_count == 2
+        mock_archive.assert_called_once_with("until_250708_17h_12m_52s.log")
+        assert mock_rename.call_count == 1
 
         calls = mock_rename.call_args_list
-        assert calls[0][0][0].endswith(".log")
-        assert calls[0][0][1].endswith(".zip")
-        assert calls[1][0][0] == Logger.LOG_FILE
-        assert calls[1][0][1].startswith("until_")
-        assert calls[1][0][1].endswith(".log")
-
+        assert calls[0][0][0] == Logger.LOG_FILE
+        assert calls[0][0][1].startswith("until_")
+        assert calls[0][0][1].endswith(".log")
+        mock_add_log.assert_called_once_with(calls[0][0][1])
+
+    def test_archiver_compresses_and_keeps_retention(self, mocker, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        archiver = LogArchiver(max_archive_cnt=2)
+        for index in range(4):
+            name = f"until_250710_09h_00m_0{index}s.log"
+            (tmp_path / name).write_text("log line\n" * 100, encoding='utf-8')
+            archiver.add_log(name)
+        spy_glob = mocker.spy(glob, 'glob')
+
+        for name in archiver.rotated_logs()[:3]:
+            archiver.archive(name)
+        archiver.flush()
+
+        spy_glob.assert_not_called()
+        assert sorted(path.name for path in tmp_path.glob("until_*")) == [
+            "until_250710_09h_00m_01s.zip", "until_250710_09h_00m_02s.zip", "until_250710_09h_00m_03s.log"]
+        with zipfile.ZipFile(tmp_path / "until_250710_09h_00m_02s.zip") as archive:
+            assert archive.read("until_250710_09h_00m_02s.log") == b"log line\n" * 100
+        index = json.loads((tmp_path / LogArchiver.INDEX_FILE).read_text(encoding='utf-8'))
+        assert index['logs'] == ["until_250710_09h_00m_03s.log"]
+        assert [archive['name'] for archive in index['archives']] == [
+            "until_250710_09h_00m_01s.zip", "until_250710_09h_00m_02s.zip"]
+        archiver.close()
+
+    def test_archiver_keeps_log_in_index_when_compress_fails(self, mocker, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        archiver = LogArchiver()
+        name = "until_250710_09h_00m_00s.log"
+        (tmp_path / name).write_text("log line\n", encoding='utf-8')
+        archiver.add_log(name)
+        replace = os.replace
+
+        def failing_replace(src, dst):
+            if dst.endswith(".zip"):
+                raise OSError("disk full")
+            replace(src, dst)
+
+        mocker.patch("os.replace", side_effect=failing_replace)
+
+        archiver.archive(name)
+        archiver.flush()
+
+        index = json.loads((tmp_path / LogArchiver.INDEX_FILE).read_text(encoding='utf-8'))
+        assert index['logs'] == [name]
+        assert sorted(path.name for path in tmp_path.glob("until_*")) == [name]
+        archiver.close()
+
+    def test_writer_survives_unexpected_error(self, mocker, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(Logger, '_instance', None)
+        logger = Logger()
+        write_records = logger._write_records
+        calls = []
+
+        def flaky_write_records(records):
+            calls.append(records)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            write_records(records)
+
+        mocker.patch.object(logger, '_write_records', side_effect=flaky_write_records)
+
+        logger.print("HEADER", "lost")
+        logger.flush()
+        logger.print("HEADER", "kept")
+        logger.flush()
+        logger.close()
+
+        assert "kept" in (tmp_path / "latest.log").read_text(encoding='utf-8')
+
+    def test_print_batches_and_rotates_without_blocking(self, mocker, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(Logger, '_instance', None)
+        monkeypatch.setattr(Logger, 'MAX_SIZE', 300)
+        mock_sleep = mocker.patch("time.sleep")
+        mocker.patch("time.strftime", return_value="until_250710_09h_00m_00s")
+        spy_getsize = mocker.spy(os.path, 'getsize')
+        logger = Logger()
+
+        for index in range(30):
+            logger.print("HEADER", f"message {index}")
+            if index % 10 == 9:
+                logger.flush()
+        logger.close()
+
+        mock_sleep.assert_not_called()
+        assert spy_getsize.call_count <= 1
+        rotated = sorted(path.name for path in tmp_path.iterdir() if path.name.startswith("until_"))
+        assert rotated == ["until_250710_09h_00m_00s.zip", "until_250710_09h_00m_00s_1.log"]
+        assert "message 29" in (tmp_path / "latest.log").read_text(encoding='utf-8')
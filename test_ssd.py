@@ -1,12 +1,28 @@
+import asyncio
+import json
+import multiprocessing
+import os
 import random
+import threading
+import time
+from concurrent.futures import Future
 from unittest.mock import call, patch
 import pytest
 
-from buffer import Buffer
-from ssd import SSD, SSDOutput, SSDNand
+from buffer import Buffer, BufferJournalStore
+from ssd import SSD, SSDNand
+from ssd_interface import SSDSocketInterface, SSDQueueInterface
+from ssd_queue import SSDQueuePair
+from ssd_shard import SSDShardRouter
+from ssd_timing import NandTimingModel
+from ssd_metrics import LatencyHistogram, SSDMetrics
+from ssd_trace import SSDTraceRecorder, read_trace, replay_trace
+from ssd_lock import SSDFileLock, LBARangeLock
+from ssd_server import SSDServer
 from pytest_mock import MockerFixture
 
-from ssd_texts import MAX_NAND_SIZE
+from bench_suite import compare, spread
+from ssd_texts import lba_width, MAX_NAND_SIZE, SSDBinaryNand, SSDNumpyNand, SSDSparseNand, SSDNullOutput, SSDOutput, NAND_BIN_HEADER
 
 TEST_LBA = 3
 TEST_WRITE_VALUE = 0x1298CDEF
@@ -249,4 +265,921 @@ def test_no_command(mock_buffer_run):
     ssd_output = SSDOutput()
     mock_buffer_run.return_value = []
 
-    assert ssd.run([None, 'F']) == None
\ No newline at end of file
+    assert ssd.run([None, 'F']) == None
+
+@pytest.fixture
+def binary_nand(tmp_path):
+    SSDBinaryNand._instance = None
+    ssd_nand = SSDBinaryNand(str(tmp_path / "ssd_nand.bin"))
+    yield ssd_nand
+    ssd_nand.close()
+
+
+def test_binary_nand_image_size(binary_nand, tmp_path):
+    assert os.path.getsize(tmp_path / "ssd_nand.bin") == NAND_BIN_HEADER.size + 4 * MAX_NAND_SIZE
+    assert binary_nand.read()[TEST_LBA] == f"{TEST_LBA:02d} 0x00000000\n"
+
+
+@pytest.mark.parametrize("lba", [0, 10, 50, 99])
+def test_binary_nand_write_read(binary_nand, lba):
+    ssd = SSD(True, binary_nand)
+    ssd.run([None, 'W', lba, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'R', lba])
+
+    assert binary_nand.read_value(lba) == TEST_WRITE_VALUE
+    assert SSDOutput().read() == f"{lba:02d} 0x{TEST_WRITE_VALUE:08X}\n"
+
+
+def test_binary_nand_erase(binary_nand):
+    ssd = SSD(True, binary_nand)
+    for i in range(20):
+        ssd.run([None, 'W', i, dec_to_hex(TEST_WRITE_VALUE)])
+
+    ssd.run([None, 'E', 5, 10])
+
+    values = [binary_nand.read_value(i) for i in range(20)]
+    assert values == [TEST_WRITE_VALUE] * 5 + [0] * 10 + [TEST_WRITE_VALUE] * 5
+
+
+def test_binary_nand_persist_and_export(binary_nand, tmp_path):
+    binary_nand.write_lba(7, TEST_WRITE_VALUE)
+    binary_nand.close()
+
+    reopened = SSDBinaryNand(str(tmp_path / "ssd_nand.bin"))
+    assert reopened.read_value(7) == TEST_WRITE_VALUE
+
+    reopened.export_text(str(tmp_path / "ssd_nand.txt"))
+    with open(tmp_path / "ssd_nand.txt", 'r', encoding='utf-8') as file:
+        assert file.readlines()[7] == f"07 0x{TEST_WRITE_VALUE:08X}\n"
+    reopened.close()
+
+
+@pytest.fixture
+def sparse_nand(tmp_path):
+    SSDSparseNand._instance = None
+    ssd_nand = SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity=10 ** 7)
+    yield ssd_nand
+    ssd_nand.close()
+
+
+@pytest.mark.parametrize("lba", [0, 99, 100, 10 ** 7 - 1])
+def test_sparse_nand_large_capacity(sparse_nand, lba):
+    ssd = SSD(True, sparse_nand)
+    ssd.run([None, 'W', lba, dec_to_hex(TEST_WRITE_VALUE)])
+
+    assert sparse_nand.read_value(lba) == TEST_WRITE_VALUE
+    assert sparse_nand.written_cnt == 1
+
+
+def test_sparse_nand_out_of_capacity(sparse_nand):
+    with pytest.raises(ValueError, match=ERROR_MESSAGE):
+        SSD(True, sparse_nand).run([None, 'R', 10 ** 7])
+
+
+def test_sparse_nand_erase_and_replay(sparse_nand, tmp_path):
+    ssd = SSD(True, sparse_nand)
+    for lba in range(5000, 5020):
+        ssd.run([None, 'W', lba, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'E', 5005, 10])
+    sparse_nand.close()
+
+    reopened = SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity=10 ** 7)
+    assert reopened.written_cnt == 10
+    assert reopened.read_value(5004) == TEST_WRITE_VALUE
+    assert reopened.read_value(5005) == 0
+    reopened.close()
+
+
+def test_buffer_mode_large_capacity(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(nand_txt=sparse_nand)
+    ssd.run([None, 'W', 9_000_000, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'R', 9_000_000])
+
+    assert SSDOutput().read() == f"9000000 0x{TEST_WRITE_VALUE:08X}\n"
+    ssd.run([None, 'F'])
+    assert sparse_nand.read_value(9_000_000) == TEST_WRITE_VALUE
+
+
+@pytest.fixture
+def text_nand_1000(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    SSDNand._instance = None
+    yield SSDNand(capacity=1000)
+    SSDNand._instance = None
+
+
+def test_nand_singleton_capacity_mismatch(text_nand_1000):
+    assert SSDNand() is text_nand_1000
+    assert SSDNand(capacity=1000).capacity == 1000
+    with pytest.raises(ValueError, match="capacity mismatch"):
+        SSDNand(capacity=100)
+
+
+def test_text_nand_in_place_write_keeps_fixed_width(text_nand_1000):
+    ssd = SSD(True, text_nand_1000)
+    ssd.run([None, 'W', 999, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'E', 5, 3])
+
+    with open("ssd_nand.txt", 'rb') as file:
+        data = file.read()
+    assert len(data) == 1000 * 15
+    assert data[999 * 15:] == f"999 0x{TEST_WRITE_VALUE:08X}\n".encode()
+    assert data[5 * 15:8 * 15] == b"005 0x00000000\n006 0x00000000\n007 0x00000000\n"
+
+    ssd.run([None, 'R', 999])
+    assert SSDOutput().read() == f"999 0x{TEST_WRITE_VALUE:08X}\n"
+
+
+def test_text_nand_in_place_does_not_rewrite_file(text_nand_1000, mocker: MockerFixture):
+    mock_write = mocker.patch.object(text_nand_1000, 'write')
+    mock_read = mocker.patch.object(text_nand_1000, 'read')
+
+    text_nand_1000.write_lba(10, TEST_WRITE_VALUE)
+    assert text_nand_1000.read_lba(10) == f"010 0x{TEST_WRITE_VALUE:08X}\n"
+
+    mock_write.assert_not_called()
+    mock_read.assert_not_called()
+
+
+def test_text_nand_incompatible_format_falls_back(text_nand_1000):
+    text_nand_1000.write(["ERROR\n"])
+
+    text_nand_1000.write_lba(3, TEST_WRITE_VALUE)
+
+    assert text_nand_1000.read()[3] == f"003 0x{TEST_WRITE_VALUE:08X}\n"
+    assert text_nand_1000.read_lba(3) == f"003 0x{TEST_WRITE_VALUE:08X}\n"
+
+
+def test_background_flush_drains_buffer(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(nand_txt=sparse_nand)
+    flusher = ssd.start_background_flush(interval=0.001)
+    for lba in range(3):
+        ssd.run([None, 'W', lba, dec_to_hex(TEST_WRITE_VALUE)])
+
+    # drain 은 command 하나씩 NAND 에 반영하고 다 끝난 뒤에 drain_cnt 를 올림
+    for _ in range(1000):
+        if flusher.drain_cnt >= 1:
+            break
+        time.sleep(0.001)
+    ssd.run([None, 'R', 2])
+
+    assert flusher.drain_cnt >= 1
+    assert SSDOutput().read() == f"0000002 0x{TEST_WRITE_VALUE:08X}\n"
+    ssd.stop_background_flush()
+
+
+@pytest.mark.parametrize("buffer_size, threshold", [(5, 3), (10, 8), (2, 1)])
+def test_background_flush_threshold_follows_buffer_size(sparse_nand, tmp_path, monkeypatch, buffer_size, threshold):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(nand_txt=sparse_nand, buffer_size=buffer_size)
+    flusher = ssd.start_background_flush(interval=60)
+    for lba in range(threshold - 1):
+        ssd.run([None, 'W', lba, dec_to_hex(TEST_WRITE_VALUE)])
+    time.sleep(0.01)
+    assert flusher.drain_cnt == 0
+
+    ssd.run([None, 'W', threshold - 1, dec_to_hex(TEST_WRITE_VALUE)])
+    for _ in range(1000):
+        if flusher.drain_cnt >= 1:
+            break
+        time.sleep(0.001)
+
+    assert flusher.drain_cnt == 1
+    ssd.stop_background_flush()
+
+
+def test_background_flush_reads_stay_consistent(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rand = random.Random(0)
+    expected = {}
+    ssd = SSD(nand_txt=sparse_nand)
+    ssd.start_background_flush(interval=0)
+    for _ in range(300):
+        lba = rand.randrange(20)
+        if rand.random() < 0.6:
+            expected[lba] = rand.randint(0, 0xFFFFFFFF)
+            ssd.run([None, 'W', lba, dec_to_hex(expected[lba])])
+        else:
+            ssd.run([None, 'R', lba])
+            assert SSDOutput().read() == f"{lba:07d} 0x{expected.get(lba, 0):08X}\n"
+    ssd.stop_background_flush()
+
+    assert all(sparse_nand.read_value(lba) == value for lba, value in expected.items())
+
+
+FLUSH_BATCH = [[None, 'W', 1, '0x00000001'], [None, 'E', 2, 3], [None, 'W', 7, '0x00000007'], [None, 'R', 7]]
+
+
+def test_apply_batch_loads_and_persists_nand_once(text_nand_1000, mocker: MockerFixture):
+    text_nand_1000.write(["ERROR\n"])
+    spy_read = mocker.spy(text_nand_1000, 'read')
+    spy_write = mocker.spy(text_nand_1000, 'write')
+
+    SSD(nand_txt=text_nand_1000).apply_commands(FLUSH_BATCH)
+
+    assert spy_read.call_count == 1
+    assert spy_write.call_count == 1
+    assert text_nand_1000.read()[7] == "007 0x00000007\n"
+    assert SSDOutput().read() == "007 0x00000007\n"
+
+
+def test_apply_batch_opens_fixed_width_nand_once(text_nand_1000, mocker: MockerFixture):
+    spy_open = mocker.patch("ssd_texts.open", create=True, side_effect=open)
+
+    SSD(nand_txt=text_nand_1000).apply_commands(FLUSH_BATCH)
+
+    assert [c.args[0] for c in spy_open.call_args_list].count("ssd_nand.txt") == 1
+    assert text_nand_1000.read()[1] == "001 0x00000001\n"
+    assert text_nand_1000.read()[3] == "003 0x00000000\n"
+
+
+def test_apply_batch_sparse_single_append(sparse_nand, tmp_path, mocker: MockerFixture):
+    spy_write_records = mocker.spy(sparse_nand, '_write_records')
+
+    SSD(nand_txt=sparse_nand).apply_commands(FLUSH_BATCH)
+
+    assert spy_write_records.call_count == 1
+    assert sparse_nand.read_value(7) == 7
+
+
+@pytest.fixture
+def ssd_server(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = SSDServer(str(tmp_path / "ssd.sock"), sparse_nand)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_ssd_server_keeps_state_resident(ssd_server, tmp_path):
+    client = SSDSocketInterface(str(tmp_path / "ssd.sock"))
+
+    client.run([None, 'W', 3, dec_to_hex(TEST_WRITE_VALUE)])
+    assert client.get_response() == ""
+    client.run([None, 'R', 3])
+    assert client.get_response() == f"0000003 0x{TEST_WRITE_VALUE:08X}"
+    with pytest.raises(ValueError):
+        client.run([None, 'R', 10 ** 7])
+    assert client.get_response() == ERROR_MESSAGE
+    assert client.execute([None, 'R', 10 ** 7]).is_error
+    client.run([None, 'WR', 4, 2, dec_to_hex(TEST_WRITE_VALUE)])
+    client.run([None, 'RR', 3, 3])
+    assert client.get_response() == "\n".join(f"{lba:07d} 0x{TEST_WRITE_VALUE:08X}" for lba in range(3, 6))
+
+    assert not os.path.exists(tmp_path / "buffer")
+    assert not os.path.exists(tmp_path / "ssd_output.txt")
+    client.close()
+
+
+def test_execute_returns_result(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(nand_txt=sparse_nand)
+
+    assert ssd.execute([None, 'W', 5, dec_to_hex(TEST_WRITE_VALUE)]).output == ""
+    result = ssd.execute([None, 'R', 5])
+    assert (result.lba, result.value, result.value_text) == (5, TEST_WRITE_VALUE, dec_to_hex(TEST_WRITE_VALUE))
+    assert ssd.execute([None, 'R', -1]).is_error
+    assert ssd.execute([None, 'E', 5, 1]).output == ""
+
+
+def test_execute_without_output_sink(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(nand_txt=sparse_nand, output_txt=SSDNullOutput())
+
+    ssd.execute([None, 'W', 5, dec_to_hex(TEST_WRITE_VALUE)])
+    assert ssd.execute([None, 'R', 5]).value == TEST_WRITE_VALUE
+    assert not os.path.exists(tmp_path / "ssd_output.txt")
+
+
+@pytest.mark.parametrize("nand_fixture", ["binary_nand", "sparse_nand"])
+def test_range_write_and_read(nand_fixture, request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    nand = request.getfixturevalue(nand_fixture)
+    ssd = SSD(True, nand)
+
+    ssd.run([None, 'WR', 10, 3, "0x00000001,0x00000002,0x00000003"])
+    ssd.run([None, 'WR', 20, 5, dec_to_hex(TEST_WRITE_VALUE)])
+    result = ssd.execute([None, 'RR', 9, 16])
+
+    assert result.lba == 9
+    assert result.values == [0, 1, 2, 3] + [0] * 7 + [TEST_WRITE_VALUE] * 5
+    assert result.output.splitlines()[1] == f"{10:0{lba_width(nand.capacity)}d} 0x00000001"
+
+
+@pytest.mark.parametrize("argv", [['RR', 95, 10], ['RR', 0, 0], ['WR', 98, 3, "0x1"], ['WR', 0, 3, "0x1,0x2"],
+                                  ['WR', 0, 1, "0x100000000"], ['RR', 0]])
+def test_range_command_error(binary_nand, argv):
+    ssd = SSD(True, binary_nand)
+    assert ssd.execute([None] + argv).is_error
+
+
+def test_range_commands_with_buffer(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(nand_txt=sparse_nand, buffer_store=BufferJournalStore(str(tmp_path / "buffer.journal")),
+              resident_buffer=True)
+
+    ssd.run([None, 'W', 2, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'W', 50, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'E', 60, 5])
+    # 범위 안 buffer 내용(2)은 버려지고, 밖의 내용(50, 60~64)은 남음
+    ssd.run([None, 'WR', 0, 10, "0x00000007"])
+    assert ssd._get_buffer().buffer_cnt == 2
+    assert sparse_nand.read_value(2) == 7
+
+    result = ssd.execute([None, 'RR', 48, 4])
+    assert result.values == [0, 0, TEST_WRITE_VALUE, 0]
+    assert ssd._get_buffer().buffer_cnt == 0
+    ssd.close()
+
+
+@pytest.fixture
+def numpy_nand(tmp_path):
+    pytest.importorskip("numpy")
+    SSDNumpyNand._instance = None
+    ssd_nand = SSDNumpyNand(str(tmp_path / "ssd_nand.bin"))
+    yield ssd_nand
+    ssd_nand.close()
+
+
+def test_numpy_nand_shares_binary_image(numpy_nand, tmp_path):
+    ssd = SSD(True, numpy_nand)
+    ssd.run([None, 'WR', 0, MAX_NAND_SIZE, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'E', 10, 10])
+    ssd.run([None, 'W', 50, "0x00000001"])
+
+    assert numpy_nand.mismatch_lbas(0, TEST_WRITE_VALUE) == list(range(10, 20)) + [50]
+    assert ssd.execute([None, 'R', 50]).value == 1
+    numpy_nand.close()
+
+    SSDBinaryNand._instance = None
+    binary_nand = SSDBinaryNand(str(tmp_path / "ssd_nand.bin"))
+    assert [binary_nand.read_value(lba) for lba in (9, 10, 50)] == [TEST_WRITE_VALUE, 0, 1]
+    binary_nand.close()
+
+
+def test_numpy_nand_is_not_the_binary_singleton(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    SSDBinaryNand._instance = None
+    binary_nand = SSDBinaryNand(str(tmp_path / "ssd_nand.bin"))
+    # SSDNumpyNand 가 부모의 _instance 를 물려받은 상태에서 시작
+    if '_instance' in SSDNumpyNand.__dict__:
+        monkeypatch.delattr(SSDNumpyNand, '_instance')
+
+    numpy_nand = SSDNumpyNand(str(tmp_path / "numpy_nand.bin"))
+    assert type(numpy_nand) is SSDNumpyNand
+    assert SSDNumpyNand() is numpy_nand
+    assert SSDBinaryNand() is binary_nand
+    numpy_nand.close()
+    binary_nand.close()
+
+
+def test_text_nand_keeps_image_across_processes(text_nand_1000):
+    SSD(True, text_nand_1000).run([None, 'W', 500, dec_to_hex(TEST_WRITE_VALUE)])
+
+    # 새 process 처럼 singleton 을 다시 만들어도 기존 image 를 그대로 사용
+    SSDNand._instance = None
+    ssd_nand = SSDNand(capacity=1000)
+    assert ssd_nand.read_lba(500) == f"500 0x{TEST_WRITE_VALUE:08X}\n"
+    assert ssd_nand.read_lba(0) == "000 0x00000000\n"
+
+
+@pytest.mark.parametrize("image", ["", "000 0x00000000\n", "000 0x0000000O\n" * 1000])
+def test_text_nand_formats_invalid_image(tmp_path, monkeypatch, image):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "ssd_nand.txt").write_text(image)
+    SSDNand._instance = None
+    ssd_nand = SSDNand(capacity=1000)
+
+    assert ssd_nand.read()[999] == "999 0x00000000\n"
+    assert os.path.getsize(tmp_path / "ssd_nand.txt") == 1000 * len("000 0x00000000\n")
+    SSDNand._instance = None
+
+
+@pytest.mark.parametrize("nand_fixture", ["text_nand_1000", "binary_nand", "sparse_nand"])
+def test_format_command(nand_fixture, request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    nand = request.getfixturevalue(nand_fixture)
+    ssd = SSD(nand_txt=nand)
+    ssd.run([None, 'W', 1, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'F'])
+    ssd.run([None, 'W', 2, dec_to_hex(TEST_WRITE_VALUE)])
+
+    ssd.run([None, 'FORMAT'])
+    ssd.run([None, 'F'])
+
+    assert ssd.execute([None, 'RR', 0, 3]).values == [0, 0, 0]
+    assert ssd.execute([None, 'FORMAT', 1]).is_error
+
+
+def test_lba_range_lock_blocks_only_overlapping_ranges():
+    range_lock = LBARangeLock()
+    acquired = threading.Event()
+
+    def lock_range(start, end):
+        with range_lock.hold([(start, end)]):
+            acquired.set()
+
+    with range_lock.hold([(10, 20)]):
+        thread = threading.Thread(target=lock_range, args=(20, 30))
+        thread.start()
+        assert acquired.wait(1)
+        thread.join()
+
+        acquired.clear()
+        thread = threading.Thread(target=lock_range, args=(15, 16))
+        thread.start()
+        assert not acquired.wait(0.05)
+    assert acquired.wait(1)
+    thread.join()
+
+
+def _locked_writer(folder, worker, worker_cnt, capacity):
+    os.chdir(folder)
+    SSDBinaryNand._instance = None
+    nand = SSDBinaryNand(os.path.join(folder, "ssd_nand.bin"), capacity)
+    file_lock = SSDFileLock(os.path.join(folder, "ssd.lock"))
+    for lba in range(worker, capacity, worker_cnt):
+        # process 마다 command 하나씩 새 buffer 를 읽고 저장하는 CLI 와 같은 방식
+        SSD(nand_txt=nand, file_lock=file_lock).run([None, 'W', lba, f"0x{worker + 1:08X}"])
+    nand.close()
+
+
+def test_multi_process_writes_are_not_lost(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    worker_cnt, capacity = 4, 120
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_locked_writer, args=(str(tmp_path), worker, worker_cnt, capacity))
+                 for worker in range(worker_cnt)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    SSDBinaryNand._instance = None
+    nand = SSDBinaryNand(str(tmp_path / "ssd_nand.bin"), capacity)
+    SSD(nand_txt=nand, file_lock=SSDFileLock(str(tmp_path / "ssd.lock"))).run([None, 'F'])
+    assert [nand.read_value(lba) for lba in range(capacity)] == [lba % worker_cnt + 1 for lba in range(capacity)]
+    nand.close()
+
+
+def test_long_lived_clients_share_journal(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    journal_path = str(tmp_path / "buffer.journal")
+    lock_path = str(tmp_path / "ssd.lock")
+    client_a = SSD(nand_txt=sparse_nand, buffer_store=BufferJournalStore(journal_path),
+                   file_lock=SSDFileLock(lock_path), output_txt=SSDNullOutput())
+    client_b = SSD(nand_txt=sparse_nand, buffer_store=BufferJournalStore(journal_path),
+                   file_lock=SSDFileLock(lock_path), output_txt=SSDNullOutput())
+
+    client_a.run([None, 'W', 1, dec_to_hex(0x11)])
+    client_b.run([None, 'W', 2, dec_to_hex(0x22)])
+    client_a.run([None, 'W', 3, dec_to_hex(0x33)])
+    client_a.run([None, 'F'])
+
+    assert [sparse_nand.read_value(lba) for lba in range(1, 4)] == [0x11, 0x22, 0x33]
+    assert client_b.execute([None, 'R', 1]).value == 0x11
+    assert client_b.execute([None, 'R', 2]).value == 0x22
+
+
+def _long_lived_client(folder, worker, worker_cnt, capacity):
+    os.chdir(folder)
+    # CLI 처럼 command 마다 다시 만들지 않고 NAND / journal 을 process 끝까지 유지
+    SSDSparseNand._instance = None
+    nand = SSDSparseNand(os.path.join(folder, "ssd_nand.sparse"), capacity)
+    ssd = SSD(nand_txt=nand, buffer_store=BufferJournalStore(os.path.join(folder, "buffer.journal")),
+              file_lock=SSDFileLock(os.path.join(folder, "ssd.lock")), output_txt=SSDNullOutput())
+    for lba in range(worker, capacity, worker_cnt):
+        ssd.run([None, 'W', lba, f"0x{worker + 1:08X}"])
+        # 사이에 다른 process 가 buffer 를 flush 했어도 방금 쓴 값이 읽혀야 함
+        if ssd.execute([None, 'R', lba]).value != worker + 1:
+            os._exit(2)
+    ssd.close()
+    nand.close()
+
+
+def test_long_lived_clients_stress(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    worker_cnt, capacity = 4, 120
+    # 이미 format 된 device 에 client 들이 붙는 상황
+    SSDSparseNand._instance = None
+    SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity).close()
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_long_lived_client, args=(str(tmp_path), worker, worker_cnt, capacity))
+                 for worker in range(worker_cnt)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    SSDSparseNand._instance = None
+    nand = SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity)
+    SSD(nand_txt=nand, buffer_store=BufferJournalStore(str(tmp_path / "buffer.journal")),
+        file_lock=SSDFileLock(str(tmp_path / "ssd.lock")), output_txt=SSDNullOutput()).run([None, 'F'])
+    assert [nand.read_value(lba) for lba in range(capacity)] == [lba % worker_cnt + 1 for lba in range(capacity)]
+    nand.close()
+
+
+def test_file_lock_timeout_returns_error(sparse_nand, tmp_path, monkeypatch):
+    fcntl = pytest.importorskip("fcntl")
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "ssd.lock")
+    ssd = SSD(nand_txt=sparse_nand, file_lock=SSDFileLock(path, timeout=0.05))
+
+    with open(path, 'a+b') as holder:
+        fcntl.flock(holder.fileno(), fcntl.LOCK_EX)
+        start = time.monotonic()
+        assert ssd.execute([None, 'W', 3, dec_to_hex(TEST_WRITE_VALUE)]).is_error
+        assert time.monotonic() - start < 1
+        assert SSDOutput().read() == ERROR_MESSAGE
+        fcntl.flock(holder.fileno(), fcntl.LOCK_UN)
+
+    assert not ssd.execute([None, 'W', 3, dec_to_hex(TEST_WRITE_VALUE)]).is_error
+    assert ssd.execute([None, 'R', 3]).value == TEST_WRITE_VALUE
+
+
+def test_resident_ssd_concurrent_clients(binary_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(nand_txt=binary_nand, buffer_store=BufferJournalStore(str(tmp_path / "buffer.journal")),
+              resident_buffer=True, output_txt=SSDNullOutput())
+    thread_cnt = 8
+    errors = []
+    expected = {}
+
+    def client(worker):
+        rand = random.Random(worker)
+        for _ in range(200):
+            lba = rand.randrange(worker, MAX_NAND_SIZE, thread_cnt)
+            value = rand.randint(1, 0xFFFFFFFF)
+            ssd.execute([None, 'W', lba, dec_to_hex(value)])
+            expected[lba] = value
+            result = ssd.execute([None, 'R', lba])
+            if result.value != value:
+                errors.append((lba, result.output, value))
+
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(thread_cnt)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ssd.run([None, 'F'])
+    assert errors == []
+    assert all(binary_nand.read_value(lba) == value for lba, value in expected.items())
+    ssd.close()
+
+
+@pytest.fixture
+def queue_ssd(binary_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(nand_txt=binary_nand, buffer_store=BufferJournalStore(str(tmp_path / "buffer.journal")),
+              resident_buffer=True, output_txt=SSDNullOutput())
+    yield ssd
+    ssd.close()
+
+
+def test_queue_pair_completes_out_of_order(queue_ssd, mocker: MockerFixture):
+    execute = queue_ssd.execute
+
+    def slow_execute(argv):
+        if argv[2] == 0:
+            time.sleep(0.1)
+        return execute(argv)
+
+    mocker.patch.object(queue_ssd, 'execute', side_effect=slow_execute)
+
+    async def scenario():
+        async with SSDQueuePair(queue_ssd, queue_depth=4) as queue_pair:
+            slow_tag = await queue_pair.submit([None, 'R', 0])
+            fast_tag = await queue_pair.submit([None, 'R', 50])
+            return [(await queue_pair.complete()).tag for _ in range(2)], slow_tag, fast_tag
+
+    completed, slow_tag, fast_tag = asyncio.run(scenario())
+    assert completed == [fast_tag, slow_tag]
+
+
+def test_queue_pair_merges_adjacent_requests(binary_nand, tmp_path, monkeypatch, mocker: MockerFixture):
+    monkeypatch.chdir(tmp_path)
+    ssd = SSD(True, binary_nand, output_txt=SSDNullOutput())
+    spy = mocker.spy(ssd, 'execute')
+
+    async def scenario():
+        async with SSDQueuePair(ssd, queue_depth=32) as queue_pair:
+            tags = [await queue_pair.submit([None, 'W', lba, dec_to_hex(lba + 1)]) for lba in range(10, 20)]
+            tags += [await queue_pair.submit([None, 'R', lba]) for lba in range(10, 20)]
+            completions = {}
+            for _ in range(len(tags)):
+                completion = await queue_pair.complete()
+                completions[completion.tag] = completion.result
+            return tags, completions, queue_pair.merged_cnt
+
+    tags, completions, merged_cnt = asyncio.run(scenario())
+    assert merged_cnt == 18
+    assert [call_args.args[0][1] for call_args in spy.call_args_list] == ['WR', 'RR']
+    assert [completions[tag].output for tag in tags[:10]] == [""] * 10
+    assert [completions[tag].value for tag in tags[10:]] == list(range(11, 21))
+    assert [completions[tag].lba for tag in tags[10:]] == list(range(10, 20))
+
+
+def test_queue_pair_does_not_merge_past_buffer(queue_ssd, mocker: MockerFixture):
+    spy = mocker.spy(queue_ssd, 'execute')
+
+    async def scenario():
+        async with SSDQueuePair(queue_ssd, queue_depth=32) as queue_pair:
+            for lba in range(10, 14):
+                await queue_pair.submit([None, 'W', lba, dec_to_hex(lba + 1)])
+            for _ in range(4):
+                await queue_pair.complete()
+            return queue_pair.merged_cnt
+
+    assert asyncio.run(scenario()) == 0
+    assert [call_args.args[0][1] for call_args in spy.call_args_list] == ['W'] * 4
+    assert queue_ssd._get_buffer().buffer_cnt == 4
+
+
+def test_queue_pair_closes_its_own_ssd(mocker: MockerFixture):
+    create_ssd = mocker.patch('ssd_queue.create_ssd_from_env')
+
+    async def scenario():
+        async with SSDQueuePair(queue_depth=4):
+            pass
+
+    asyncio.run(scenario())
+    create_ssd.return_value.close.assert_called_once()
+
+
+def test_queue_pair_keeps_order_and_depth(queue_ssd, mocker: MockerFixture):
+    execute = queue_ssd.execute
+    running = []
+    max_running = []
+
+    def tracked_execute(argv):
+        running.append(argv)
+        max_running.append(len(running))
+        time.sleep(0.01)
+        running.remove(argv)
+        return execute(argv)
+
+    mocker.patch.object(queue_ssd, 'execute', side_effect=tracked_execute)
+
+    async def scenario():
+        interface = SSDQueueInterface(SSDQueuePair(queue_ssd, queue_depth=4, merge=False))
+        args_lst = [[None, 'W', lba % 10 * 10, dec_to_hex(lba)] for lba in range(30)] + [[None, 'R', 90], [None, 'R', 100]]
+        results = await interface.execute_many(args_lst)
+        await interface.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert max(max_running) <= 4
+    assert results[-2].value == 29
+    assert results[-1].is_error
+
+
+@pytest.fixture
+def shard_router(tmp_path):
+    router = SSDShardRouter(1000, shard_cnt=3, folder=str(tmp_path / "shards"))
+    yield router
+    router.close()
+
+
+def test_shard_router_splits_commands_across_shards(shard_router, tmp_path):
+    ssd = SSD(True, shard_router, output_txt=SSDNullOutput())
+    assert shard_router.shard_cnt == 3
+
+    # 334 개씩 나뉘므로 330~339 는 shard 0, 1 에 걸침
+    ssd.run([None, 'WR', 330, 10, ",".join(dec_to_hex(lba) for lba in range(330, 340))])
+    ssd.run([None, 'E', 332, 4])
+    ssd.run([None, 'W', 999, dec_to_hex(TEST_WRITE_VALUE)])
+
+    result = ssd.execute([None, 'RR', 330, 10])
+    assert result.values == [330, 331, 0, 0, 0, 0, 336, 337, 338, 339]
+    assert result.output.splitlines()[4] == "334 0x00000000"
+    assert ssd.execute([None, 'R', 999]).output == f"999 0x{TEST_WRITE_VALUE:08X}\n"
+    assert ssd.execute([None, 'RR', 0, 1000]).values.count(0) == 1000 - 7
+    assert ssd.execute([None, 'R', 1000]).is_error
+
+
+def test_shard_router_raises_on_shard_error(shard_router, mocker: MockerFixture):
+    with pytest.raises(ValueError, match=ERROR_MESSAGE):
+        shard_router.read_lba(1000)
+
+    error = Future()
+    error.set_result([ERROR_MESSAGE])
+    mocker.patch("ssd_shard.SSDShard.submit", return_value=error)
+    with pytest.raises(ValueError, match=ERROR_MESSAGE):
+        shard_router.read_lba(5)
+    with pytest.raises(ValueError, match=ERROR_MESSAGE):
+        shard_router.read_lba_range(330, 10)
+    assert SSD(True, shard_router, output_txt=SSDNullOutput()).execute([None, 'R', 5]).is_error
+
+
+def test_shard_router_persists_per_shard(tmp_path):
+    router = SSDShardRouter(100, shard_cnt=2, folder=str(tmp_path / "shards"))
+    router.fill_lba_range(40, 20, TEST_WRITE_VALUE)
+    router.close()
+
+    router = SSDShardRouter(100, shard_cnt=2, folder=str(tmp_path / "shards"))
+    assert [int(line.split()[1], 16) for line in router.read_lba_range(38, 24)] == \
+        [0, 0] + [TEST_WRITE_VALUE] * 20 + [0, 0]
+    router.format()
+    assert router.read_lba(50) == "50 0x00000000\n"
+    router.close()
+
+
+def test_shard_router_batches_concurrent_requests(tmp_path):
+    router = SSDShardRouter(100, shard_cnt=2, folder=str(tmp_path / "shards"), delay_us=2000)
+    ssd = SSD(True, router, output_txt=SSDNullOutput())
+
+    async def scenario():
+        interface = SSDQueueInterface(SSDQueuePair(ssd, queue_depth=16, merge=False))
+        await interface.execute_many([[None, 'W', lba, dec_to_hex(lba + 1)] for lba in range(0, 100, 5)])
+        results = await interface.execute_many([[None, 'R', lba] for lba in range(0, 100, 5)])
+        await interface.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [result.value for result in results] == [lba + 1 for lba in range(0, 100, 5)]
+    # 한 batch 를 처리하는 동안 들어온 요청은 다음 pipe 왕복에 같이 보냄
+    assert router.batch_cnt < 40
+    router.close()
+
+
+def test_timing_model_no_buffer_latency(binary_nand):
+    timing_model = NandTimingModel(read_us=50, program_us=500, erase_us=2000, channel_cnt=4, die_cnt=2)
+    ssd = SSD(True, binary_nand, output_txt=SSDNullOutput(), timing_model=timing_model)
+
+    assert ssd.execute([None, 'W', 0, dec_to_hex(TEST_WRITE_VALUE)]).latency_us == 500
+    assert ssd.execute([None, 'R', 0]).latency_us == 50
+    # 8 개 die 에 걸친 erase 는 동시에 진행
+    assert ssd.execute([None, 'E', 0, 10]).latency_us == 2000
+    # 16 LBA 는 die 마다 2 번씩 program
+    assert ssd.execute([None, 'WR', 0, 16, dec_to_hex(TEST_WRITE_VALUE)]).latency_us == 1000
+    assert ssd.execute([None, 'R', -1]).is_error
+
+    stats = timing_model.stats()
+    assert stats['commands'] == 4
+    assert stats['device_time_us'] == 500 + 50 + 2000 + 1000
+    assert stats['wall_time_s'] > 0
+    assert (stats['read'], stats['program'], stats['erase']) == (1, 17, 8)
+
+
+def test_timing_model_buffer_hits_and_parallel_flush(binary_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    timing_model = NandTimingModel(program_us=500, buffer_hit_us=2, channel_cnt=4, die_cnt=2)
+    ssd = SSD(nand_txt=binary_nand, buffer_store=BufferJournalStore(str(tmp_path / "buffer.journal")),
+              resident_buffer=True, output_txt=SSDNullOutput(), timing_model=timing_model)
+
+    latencies = [ssd.execute([None, 'W', lba, dec_to_hex(TEST_WRITE_VALUE)]).latency_us for lba in range(5)]
+    assert latencies == [2] * 5
+    assert ssd.execute([None, 'R', 3]).latency_us == 2
+    # 서로 다른 die 의 5 개 program 은 겹쳐서 진행
+    assert ssd.execute([None, 'F']).latency_us == 500
+    assert timing_model.stats()['buffer_hit'] == 7
+    ssd.close()
+
+
+def test_metrics_counters_and_stages(sparse_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    metrics = SSDMetrics()
+    ssd = SSD(nand_txt=sparse_nand, buffer_store=BufferJournalStore(str(tmp_path / "buffer.journal")),
+              resident_buffer=True, output_txt=SSDNullOutput(), metrics=metrics)
+
+    ssd.run([None, 'W', 1, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'W', 1, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'W', 2, dec_to_hex(TEST_WRITE_VALUE)])
+    ssd.run([None, 'R', 1])
+    ssd.run([None, 'R', 50])
+    ssd.run([None, 'F'])
+    ssd.run([None, 'RR', 0, 10])
+    assert ssd.execute([None, 'R', -1]).is_error
+
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {
+        'buffer.coalesced': 1, 'buffer.flush': 1, 'buffer.read_hit': 1, 'buffer.read_miss': 1,
+        'cmd.F': 1, 'cmd.R': 2, 'cmd.RR': 1, 'cmd.W': 3, 'cmd.error': 1,
+        'nand.bytes_read': 4 + 40, 'nand.bytes_written': 8,
+    }
+    assert snapshot['histograms']['flush_batch']['max'] == 2
+    assert set(snapshot['latency_us']) == {'parse', 'buffer', 'nand', 'output'}
+    assert snapshot['latency_us']['parse']['count'] == 8
+
+    stats = ssd.execute([None, 'STATS']).output
+    assert "cmd.W 3\n" in stats and "nand_us count=" in stats
+    metrics.dump(str(tmp_path / "ssd_metrics.json"))
+    with open(tmp_path / "ssd_metrics.json", encoding='utf-8') as file:
+        assert json.load(file)['counters']['cmd.STATS'] == 1
+    ssd.close()
+
+
+def test_metrics_nested_stage_not_counted_twice():
+    metrics = SSDMetrics(clock=iter([0, 10, 40, 100, 100, 130]).__next__)
+
+    with metrics.timer('buffer'):
+        with metrics.timer('output'):
+            pass
+    with metrics.timer('output'):
+        pass
+
+    latency = metrics.snapshot()['latency_us']
+    # buffer 100ns 중 output 30ns 는 output 에만 들어감
+    assert latency['buffer']['max'] == 70 / 1000
+    assert latency['output']['count'] == 2 and latency['output']['max'] == 30 / 1000
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for value in range(1, 10001):
+        histogram.record(value)
+
+    assert (histogram.count, histogram.min, histogram.max) == (10000, 1, 10000)
+    for percent in (50, 90, 99):
+        assert abs(histogram.percentile(percent) - percent * 100) <= percent * 100 * 0.04
+    assert LatencyHistogram().snapshot() == {'count': 0}
+
+
+def test_trace_round_trip(tmp_path):
+    commands = [[None, 'W', 3, "0x0000ABCD"], [None, 'R', 3], [None, 'E', 0, 10], [None, 'F'],
+                [None, 'RR', 0, 5], [None, 'WR', 10, 2, "0x00000001,0x00000002"], [None, 'WR', 0, 3, "0x00000007"],
+                [None, 'FORMAT'], [None, 'R', -1], [None, 'W', 3, "0xZZ"], [None, 'A']]
+    recorder = SSDTraceRecorder(str(tmp_path / "trace.bin"), clock=iter(range(0, 10 ** 9, 1000)).__next__)
+    for argv in commands:
+        recorder.record(argv)
+    recorder.close()
+
+    records = list(read_trace(str(tmp_path / "trace.bin")))
+    assert [timestamp for timestamp, _ in records] == list(range(0, 1000 * len(commands), 1000))
+    assert [argv[1:] for _, argv in records] == [
+        ['W', 3, "0x0000ABCD"], ['R', 3], ['E', 0, 10], ['F'], ['RR', 0, 5], ['WR', 10, 2, "0x00000001,0x00000002"],
+        ['WR', 0, 3, "0x00000007"], ['FORMAT'], ['R', '-1'], ['W', '3', "0xZZ"], ['A']]
+
+
+def test_trace_record_and_replay(sparse_nand, binary_nand, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    recorder = SSDTraceRecorder(str(tmp_path / "trace.bin"))
+    ssd = SSD(nand_txt=sparse_nand, buffer_store=BufferJournalStore(str(tmp_path / "sparse.journal")),
+              resident_buffer=True, output_txt=SSDNullOutput(), trace=recorder)
+    for lba in range(20):
+        ssd.run([None, 'W', lba, dec_to_hex(lba + 1)])
+    ssd.execute([None, 'R', 1000])
+    ssd.run([None, 'E', 5, 5])
+    ssd.close()
+
+    # 다른 backend / buffer 설정으로 재현
+    replay_ssd = SSD(True, binary_nand, output_txt=SSDNullOutput())
+    report = replay_trace(str(tmp_path / "trace.bin"), replay_ssd)
+    assert (report['commands'], report['errors']) == (22, 1)
+    assert report['iops'] > 0 and report['latency_us']['count'] == 22
+    assert [binary_nand.read_value(lba) for lba in range(20)] == \
+        [lba + 1 if not 5 <= lba < 10 else 0 for lba in range(20)]
+
+
+def test_per_process_ssd_commits_grouped_journal(tmp_path):
+    SSDSparseNand._instance = None
+    journal_path = str(tmp_path / "buffer.journal")
+    ssd = SSD(nand_txt=SSDSparseNand(str(tmp_path / "ssd_nand.sparse"), capacity=100),
+              buffer_store=BufferJournalStore(journal_path, group_commit=8), output_txt=SSDNullOutput())
+    ssd.run([None, 'W', 3, dec_to_hex(7)])
+
+    # 다음 process 가 바로 볼 수 있게 command 가 끝날 때 journal 에 남아 있어야 함
+    assert Buffer(store=BufferJournalStore(journal_path))._buf_lst[0] == '1_W_3_0x00000007'
+    ssd.close()
+    SSDSparseNand._instance.close()
+
+
+def _bench_result(ops_per_sec, spread=0.0, repeat=5):
+    return {'ops_per_sec': ops_per_sec, 'spread': spread, 'samples': [ops_per_sec] * repeat}
+
+
+def test_bench_compare_uses_spread_and_tolerance():
+    baseline = {'results': {
+        'ssd.W': _bench_result(100.0),
+        'ssd.R': _bench_result(100.0),
+        'ssd.E': _bench_result(100.0, spread=0.4),
+        'shell.1_FullWriteAndReadCompare': _bench_result(10.0),
+    }}
+    report = {'results': {
+        'ssd.W': _bench_result(95.0),
+        'ssd.R': _bench_result(85.0),
+        'ssd.E': _bench_result(60.0, spread=0.4),
+        'shell.1_FullWriteAndReadCompare': _bench_result(8.8),
+        'ssd.F': _bench_result(50.0),
+    }}
+    rows, regressions = compare(report, baseline, threshold=0.10)
+
+    # 편차 없으면 10% 기준, 편차 40% x 5 회면 3 * 1.25 * sqrt(2) * 0.4 / sqrt(5) ~= 95%, shell 은 15%
+    assert regressions == ['ssd.R']
+    allowed = {row[0]: row[4] for row in rows}
+    assert allowed['ssd.W'] == pytest.approx(0.10)
+    assert allowed['ssd.E'] == pytest.approx(0.9487, abs=1e-4)
+    assert allowed['shell.1_FullWriteAndReadCompare'] == pytest.approx(0.15)
+    assert rows[-1] == ('ssd.F', 50.0, None, None, None)
+
+
+def test_bench_spread_ignores_single_outlier():
+    assert spread([100.0, 100.0, 100.0, 100.0, 200.0], 100.0) == 0.0
+    assert spread([90.0, 95.0, 100.0, 105.0, 110.0], 100.0) == pytest.approx(1.4826 * 0.05)